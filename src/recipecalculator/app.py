@@ -1,4 +1,5 @@
 from kivy.app import App
+from kivy.clock import Clock
 from kivy.uix.screenmanager import ScreenManager, Screen
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.gridlayout import GridLayout
@@ -9,108 +10,96 @@ from kivy.uix.spinner import Spinner
 from kivy.uix.scrollview import ScrollView
 from kivy.uix.popup import Popup
 from kivy.properties import StringProperty, NumericProperty
-import json
 import os
 
+from .models import Ingredient, Product, DataManager
+from .inventory import Inventory, InsufficientStock
+from .history import RecipeHistory
+from .profiles import PricingProfiles, reprice
+from .overhead import DRIVERS, Allocation, Overheads, month_start, period_volumes
+from .sync import SERVER_FILE, SyncEngine, SyncServer, format_result
+from . import integrity, money, nutrition, planner, pricing, reports, scaling, substitution
+from .profiling import profiler, profiled
 
-# Data Models
-class Ingredient:
-    def __init__(self, name, quantity, unit, cost):
-        self.name = name
-        self.quantity = float(quantity)
-        self.unit = unit
-        self.cost = float(cost)
-    
-    def to_dict(self):
-        return {
-            'name': self.name,
-            'quantity': self.quantity,
-            'unit': self.unit,
-            'cost': self.cost
-        }
-    
-    @staticmethod
-    def from_dict(data):
-        return Ingredient(data['name'], data['quantity'], data['unit'], data['cost'])
 
+# Seconds between checks for catalog changes made by other processes
+CATALOG_POLL_INTERVAL = 2
 
-class Product:
-    def __init__(self, name, quantity, unit, ingredients=None):
-        self.name = name
-        self.quantity = float(quantity)
-        self.unit = unit
-        self.ingredients = ingredients if ingredients else []
-    
-    def add_ingredient(self, ingredient_name, quantity, unit):
-        self.ingredients.append({
-            'name': ingredient_name,
-            'quantity': float(quantity),
-            'unit': unit
-        })
-    
-    def to_dict(self):
-        return {
-            'name': self.name,
-            'quantity': self.quantity,
-            'unit': self.unit,
-            'ingredients': self.ingredients
-        }
+# Seconds of quiet after a pricing field edit before the price is recomputed
+LIVE_PRICE_DELAY = 0.3
+
+# Pricing screen result, filled from a price breakdown and the cost factors
+BREAKDOWN_TEMPLATE = (
+    'Base Cost: ₹{base_cost:.2f}\n'
+    'Wastage ({wastage:g}%): ₹{wastage_cost:.2f}\n'
+    'Utilities: ₹{utilities_cost:.2f}\n'
+    'Packaging: ₹{packaging_cost:.2f}\n'
+    'Shipping: ₹{shipping_cost:.2f}\n'
+    'Taxes ({taxes:g}%): ₹{taxes_cost:.2f}\n'
+    'Labour: ₹{labour_cost:.2f}\n'
+    'Subtotal: ₹{subtotal:.2f}\n'
+    'Profit ({profit:g}%): ₹{profit_amount:.2f}\n'
+    '\nFINAL PRICE: ₹{final_price:.2f}'
+)
+
+# Labels for the pricing screen's "Solve For" spinner
+SOLVE_LABELS = {
+    'Ingredient Spend': 'base_cost',
+    'Profit Margin': 'profit',
+    'Wastage': 'wastage',
+    'Taxes': 'taxes',
+    'Utilities': 'utilities',
+    'Packaging': 'packaging',
+    'Shipping': 'shipping',
+    'Labour': 'labour',
+}
+
+COST_METHOD_LABELS = {
+    'List Price': 'list',
+    'FIFO': 'fifo',
+    'Weighted Average': 'average',
+}
+
+
+# Catalog change tracking
+class CatalogNames:
+    # A screen's copy of the catalog's names, patched from DataManager
+    # change events rather than re-read from the whole catalog on each visit
+    def __init__(self, data_manager, kind):
+        self.data_manager = data_manager
+        self.kind = kind
+        self.names = None
+        self.pending = {}
+        data_manager.subscribe(self.on_change)
     
-    @staticmethod
-    def from_dict(data):
-        return Product(
-            data['name'],
-            data['quantity'],
-            data['unit'],
-            data.get('ingredients', [])
-        )
+    def on_change(self, event, kind, name):
+        if kind == self.kind and self.names is not None:
+            self.pending[name] = event
+    
+    def update(self):
+        # {name: last event} since the previous call; every name is
+        # 'added' on the first
+        if self.names is None:
+            self.names = dict.fromkeys(getattr(self.data_manager, self.kind))
+            return dict.fromkeys(self.names, 'added')
+        changes, self.pending = self.pending, {}
+        for name, event in changes.items():
+            if event == 'removed':
+                self.names.pop(name, None)
+            else:
+                self.names.setdefault(name)
+        return changes
 
 
-# Data Manager
-class DataManager:
-    def __init__(self):
-        self.ingredients_file = 'ingredients.json'
-        self.products_file = 'products.json'
-        self.ingredients = {}
-        self.products = {}
-        self.load_data()
-    
-    def load_data(self):
-        if os.path.exists(self.ingredients_file):
-            with open(self.ingredients_file, 'r') as f:
-                data = json.load(f)
-                self.ingredients = {k: Ingredient.from_dict(v) for k, v in data.items()}
-        
-        if os.path.exists(self.products_file):
-            with open(self.products_file, 'r') as f:
-                data = json.load(f)
-                self.products = {k: Product.from_dict(v) for k, v in data.items()}
-    
-    def save_data(self):
-        with open(self.ingredients_file, 'w') as f:
-            json.dump({k: v.to_dict() for k, v in self.ingredients.items()}, f)
-        
-        with open(self.products_file, 'w') as f:
-            json.dump({k: v.to_dict() for k, v in self.products.items()}, f)
-    
-    def add_ingredient(self, ingredient):
-        self.ingredients[ingredient.name] = ingredient
-        self.save_data()
-    
-    def add_product(self, product):
-        self.products[product.name] = product
-        self.save_data()
-    
-    def get_ingredient(self, name):
-        return self.ingredients.get(name)
-    
-    def get_product(self, name):
-        return self.products.get(name)
-    
-    def update_ingredient_cost(self, name, new_cost):
-        if name in self.ingredients:
-            self.ingredients[name].cost = float(new_cost)
-            self.save_data()
+def fill_spinner(spinner, names, empty_text):
+    # Keeps the current selection while it still exists
+    if names:
+        spinner.values = list(names)
+        if spinner.text not in names:
+            spinner.text = next(iter(names))
+    else:
+        spinner.values = [empty_text]
+        spinner.text = empty_text
 
 
 # Screens
@@ -142,6 +131,14 @@ class MainMenuScreen(Screen):
         btn_manage.bind(on_press=lambda x: setattr(self.manager, 'current', 'manage_ingredients'))
         layout.add_widget(btn_manage)
         
+        btn_stats = Button(text='Performance Stats', size_hint_y=0.15)
+        btn_stats.bind(on_press=lambda x: setattr(self.manager, 'current', 'stats'))
+        layout.add_widget(btn_stats)
+        
+        btn_sync = Button(text='Sync', size_hint_y=0.15)
+        btn_sync.bind(on_press=lambda x: App.get_running_app().open_sync())
+        layout.add_widget(btn_sync)
+        
         self.add_widget(layout)
 
 
@@ -174,6 +171,18 @@ class AddIngredientScreen(Screen):
         self.cost_input = TextInput(multiline=False, input_filter='float')
         form.add_widget(self.cost_input)
         
+        form.add_widget(Label(text='Alternatives:'))
+        self.alternatives_input = TextInput(multiline=False, hint_text='Comma separated')
+        form.add_widget(self.alternatives_input)
+        
+        form.add_widget(Label(text='Nutrients:'))
+        self.nutrients_input = TextInput(multiline=False, hint_text='energy_kcal=364, protein_g=10')
+        form.add_widget(self.nutrients_input)
+        
+        form.add_widget(Label(text='Allergens:'))
+        self.allergens_input = TextInput(multiline=False, hint_text='gluten, milk')
+        form.add_widget(self.allergens_input)
+        
         layout.add_widget(form)
         
         # Buttons
@@ -190,6 +199,7 @@ class AddIngredientScreen(Screen):
         layout.add_widget(btn_layout)
         self.add_widget(layout)
     
+    @profiled()
     def save_ingredient(self, instance):
         try:
             name = self.name_input.text.strip()
@@ -201,18 +211,32 @@ class AddIngredientScreen(Screen):
                 self.show_popup('Error', 'Please enter ingredient name')
                 return
             
-            ingredient = Ingredient(name, quantity, unit, cost)
+            if quantity <= 0:
+                # Unit cost is cost / quantity
+                self.show_popup('Error', 'Quantity must be greater than zero')
+                return
+            
+            alternatives = [alt.strip() for alt in self.alternatives_input.text.split(',') if alt.strip()]
+            nutrients = nutrition.parse_nutrients(self.nutrients_input.text)
+            allergens = nutrition.allergen_mask(
+                [a for a in self.allergens_input.text.split(',') if a.strip()])
+            
+            ingredient = Ingredient(name, quantity, unit, cost, alternatives, nutrients, allergens)
             self.data_manager.add_ingredient(ingredient)
             
             self.show_popup('Success', f'Ingredient "{name}" added successfully!')
             self.clear_inputs()
-        except ValueError:
-            self.show_popup('Error', 'Please enter valid numbers for quantity and cost')
+        except ValueError as e:
+            message = str(e) if str(e).startswith('Unknown') else 'Please enter valid numbers for quantity and cost'
+            self.show_popup('Error', message)
     
     def clear_inputs(self):
         self.name_input.text = ''
         self.quantity_input.text = ''
         self.cost_input.text = ''
+        self.alternatives_input.text = ''
+        self.nutrients_input.text = ''
+        self.allergens_input.text = ''
     
     def show_popup(self, title, message):
         popup = Popup(title=title, content=Label(text=message), size_hint=(0.8, 0.3))
@@ -220,9 +244,13 @@ class AddIngredientScreen(Screen):
 
 
 class ManageIngredientsScreen(Screen):
-    def __init__(self, data_manager, **kwargs):
+    def __init__(self, data_manager, inventory, **kwargs):
         super().__init__(**kwargs)
         self.data_manager = data_manager
+        self.inventory = inventory
+        self.ingredient_names = CatalogNames(data_manager, 'ingredients')
+        # name -> (row layout, info label)
+        self.rows = {}
         
         self.layout = BoxLayout(orientation='vertical', padding=20, spacing=10)
         
@@ -245,20 +273,56 @@ class ManageIngredientsScreen(Screen):
     def on_enter(self):
         self.refresh_list()
     
+    @profiled()
     def refresh_list(self):
-        self.scroll_layout.clear_widgets()
+        # Only rows for changed ingredients or stock are touched
+        changes = self.ingredient_names.update()
+        for name, event in changes.items():
+            if event == 'removed':
+                row = self.rows.pop(name, None)
+                if row is not None:
+                    self.scroll_layout.remove_widget(row[0])
+            elif name in self.rows:
+                self.update_row(name)
+            else:
+                self.add_row(name)
+        
+        self.inventory.refresh()
+        for name in self.inventory.pop_changed():
+            if name in self.rows and name not in changes:
+                self.update_row(name)
+    
+    def row_text(self, name):
+        ingredient = self.data_manager.ingredients[name]
+        info = f"{name}\n{ingredient.quantity} {ingredient.unit} - ₹{ingredient.cost}"
+        info += f"\nStock: {self.inventory.balance(name):.2f} {ingredient.unit}"
+        if self.inventory.is_low(name):
+            info += ' (LOW)'
+        return info
+    
+    def update_row(self, name):
+        self.rows[name][1].text = self.row_text(name)
+    
+    def add_row(self, name):
+        item_layout = BoxLayout(size_hint_y=None, height=60, spacing=5)
         
-        for name, ingredient in self.data_manager.ingredients.items():
-            item_layout = BoxLayout(size_hint_y=None, height=60, spacing=5)
-            
-            info = f"{name}\n{ingredient.quantity} {ingredient.unit} - ₹{ingredient.cost}"
-            item_layout.add_widget(Label(text=info, size_hint_x=0.6))
-            
-            btn_edit = Button(text='Edit Cost', size_hint_x=0.4)
-            btn_edit.bind(on_press=lambda x, n=name: self.edit_cost(n))
-            item_layout.add_widget(btn_edit)
-            
-            self.scroll_layout.add_widget(item_layout)
+        label = Label(text=self.row_text(name), size_hint_x=0.4)
+        item_layout.add_widget(label)
+        
+        btn_edit = Button(text='Edit Cost', size_hint_x=0.2)
+        btn_edit.bind(on_press=lambda x, n=name: self.edit_cost(n))
+        item_layout.add_widget(btn_edit)
+        
+        btn_stock = Button(text='Receive', size_hint_x=0.2)
+        btn_stock.bind(on_press=lambda x, n=name: self.receive_stock(n))
+        item_layout.add_widget(btn_stock)
+        
+        btn_rename = Button(text='Rename', size_hint_x=0.2)
+        btn_rename.bind(on_press=lambda x, n=name: self.rename_ingredient(n))
+        item_layout.add_widget(btn_rename)
+        
+        self.scroll_layout.add_widget(item_layout)
+        self.rows[name] = (item_layout, label)
     
     def edit_cost(self, ingredient_name):
         ingredient = self.data_manager.get_ingredient(ingredient_name)
@@ -291,13 +355,100 @@ class ManageIngredientsScreen(Screen):
             self.refresh_list()
         except ValueError:
             pass
+    
+    def rename_ingredient(self, ingredient_name):
+        content = BoxLayout(orientation='vertical', padding=10, spacing=10)
+        content.add_widget(Label(text=f'Rename {ingredient_name}\n'
+                                      '(an existing name merges the two)'))
+        
+        name_input = TextInput(text=ingredient_name, multiline=False)
+        content.add_widget(name_input)
+        
+        btn_layout = BoxLayout(spacing=10)
+        
+        popup = Popup(title='Rename Ingredient', content=content, size_hint=(0.8, 0.4))
+        
+        btn_save = Button(text='Save')
+        btn_save.bind(on_press=lambda x: self.save_rename(ingredient_name, name_input.text.strip(), popup))
+        btn_layout.add_widget(btn_save)
+        
+        btn_cancel = Button(text='Cancel')
+        btn_cancel.bind(on_press=popup.dismiss)
+        btn_layout.add_widget(btn_cancel)
+        
+        content.add_widget(btn_layout)
+        popup.open()
+    
+    def save_rename(self, ingredient_name, new_name, popup):
+        if not new_name or new_name == ingredient_name:
+            popup.dismiss()
+            return
+        try:
+            if new_name in self.data_manager.ingredients:
+                self.data_manager.merge_ingredients(ingredient_name, new_name)
+            else:
+                self.data_manager.rename_ingredient(ingredient_name, new_name)
+            self.inventory.rename(ingredient_name, new_name)
+            popup.dismiss()
+            self.refresh_list()
+        except ValueError as e:
+            self.show_popup('Error', str(e))
+    
+    def receive_stock(self, ingredient_name):
+        content = BoxLayout(orientation='vertical', padding=10, spacing=10)
+        content.add_widget(Label(text=f'Stock received for {ingredient_name}'))
+        
+        quantity_input = TextInput(multiline=False, input_filter='float', hint_text='Quantity')
+        content.add_widget(quantity_input)
+        
+        price_input = TextInput(multiline=False, input_filter='float', hint_text='Price paid (₹, optional)')
+        content.add_widget(price_input)
+        
+        level_input = TextInput(multiline=False, input_filter='float', hint_text='Reorder level (optional)',
+                                text=str(self.inventory.reorder_levels.get(ingredient_name, '')))
+        content.add_widget(level_input)
+        
+        btn_layout = BoxLayout(spacing=10)
+        
+        popup = Popup(title='Receive Stock', content=content, size_hint=(0.8, 0.6))
+        
+        btn_save = Button(text='Save')
+        btn_save.bind(on_press=lambda x: self.save_stock(
+            ingredient_name, quantity_input.text, price_input.text, level_input.text, popup))
+        btn_layout.add_widget(btn_save)
+        
+        btn_cancel = Button(text='Cancel')
+        btn_cancel.bind(on_press=popup.dismiss)
+        btn_layout.add_widget(btn_cancel)
+        
+        content.add_widget(btn_layout)
+        popup.open()
+    
+    def save_stock(self, ingredient_name, quantity, price, level, popup):
+        try:
+            if quantity:
+                # The price paid is for the whole lot
+                unit_cost = float(price) / float(quantity) if price else None
+                self.inventory.receive(ingredient_name, float(quantity), unit_cost=unit_cost)
+            if level and float(level) != self.inventory.reorder_levels.get(ingredient_name):
+                self.inventory.set_reorder_level(ingredient_name, float(level))
+            popup.dismiss()
+            self.update_row(ingredient_name)
+        except ValueError:
+            pass
+    
+    def show_popup(self, title, message):
+        popup = Popup(title=title, content=Label(text=message), size_hint=(0.8, 0.3))
+        popup.open()
 
 
 class AddProductScreen(Screen):
-    def __init__(self, data_manager, **kwargs):
+    def __init__(self, data_manager, history, **kwargs):
         super().__init__(**kwargs)
         self.data_manager = data_manager
+        self.history = history
         self.product_ingredients = []
+        self.ingredient_names = CatalogNames(data_manager, 'ingredients')
         
         self.layout = BoxLayout(orientation='vertical', padding=20, spacing=10)
         
@@ -305,7 +456,7 @@ class AddProductScreen(Screen):
         self.layout.add_widget(title)
         
         # Product info
-        product_layout = GridLayout(cols=2, spacing=10, size_hint_y=0.15)
+        product_layout = GridLayout(cols=2, spacing=10, size_hint_y=0.2)
         product_layout.add_widget(Label(text='Product Name:'))
         self.product_name = TextInput(multiline=False)
         product_layout.add_widget(self.product_name)
@@ -318,13 +469,17 @@ class AddProductScreen(Screen):
         self.product_unit = Spinner(text='grams', values=['grams', 'milliliters', 'pieces'])
         product_layout.add_widget(self.product_unit)
         
+        product_layout.add_widget(Label(text='Category:'))
+        self.product_category = TextInput(multiline=False, hint_text='Optional')
+        product_layout.add_widget(self.product_category)
+        
         self.layout.add_widget(product_layout)
         
         # Add ingredient section
         ing_title = Label(text='Add Ingredients', size_hint_y=0.05)
         self.layout.add_widget(ing_title)
         
-        ing_form = GridLayout(cols=2, spacing=10, size_hint_y=0.15)
+        ing_form = GridLayout(cols=2, spacing=10, size_hint_y=0.25)
         
         ing_form.add_widget(Label(text='Ingredient:'))
         self.ing_spinner = Spinner(text='Select', values=['Select'])
@@ -338,6 +493,18 @@ class AddProductScreen(Screen):
         self.ing_unit = Spinner(text='grams', values=['grams', 'milliliters', 'pieces'])
         ing_form.add_widget(self.ing_unit)
         
+        ing_form.add_widget(Label(text='Yield (%):'))
+        self.ing_yield = TextInput(multiline=False, input_filter='float', hint_text='100 (no loss)')
+        ing_form.add_widget(self.ing_yield)
+        
+        ing_form.add_widget(Label(text='Scaling:'))
+        scaling_row = BoxLayout(spacing=5)
+        self.ing_scaling = Spinner(text='Linear', values=['Linear', 'Fixed', 'Round Up'])
+        scaling_row.add_widget(self.ing_scaling)
+        self.ing_step = TextInput(multiline=False, input_filter='float', hint_text='Step')
+        scaling_row.add_widget(self.ing_step)
+        ing_form.add_widget(scaling_row)
+        
         self.layout.add_widget(ing_form)
         
         btn_add_ing = Button(text='Add Ingredient to Product', size_hint_y=0.08)
@@ -363,13 +530,12 @@ class AddProductScreen(Screen):
         self.add_widget(self.layout)
     
     def on_enter(self):
-        ingredients = list(self.data_manager.ingredients.keys())
-        if ingredients:
-            self.ing_spinner.values = ingredients
-            self.ing_spinner.text = ingredients[0]
-        else:
-            self.ing_spinner.values = ['No ingredients available']
-            self.ing_spinner.text = 'No ingredients available'
+        self.refresh_list()
+    
+    @profiled()
+    def refresh_list(self):
+        if self.ingredient_names.update():
+            fill_spinner(self.ing_spinner, self.ingredient_names.names, 'No ingredients available')
     
     def add_ingredient_to_product(self, instance):
         try:
@@ -381,14 +547,38 @@ class AddProductScreen(Screen):
             quantity = float(self.ing_quantity.text)
             unit = self.ing_unit.text
             
-            self.product_ingredients.append({
+            line = {
                 'name': ing_name,
                 'quantity': quantity,
                 'unit': unit
-            })
+            }
+            # Optional loss and non-linear scaling, see scaling.py
+            if self.ing_yield.text:
+                line_yield = float(self.ing_yield.text) / 100
+                if line_yield <= 0:
+                    self.show_popup('Error', 'Yield must be above zero')
+                    return
+                if line_yield != 1:
+                    line['yield'] = line_yield
+            if self.ing_scaling.text == 'Fixed':
+                line['fixed'] = True
+            elif self.ing_scaling.text == 'Round Up':
+                step = float(self.ing_step.text)
+                if step <= 0:
+                    self.show_popup('Error', 'Step must be above zero')
+                    return
+                line['step'] = step
+            self.product_ingredients.append(line)
             
             self.update_ingredient_list()
+            
+            ingredient = self.data_manager.get_ingredient(ing_name)
+            if ingredient and ingredient.unit != unit:
+                self.show_popup('Warning', f'{ing_name} is priced in {ingredient.unit}, not {unit}')
             self.ing_quantity.text = ''
+            self.ing_yield.text = ''
+            self.ing_step.text = ''
+            self.ing_scaling.text = 'Linear'
         except ValueError:
             self.show_popup('Error', 'Please enter valid quantity')
     
@@ -396,11 +586,19 @@ class AddProductScreen(Screen):
         if self.product_ingredients:
             text = 'Ingredients:\n'
             for ing in self.product_ingredients:
-                text += f"- {ing['name']}: {ing['quantity']} {ing['unit']}\n"
+                text += f"- {ing['name']}: {ing['quantity']} {ing['unit']}"
+                if 'yield' in ing:
+                    text += f" ({ing['yield'] * 100:g}% yield)"
+                if ing.get('fixed'):
+                    text += ' fixed'
+                elif 'step' in ing:
+                    text += f" in steps of {ing['step']:g}"
+                text += '\n'
             self.ing_list_label.text = text
         else:
             self.ing_list_label.text = 'Ingredients: None added yet'
     
+    @profiled()
     def save_product(self, instance):
         try:
             name = self.product_name.text.strip()
@@ -415,10 +613,16 @@ class AddProductScreen(Screen):
                 self.show_popup('Error', 'Please add at least one ingredient')
                 return
             
-            product = Product(name, quantity, unit, self.product_ingredients.copy())
+            category = self.product_category.text.strip() or None
+            product = Product(name, quantity, unit, self.product_ingredients.copy(), category=category)
             self.data_manager.add_product(product)
             
-            self.show_popup('Success', f'Product "{name}" added successfully!')
+            # Saving over an existing product is an edit and becomes a new version
+            version = self.history.record(product)
+            if version > 1:
+                self.show_popup('Success', f'Product "{name}" saved as version {version}')
+            else:
+                self.show_popup('Success', f'Product "{name}" added successfully!')
             self.clear_inputs()
         except ValueError:
             self.show_popup('Error', 'Please enter valid numbers')
@@ -426,6 +630,7 @@ class AddProductScreen(Screen):
     def clear_inputs(self):
         self.product_name.text = ''
         self.product_quantity.text = ''
+        self.product_category.text = ''
         self.product_ingredients = []
         self.update_ingredient_list()
         self.ing_quantity.text = ''
@@ -436,16 +641,18 @@ class AddProductScreen(Screen):
 
 
 class ScaleRecipeScreen(Screen):
-    def __init__(self, data_manager, **kwargs):
+    def __init__(self, data_manager, inventory, **kwargs):
         super().__init__(**kwargs)
         self.data_manager = data_manager
+        self.inventory = inventory
+        self.product_names = CatalogNames(data_manager, 'products')
         
         layout = BoxLayout(orientation='vertical', padding=20, spacing=10)
         
         title = Label(text='Scale Recipe', font_size='20sp', size_hint_y=0.1)
         layout.add_widget(title)
         
-        form = GridLayout(cols=2, spacing=10, size_hint_y=0.25)
+        form = GridLayout(cols=2, spacing=10, size_hint_y=0.35)
         
         form.add_widget(Label(text='Select Product:'))
         self.product_spinner = Spinner(text='Select', values=['Select'])
@@ -459,6 +666,15 @@ class ScaleRecipeScreen(Screen):
         self.new_unit = Spinner(text='grams', values=['grams', 'milliliters', 'pieces'])
         form.add_widget(self.new_unit)
         
+        # Batch planning for the scaled quantity, in the product's unit
+        form.add_widget(Label(text='Mixer Capacities:'))
+        self.capacities = TextInput(multiline=False, hint_text='e.g. 20000,60000')
+        form.add_widget(self.capacities)
+        
+        form.add_widget(Label(text='Package Sizes:'))
+        self.package_sizes = TextInput(multiline=False, hint_text='e.g. 250,500,1000')
+        form.add_widget(self.package_sizes)
+        
         layout.add_widget(form)
         
         btn_scale = Button(text='Scale Recipe', size_hint_y=0.1)
@@ -480,6 +696,14 @@ class ScaleRecipeScreen(Screen):
         btn_save.bind(on_press=self.save_scaled_product)
         btn_layout.add_widget(btn_save)
         
+        btn_produce = Button(text='Record Production')
+        btn_produce.bind(on_press=self.record_production)
+        btn_layout.add_widget(btn_produce)
+        
+        btn_plan = Button(text='Plan Batches')
+        btn_plan.bind(on_press=self.plan_batches)
+        btn_layout.add_widget(btn_plan)
+        
         btn_back = Button(text='Back')
         btn_back.bind(on_press=lambda x: setattr(self.manager, 'current', 'main_menu'))
         btn_layout.add_widget(btn_back)
@@ -488,16 +712,17 @@ class ScaleRecipeScreen(Screen):
         self.add_widget(layout)
         
         self.scaled_ingredients = []
+        self.scaled_run = None
     
     def on_enter(self):
-        products = list(self.data_manager.products.keys())
-        if products:
-            self.product_spinner.values = products
-            self.product_spinner.text = products[0]
-        else:
-            self.product_spinner.values = ['No products available']
-            self.product_spinner.text = 'No products available'
+        self.refresh_list()
+    
+    @profiled()
+    def refresh_list(self):
+        if self.product_names.update():
+            fill_spinner(self.product_spinner, self.product_names.names, 'No products available')
     
+    @profiled()
     def scale_recipe(self, instance):
         try:
             product_name = self.product_spinner.text
@@ -514,26 +739,50 @@ class ScaleRecipeScreen(Screen):
             if product.unit != new_unit:
                 self.show_popup('Warning', 'Unit mismatch! Results may be inaccurate.')
             
-            scale_factor = new_quantity / product.quantity
+            scale_factor = scaling.scale_factor(product, new_quantity)
             
-            self.scaled_ingredients = []
+            self.scaled_ingredients = self.data_manager.scaler(product)(scale_factor)
+            self.scaled_run = (product, scale_factor)
             result_text = f'Scaled recipe for {new_quantity} {new_unit}:\n\n'
             
-            for ing in product.ingredients:
-                scaled_qty = ing['quantity'] * scale_factor
-                self.scaled_ingredients.append({
-                    'name': ing['name'],
-                    'quantity': scaled_qty,
-                    'unit': ing['unit']
-                })
-                result_text += f"{ing['name']}: {scaled_qty:.2f} {ing['unit']}\n"
+            for ing in self.scaled_ingredients:
+                result_text += f"{ing['name']}: {ing['quantity']:.2f} {ing['unit']}\n"
+            
+            # Fixed and rounded lines don't scale linearly, so roll up the scaled lines
+            scaled = Product(product_name, new_quantity, product.unit, self.scaled_ingredients)
+            facts = nutrition.rollup(scaled, self.data_manager)
+            energy = facts['nutrients']['energy_kcal']
+            if energy:
+                result_text += f'\nEnergy: {energy:.0f} kcal\n'
+            if facts['allergen_names']:
+                result_text += f"Allergens: {', '.join(facts['allergen_names'])}\n"
             
             self.result_label.text = result_text
             self.new_product_name.text = f"{product_name}_scaled"
-            
+        
         except ValueError:
             self.show_popup('Error', 'Please enter valid quantity')
     
+    @profiled()
+    def plan_batches(self, instance):
+        if self.scaled_run is None:
+            self.show_popup('Error', 'Please scale a recipe first')
+            return
+        product, factor = self.scaled_run
+        try:
+            capacities = [float(c) for c in self.capacities.text.split(',') if c.strip()]
+            sizes = [float(s) for s in self.package_sizes.text.split(',') if s.strip()]
+            entry = planner.plan(self.data_manager, {product.name: product.quantity * factor},
+                                 {product.name: capacities}, {product.name: sizes})[0]
+        except ValueError:
+            self.show_popup('Error', 'Capacities and package sizes must be positive numbers')
+            return
+        
+        text = planner.format_plan(entry)
+        text += f"\nEach run: recipe x {entry['run_factor']:.3g}"
+        self.result_label.text = text
+    
+    @profiled()
     def save_scaled_product(self, instance):
         try:
             if not self.scaled_ingredients:
@@ -548,26 +797,67 @@ class ScaleRecipeScreen(Screen):
             new_quantity = float(self.new_quantity.text)
             new_unit = self.new_unit.text
             
-            product = Product(name, new_quantity, new_unit, self.scaled_ingredients.copy())
+            # Saved as a reference to the base recipe, so the variant stays in
+            # sync when the base is edited; variants of variants point at the root
+            base, factor = self.scaled_run
+            if base.base is not None:
+                base_name, factor = base.base, factor * base.scale
+            else:
+                base_name = base.name
+            if name == base_name:
+                self.show_popup('Error', 'Please enter a new product name')
+                return
+            
+            product = Product(name, new_quantity, new_unit, base=base_name, scale=factor,
+                              category=base.category)
             self.data_manager.add_product(product)
             
             self.show_popup('Success', f'Scaled product "{name}" saved!')
             self.result_label.text = ''
             self.new_quantity.text = ''
             self.new_product_name.text = ''
-            
+        
         except ValueError:
             self.show_popup('Error', 'Invalid input')
     
+    @profiled()
+    def record_production(self, instance):
+        if self.scaled_run is None:
+            self.show_popup('Error', 'Please scale a recipe first')
+            return
+        
+        product, factor = self.scaled_run
+        try:
+            self.inventory.produce([self.scaled_run], data_manager=self.data_manager)
+        except InsufficientStock as e:
+            self.show_popup('Error', str(e))
+            return
+        
+        message = f'Stock deducted for {product.quantity * factor:g} {product.unit} of {product.name}'
+        low_stock = self.inventory.low_stock()
+        low_stock = [line['name'] for line in product.ingredients if line['name'] in low_stock]
+        if low_stock:
+            message += f"\nLow stock: {', '.join(low_stock)}"
+        self.show_popup('Success', message)
+    
     def show_popup(self, title, message):
         popup = Popup(title=title, content=Label(text=message), size_hint=(0.8, 0.3))
         popup.open()
 
 
 class PricingScreen(Screen):
-    def __init__(self, data_manager, **kwargs):
+    def __init__(self, data_manager, inventory, profiles, overheads, **kwargs):
         super().__init__(**kwargs)
         self.data_manager = data_manager
+        self.inventory = inventory
+        self.profiles = profiles
+        self.overheads = overheads
+        # Paise base costs for the Exact arithmetic
+        self.exact_costs = money.BaseCostCache(data_manager)
+        # Overhead rates for the current month, and what they were worked out from
+        self.allocation = None
+        self.allocation_key = None
+        self.product_names = CatalogNames(data_manager, 'products')
         
         main_layout = BoxLayout(orientation='vertical', padding=20, spacing=10)
         
@@ -582,6 +872,23 @@ class PricingScreen(Screen):
         self.product_spinner = Spinner(text='Select', values=['Select'], size_hint_y=None, height=40)
         layout.add_widget(self.product_spinner)
         
+        layout.add_widget(Label(text='Cost Method:', size_hint_y=None, height=40))
+        self.cost_method = Spinner(text='List Price', values=list(COST_METHOD_LABELS.keys()), size_hint_y=None, height=40)
+        layout.add_widget(self.cost_method)
+        
+        layout.add_widget(Label(text='Arithmetic:', size_hint_y=None, height=40))
+        self.arithmetic = Spinner(text='Float', values=['Float', 'Exact (paise)'], size_hint_y=None, height=40)
+        layout.add_widget(self.arithmetic)
+        
+        layout.add_widget(Label(text='Pricing Profile:', size_hint_y=None, height=40))
+        self.profile_spinner = Spinner(text='None', values=['None'], size_hint_y=None, height=40)
+        self.profile_spinner.bind(text=lambda x, text: self.apply_profile(text))
+        layout.add_widget(self.profile_spinner)
+        
+        layout.add_widget(Label(text='Overheads:', size_hint_y=None, height=40))
+        self.overhead_mode = Spinner(text='Flat', values=['Flat', 'Allocated'], size_hint_y=None, height=40)
+        layout.add_widget(self.overhead_mode)
+        
         layout.add_widget(Label(text='Wastage (%):',size_hint_y=None, height=40))
         self.wastage = TextInput(text='0', multiline=False, input_filter='float', size_hint_y=None, height=40)
         layout.add_widget(self.wastage)
@@ -610,12 +917,52 @@ class PricingScreen(Screen):
         self.profit = TextInput(text='0', multiline=False, input_filter='float', size_hint_y=None, height=40)
         layout.add_widget(self.profit)
         
+        layout.add_widget(Label(text='Target Price (₹):', size_hint_y=None, height=40))
+        self.target_price = TextInput(text='', multiline=False, input_filter='float', size_hint_y=None, height=40)
+        layout.add_widget(self.target_price)
+        
+        layout.add_widget(Label(text='Solve For:', size_hint_y=None, height=40))
+        self.solve_spinner = Spinner(text='Ingredient Spend', values=list(SOLVE_LABELS.keys()), size_hint_y=None, height=40)
+        layout.add_widget(self.solve_spinner)
+        
         scroll.add_widget(layout)
         main_layout.add_widget(scroll)
         
-        btn_calculate = Button(text='Calculate Price', size_hint_y=0.08)
+        btn_row = BoxLayout(size_hint_y=0.08, spacing=10)
+        
+        btn_calculate = Button(text='Calculate Price')
         btn_calculate.bind(on_press=self.calculate_price)
-        main_layout.add_widget(btn_calculate)
+        btn_row.add_widget(btn_calculate)
+        
+        btn_solve = Button(text='Solve for Target')
+        btn_solve.bind(on_press=self.solve_target)
+        btn_row.add_widget(btn_solve)
+        
+        btn_substitute = Button(text='Cheaper Recipe')
+        btn_substitute.bind(on_press=self.find_substitutions)
+        btn_row.add_widget(btn_substitute)
+        
+        btn_report = Button(text='Export Sheet')
+        btn_report.bind(on_press=self.export_report)
+        btn_row.add_widget(btn_report)
+        
+        main_layout.add_widget(btn_row)
+        
+        profile_row = BoxLayout(size_hint_y=0.08, spacing=10)
+        
+        btn_save_profile = Button(text='Save Profile')
+        btn_save_profile.bind(on_press=self.save_profile)
+        profile_row.add_widget(btn_save_profile)
+        
+        btn_reprice = Button(text='Reprice Category')
+        btn_reprice.bind(on_press=self.reprice_category)
+        profile_row.add_widget(btn_reprice)
+        
+        btn_overheads = Button(text='Overheads')
+        btn_overheads.bind(on_press=self.edit_overheads)
+        profile_row.add_widget(btn_overheads)
+        
+        main_layout.add_widget(profile_row)
         
         self.result_label = Label(text='', size_hint_y=0.12, font_size='16sp')
         main_layout.add_widget(self.result_label)
@@ -625,16 +972,248 @@ class PricingScreen(Screen):
         main_layout.add_widget(btn_back)
         
         self.add_widget(main_layout)
+        
+        # Live pricing: each field is parsed only when it changes, and the
+        # base cost is kept for the selected product, so a recompute is
+        # just the factor arithmetic
+        self.factors = {key: 0.0 for key in pricing.COST_FACTORS}
+        self.priced_base = None
+        self.live_price_event = Clock.create_trigger(self.update_live_price, LIVE_PRICE_DELAY)
+        for key in pricing.COST_FACTORS:
+            getattr(self, key).bind(text=lambda x, text, key=key: self.on_factor_text(key, text))
+        for spinner in (self.product_spinner, self.cost_method, self.arithmetic, self.overhead_mode):
+            spinner.bind(text=lambda x, text: self.schedule_live_price())
     
     def on_enter(self):
-        products = list(self.data_manager.products.keys())
-        if products:
-            self.product_spinner.values = products
-            self.product_spinner.text = products[0]
+        self.refresh_list()
+    
+    @profiled()
+    def refresh_list(self):
+        if self.product_names.update():
+            fill_spinner(self.product_spinner, self.product_names.names, 'No products available')
+        self.profiles.load()
+        self.profile_spinner.values = ['None'] + sorted(self.profiles.profiles)
+        self.overheads.load()
+        self.allocation = None
+    
+    def get_allocation(self):
+        # Rates are worked out once per month; new production or catalog
+        # changes in the month move them
+        key = (month_start(), self.data_manager.generation, self.inventory.seq)
+        if self.allocation is None or self.allocation_key != key:
+            volumes = period_volumes(self.inventory, key[0])
+            self.allocation = Allocation(self.data_manager, self.overheads, volumes, key[0])
+            self.allocation_key = key
+        return self.allocation
+    
+    def edit_overheads(self, instance):
+        content = BoxLayout(orientation='vertical', padding=10, spacing=10)
+        pools = '\n'.join(
+            f"{name}: ₹{pool['amount']:g}/month by {pool['driver']} -> {pool['factor']}"
+            for name, pool in sorted(self.overheads.pools.items()))
+        content.add_widget(Label(text=pools or 'No monthly overheads yet'))
+        
+        form = GridLayout(cols=2, spacing=10)
+        form.add_widget(Label(text='Overhead:'))
+        name_input = TextInput(multiline=False, hint_text='e.g. Rent')
+        form.add_widget(name_input)
+        
+        form.add_widget(Label(text='Monthly (₹):'))
+        amount_input = TextInput(multiline=False, input_filter='float')
+        form.add_widget(amount_input)
+        
+        form.add_widget(Label(text='Spread by:'))
+        driver_spinner = Spinner(text='volume', values=list(DRIVERS))
+        form.add_widget(driver_spinner)
+        
+        form.add_widget(Label(text='Charged as:'))
+        factor_spinner = Spinner(text='utilities', values=list(pricing.FIXED_FACTORS))
+        form.add_widget(factor_spinner)
+        
+        product_name = self.product_spinner.text
+        form.add_widget(Label(text=f'Batch minutes\n({product_name}):'))
+        minutes = self.overheads.batch_minutes.get(product_name)
+        minutes_input = TextInput(text='' if minutes is None else f'{minutes:g}', multiline=False,
+                                  input_filter='float')
+        form.add_widget(minutes_input)
+        content.add_widget(form)
+        
+        btn_layout = BoxLayout(spacing=10, size_hint_y=0.2)
+        
+        popup = Popup(title='Monthly Overheads', content=content, size_hint=(0.9, 0.8))
+        
+        btn_save = Button(text='Save')
+        btn_save.bind(on_press=lambda x: self.save_overheads(
+            name_input.text.strip(), amount_input.text, driver_spinner.text, factor_spinner.text,
+            product_name, minutes_input.text, popup))
+        btn_layout.add_widget(btn_save)
+        
+        btn_cancel = Button(text='Cancel')
+        btn_cancel.bind(on_press=popup.dismiss)
+        btn_layout.add_widget(btn_cancel)
+        
+        content.add_widget(btn_layout)
+        popup.open()
+    
+    def save_overheads(self, name, amount, driver, factor, product_name, minutes, popup):
+        try:
+            if name:
+                self.overheads.set_pool(name, float(amount), driver, factor)
+            if minutes and product_name in self.data_manager.products:
+                self.overheads.set_batch_minutes(product_name, float(minutes))
+        except ValueError:
+            self.show_popup('Error', 'Please enter valid numbers')
+            return
+        popup.dismiss()
+        self.allocation = None
+        self.priced_base = None
+        self.schedule_live_price()
+    
+    def apply_profile(self, profile_name):
+        # Fills the factor fields, which reprices through on_factor_text
+        factors = self.profiles.profiles.get(profile_name)
+        if factors is None:
+            return
+        for key in pricing.COST_FACTORS:
+            getattr(self, key).text = f'{factors.get(key, 0):g}'
+    
+    def save_profile(self, instance):
+        content = BoxLayout(orientation='vertical', padding=10, spacing=10)
+        content.add_widget(Label(text='Save the factors on screen as a profile,\n'
+                                      'optionally for a product category'))
+        
+        current = self.profile_spinner.text
+        name_input = TextInput(text='' if current == 'None' else current, multiline=False,
+                               hint_text='Profile name')
+        content.add_widget(name_input)
+        
+        product = self.data_manager.products.get(self.product_spinner.text)
+        category_input = TextInput(text=(product.category or '') if product else '', multiline=False,
+                                   hint_text='Category (optional)')
+        content.add_widget(category_input)
+        
+        btn_layout = BoxLayout(spacing=10)
+        
+        popup = Popup(title='Save Pricing Profile', content=content, size_hint=(0.8, 0.5))
+        
+        btn_save = Button(text='Save')
+        btn_save.bind(on_press=lambda x: self.store_profile(
+            name_input.text.strip(), category_input.text.strip(), popup))
+        btn_layout.add_widget(btn_save)
+        
+        btn_cancel = Button(text='Cancel')
+        btn_cancel.bind(on_press=popup.dismiss)
+        btn_layout.add_widget(btn_cancel)
+        
+        content.add_widget(btn_layout)
+        popup.open()
+    
+    def store_profile(self, name, category, popup):
+        if not name or name == 'None':
+            self.show_popup('Error', 'Please enter a profile name')
+            return
+        try:
+            self.profiles.set_profile(name, self.get_factors())
+            if category:
+                self.profiles.assign(category, name)
+        except ValueError:
+            self.show_popup('Error', 'Please enter valid numbers')
+            return
+        popup.dismiss()
+        self.profile_spinner.values = ['None'] + sorted(self.profiles.profiles)
+        self.profile_spinner.text = name
+    
+    @profiled()
+    def reprice_category(self, instance):
+        # Every product in the selected product's category, at its profile
+        product = self.data_manager.products.get(self.product_spinner.text)
+        if product is None or product.category is None:
+            self.show_popup('Error', 'Please select a product with a category')
+            return
+        if product.category not in self.profiles.categories:
+            self.show_popup('Error', f'No pricing profile for category "{product.category}"')
+            return
+        
+        prices = reprice(self.data_manager, self.profiles, product.category, self.get_unit_costs())
+        lines = [f'{name}: ₹{price:.2f}' for name, price in sorted(prices.items())[:20]]
+        if len(prices) > 20:
+            lines.append(f'... and {len(prices) - 20} more')
+        profile_name = self.profiles.categories[product.category]
+        self.result_label.text = (f'{product.category} ({profile_name}), {len(prices)} products:\n'
+                                  + '\n'.join(lines))
+    
+    def on_factor_text(self, key, text):
+        try:
+            self.factors[key] = float(text)
+        except ValueError:
+            # Mid-edit ('' or '.'); keep pricing with the last valid value
+            return
+        self.schedule_live_price()
+    
+    def schedule_live_price(self):
+        # Every edit pushes the recompute back, so typing a number prices once
+        self.live_price_event.cancel()
+        self.live_price_event()
+    
+    @profiled()
+    def update_live_price(self, dt):
+        if self.product_spinner.text in self.data_manager.products:
+            self.show_price(self.product_spinner.text)
+    
+    def base_key(self, product_name):
+        return (product_name, self.cost_method.text, self.arithmetic.text, self.overhead_mode.text,
+                self.data_manager.generation, self.inventory.seq)
+    
+    def get_priced_base(self, product_name):
+        # (key, base cost, result template, allocated overheads) for the
+        # selected product, cost method, arithmetic and overhead mode;
+        # rebuilt when any of those, the catalog or the stock ledger changes
+        if self.priced_base is None or self.priced_base[0] != self.base_key(product_name):
+            product = self.data_manager.get_product(product_name)
+            if self.arithmetic.text == 'Exact (paise)':
+                # Integer paise; list prices through the cache, lot costs
+                # taken to paise rows
+                unit_costs = self.get_unit_costs(product)
+                if unit_costs is None:
+                    base = self.exact_costs.base_cost(product_name)
+                else:
+                    base = money.base_cost(product, self.data_manager, money.unit_rows(unit_costs))
+            else:
+                base = pricing.base_cost(product, self.data_manager, self.get_unit_costs(product))
+            
+            header = f'Price Breakdown for {product_name}:\n'
+            # Lines that couldn't be costed make the price too low
+            issues = self.data_manager.integrity.product_issues(product_name)
+            footer = ''
+            if issues:
+                footer = '\n\nWarning: ' + '; '.join(integrity.describe(ref, problem) for ref, problem in issues)
+            
+            overhead = None
+            if self.overhead_mode.text == 'Allocated':
+                allocation = self.get_allocation()
+                overhead = allocation.per_batch(product)
+                if allocation.unallocated:
+                    footer += '\n\nNot allocated (nothing produced to spread over): ' + ', '.join(
+                        sorted(allocation.unallocated))
+            template = (header.replace('{', '{{').replace('}', '}}') + BREAKDOWN_TEMPLATE
+                        + footer.replace('{', '{{').replace('}', '}}'))
+            # Keyed after costing, which may have caught up on the stock ledger
+            self.priced_base = (self.base_key(product_name), base, template, overhead)
+        return self.priced_base
+    
+    def show_price(self, product_name):
+        key, base, template, overhead = self.get_priced_base(product_name)
+        # Allocated overheads stand in for the flat amounts they cover
+        factors = dict(self.factors, **overhead) if overhead else self.factors
+        if self.arithmetic.text == 'Exact (paise)':
+            # Shown in rupees
+            paise = money.price_breakdown(base, factors)
+            breakdown = {key: value / 100 for key, value in paise.items()}
         else:
-            self.product_spinner.values = ['No products available']
-            self.product_spinner.text = 'No products available'
+            breakdown = pricing.price_breakdown(base, factors)
+        self.result_label.text = template.format_map(dict(breakdown, **factors))
     
+    @profiled()
     def calculate_price(self, instance):
         try:
             product_name = self.product_spinner.text
@@ -642,58 +1221,117 @@ class PricingScreen(Screen):
                 self.show_popup('Error', 'Please select a product')
                 return
             
+            # Every field re-read and the base re-costed from current stock
+            self.factors = self.get_factors()
+            self.priced_base = None
+            self.show_price(product_name)
+        
+        except ValueError as e:
+            self.show_popup('Error', 'Please enter valid numbers')
+    
+    def get_factors(self):
+        return {
+            'wastage': float(self.wastage.text),
+            'utilities': float(self.utilities.text),
+            'packaging': float(self.packaging.text),
+            'shipping': float(self.shipping.text),
+            'taxes': float(self.taxes.text),
+            'labour': float(self.labour.text),
+            'profit': float(self.profit.text),
+        }
+    
+    def get_unit_costs(self, product=None):
+        # List prices, or the cost of the stock a run of this product
+        # would actually consume
+        method = COST_METHOD_LABELS[self.cost_method.text]
+        if method == 'list':
+            return None
+        self.inventory.refresh()
+        requirements = {}
+        for line in (product.ingredients if product else []):
+            requirements[line['name']] = requirements.get(line['name'], 0.0) + scaling.gross_quantity(line)
+        return self.inventory.lots.unit_cost_table(self.data_manager, method, requirements)
+    
+    @profiled()
+    def solve_target(self, instance):
+        try:
+            product_name = self.product_spinner.text
+            if product_name == 'Select' or product_name == 'No products available':
+                self.show_popup('Error', 'Please select a product')
+                return
+            
+            target = float(self.target_price.text)
+            unknown = SOLVE_LABELS[self.solve_spinner.text]
+            
             product = self.data_manager.get_product(product_name)
+            value = pricing.solve_for(unknown, target, self.get_factors(),
+                                      self.data_manager, [product_name],
+                                      self.get_unit_costs(product))[product_name]
+            if value is None:
+                self.show_popup('Error', 'Target price cannot be reached with these values')
+                return
             
-            # Calculate base cost from ingredients
-            base_cost = 0
-            for ing_data in product.ingredients:
-                ingredient = self.data_manager.get_ingredient(ing_data['name'])
-                if ingredient:
-                    # Calculate cost based on quantity
-                    cost_per_unit = ingredient.cost / ingredient.quantity
-                    ing_cost = cost_per_unit * ing_data['quantity']
-                    base_cost += ing_cost
-            
-            # Apply wastage percentage
-            wastage_pct = float(self.wastage.text) / 100
-            wastage_cost = base_cost * wastage_pct
-            
-            # Apply taxes percentage
-            taxes_pct = float(self.taxes.text) / 100
-            taxes_cost = base_cost * taxes_pct
-            
-            # Add fixed costs
-            utilities_cost = float(self.utilities.text)
-            packaging_cost = float(self.packaging.text)
-            shipping_cost = float(self.shipping.text)
-            labour_cost = float(self.labour.text)
-            
-            # Calculate subtotal
-            subtotal = (base_cost + wastage_cost + taxes_cost + 
-                       utilities_cost + packaging_cost + shipping_cost + labour_cost)
-            
-            # Apply profit margin
-            profit_pct = float(self.profit.text) / 100
-            profit_amount = subtotal * profit_pct
-            
-            final_price = subtotal + profit_amount
-            
-            # Display breakdown
-            result = f'Price Breakdown for {product_name}:\n'
-            result += f'Base Cost: ₹{base_cost:.2f}\n'
-            result += f'Wastage ({self.wastage.text}%): ₹{wastage_cost:.2f}\n'
-            result += f'Utilities: ₹{utilities_cost:.2f}\n'
-            result += f'Packaging: ₹{packaging_cost:.2f}\n'
-            result += f'Shipping: ₹{shipping_cost:.2f}\n'
-            result += f'Taxes ({self.taxes.text}%): ₹{taxes_cost:.2f}\n'
-            result += f'Labour: ₹{labour_cost:.2f}\n'
-            result += f'Subtotal: ₹{subtotal:.2f}\n'
-            result += f'Profit ({self.profit.text}%): ₹{profit_amount:.2f}\n'
-            result += f'\nFINAL PRICE: ₹{final_price:.2f}'
+            if unknown in pricing.PERCENT_FACTORS:
+                answer = f'{self.solve_spinner.text}: {value:.2f}%'
+            else:
+                answer = f'{self.solve_spinner.text}: ₹{value:.2f}'
             
+            result = f'To sell {product_name} at ₹{target:.2f}:\n{answer}'
+            if value < 0:
+                result += '\n(Negative - target is below cost)'
             self.result_label.text = result
+        
+        except ValueError:
+            self.show_popup('Error', 'Please enter valid numbers')
+    
+    @profiled()
+    def export_report(self, instance):
+        # Cost sheet for every product with the factors on screen
+        try:
+            path = 'cost_sheet.pdf'
+            count = reports.write_report(self.data_manager, path, factors=self.get_factors(),
+                                         unit_costs=self.get_unit_costs())
+            self.show_popup('Success', f'Cost sheet for {count} products saved to {path}')
+        except ValueError:
+            self.show_popup('Error', 'Please enter valid numbers')
+        except OSError as e:
+            self.show_popup('Error', f'Could not write report: {e}')
+    
+    @profiled()
+    def find_substitutions(self, instance):
+        try:
+            product_name = self.product_spinner.text
+            if product_name == 'Select' or product_name == 'No products available':
+                self.show_popup('Error', 'Please select a product')
+                return
             
-        except ValueError as e:
+            product = self.data_manager.get_product(product_name)
+            unit_costs = self.get_unit_costs(product)
+            
+            # A target price becomes a budget for ingredient spend
+            budget = None
+            if self.target_price.text:
+                budget = pricing.solve_for('base_cost', float(self.target_price.text),
+                                           self.get_factors(), self.data_manager,
+                                           [product_name])[product_name]
+            
+            plan = substitution.cheapest_recipe(product, self.data_manager, budget,
+                                                unit_costs=unit_costs)
+            
+            if not plan['substitutions']:
+                result = f'No cheaper substitutions for {product_name}'
+            else:
+                result = f'Substitutions for {product_name}:\n'
+                for name, alt_name in plan['substitutions'].items():
+                    result += f'{name} -> {alt_name}\n'
+            result += f'\nIngredient cost: ₹{plan["cost"]:.2f}'
+            if budget is not None:
+                result += f' (budget ₹{budget:.2f})'
+                if not plan['within_budget']:
+                    result += '\nBudget cannot be reached'
+            self.result_label.text = result
+        
+        except ValueError:
             self.show_popup('Error', 'Please enter valid numbers')
     
     def show_popup(self, title, message):
@@ -701,6 +1339,87 @@ class PricingScreen(Screen):
         popup.open()
 
 
+class StatsScreen(Screen):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        
+        layout = BoxLayout(orientation='vertical', padding=20, spacing=10)
+        
+        title = Label(text='Performance Stats', font_size='20sp', size_hint_y=0.1)
+        layout.add_widget(title)
+        
+        scroll = ScrollView(size_hint_y=0.6)
+        self.stats_label = Label(text='', size_hint_y=None, halign='left', valign='top')
+        self.stats_label.bind(width=lambda label, width: setattr(label, 'text_size', (width, None)))
+        self.stats_label.bind(texture_size=lambda label, size: setattr(label, 'height', size[1]))
+        scroll.add_widget(self.stats_label)
+        layout.add_widget(scroll)
+        
+        btn_layout = GridLayout(cols=2, spacing=10, size_hint_y=0.3)
+        
+        self.btn_toggle = Button()
+        self.btn_toggle.bind(on_press=self.toggle_profiling)
+        btn_layout.add_widget(self.btn_toggle)
+        
+        btn_reset = Button(text='Reset')
+        btn_reset.bind(on_press=self.reset_stats)
+        btn_layout.add_widget(btn_reset)
+        
+        btn_export = Button(text='Export Trace')
+        btn_export.bind(on_press=self.export_trace)
+        btn_layout.add_widget(btn_export)
+        
+        btn_back = Button(text='Back')
+        btn_back.bind(on_press=lambda x: setattr(self.manager, 'current', 'main_menu'))
+        btn_layout.add_widget(btn_back)
+        
+        layout.add_widget(btn_layout)
+        self.add_widget(layout)
+    
+    def on_enter(self):
+        self.refresh_stats()
+    
+    def refresh_stats(self):
+        self.btn_toggle.text = 'Disable Profiling' if profiler.enabled else 'Enable Profiling'
+        
+        rows = profiler.summary()
+        if not rows:
+            self.stats_label.text = 'No data recorded yet' if profiler.enabled else 'Profiling is off'
+            return
+        
+        text = ''
+        for row in rows:
+            text += f"{row['name']}\n"
+            text += (f"  {row['calls']} calls, {row['total_time'] * 1000:.1f} ms total, "
+                     f"{row['avg_time'] * 1000:.2f} ms avg, {row['max_time'] * 1000:.2f} ms max\n")
+            if row['bytes_read'] or row['bytes_written']:
+                text += f"  {row['bytes_read']} B read, {row['bytes_written']} B written\n"
+        self.stats_label.text = text
+    
+    def toggle_profiling(self, instance):
+        if profiler.enabled:
+            profiler.disable()
+        else:
+            profiler.enable()
+        self.refresh_stats()
+    
+    def reset_stats(self, instance):
+        profiler.reset()
+        self.refresh_stats()
+    
+    def export_trace(self, instance):
+        path = os.path.abspath('profile_trace.json')
+        try:
+            profiler.export_trace(path)
+            self.show_popup('Success', f'Trace saved to\n{path}')
+        except OSError:
+            self.show_popup('Error', 'Could not write trace file')
+    
+    def show_popup(self, title, message):
+        popup = Popup(title=title, content=Label(text=message), size_hint=(0.8, 0.3))
+        popup.open()
+
+
 def main():
     app = RecipeCalculatorApp()
     app.run()
@@ -710,16 +1429,74 @@ class RecipeCalculatorApp(App):
     def build(self):
         self.title = 'Recipe Calculator'
         self.data_manager = DataManager()
+        self.inventory = Inventory()
+        self.history = RecipeHistory()
+        self.profiles = PricingProfiles()
+        self.overheads = Overheads()
         
         sm = ScreenManager()
         sm.add_widget(MainMenuScreen(name='main_menu'))
         sm.add_widget(AddIngredientScreen(self.data_manager, name='add_ingredient'))
-        sm.add_widget(ManageIngredientsScreen(self.data_manager, name='manage_ingredients'))
-        sm.add_widget(AddProductScreen(self.data_manager, name='add_product'))
-        sm.add_widget(ScaleRecipeScreen(self.data_manager, name='scale_recipe'))
-        sm.add_widget(PricingScreen(self.data_manager, name='pricing'))
-        
+        sm.add_widget(ManageIngredientsScreen(self.data_manager, self.inventory, name='manage_ingredients'))
+        sm.add_widget(AddProductScreen(self.data_manager, self.history, name='add_product'))
+        sm.add_widget(ScaleRecipeScreen(self.data_manager, self.inventory, name='scale_recipe'))
+        sm.add_widget(PricingScreen(self.data_manager, self.inventory, self.profiles, self.overheads,
+                                    name='pricing'))
+        sm.add_widget(StatsScreen(name='stats'))
+        
+        # Pick up edits saved by other processes sharing the catalog files
+        Clock.schedule_interval(self.poll_catalog, CATALOG_POLL_INTERVAL)
+        
+        self.sm = sm
+        self.sync_engine = None
+        self.sync_server_file = SERVER_FILE
         return sm
+    
+    def poll_catalog(self, dt):
+        changes = self.data_manager.refresh()
+        # Recipes edited by other processes get versions too
+        for kind, name in changes:
+            product = self.data_manager.products.get(name) if kind == 'products' else None
+            if product is not None and product.base is None:
+                self.history.record(product)
+        if changes and hasattr(self.sm.current_screen, 'refresh_list'):
+            self.sm.current_screen.refresh_list()
+    
+    def open_sync(self):
+        content = BoxLayout(orientation='vertical', padding=10, spacing=10)
+        content.add_widget(Label(text='Sync server file (on a shared folder):'))
+        server_input = TextInput(text=self.sync_server_file, multiline=False)
+        content.add_widget(server_input)
+        status = Label(text='')
+        content.add_widget(status)
+        
+        buttons = BoxLayout(size_hint_y=0.3, spacing=10)
+        btn_sync = Button(text='Sync Now')
+        buttons.add_widget(btn_sync)
+        btn_close = Button(text='Close')
+        buttons.add_widget(btn_close)
+        content.add_widget(buttons)
+        
+        popup = Popup(title='Sync', content=content, size_hint=(0.8, 0.5))
+        
+        def sync_now(instance):
+            self.sync_server_file = server_input.text.strip() or SERVER_FILE
+            if self.sync_engine is None:
+                self.sync_engine = SyncEngine(self.data_manager, history=self.history)
+            try:
+                result = self.sync_engine.sync(SyncServer(self.sync_server_file))
+            except (OSError, ValueError) as e:
+                status.text = f'Sync failed: {e}'
+                return
+            status.text = format_result(result)
+            # Synced records were saved locally like any other edit
+            self.poll_catalog(0)
+            if hasattr(self.sm.current_screen, 'refresh_list'):
+                self.sm.current_screen.refresh_list()
+        
+        btn_sync.bind(on_press=sync_now)
+        btn_close.bind(on_press=popup.dismiss)
+        popup.open()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,237 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+
+from . import money, pricing
+from .harness import generate_catalog, scratch_dir
+from .models import Product, DataManager
+from .catalog import MappedCatalog, write_catalog
+from .packed import CODECS, pack_products, unpack_products
+from .planner import plan
+from .reports import WRITERS, write_report
+from .service import PricingClient, PricingService, start_server
+
+
+# Benchmarks, run with: python -m recipecalculator.bench <name>
+
+
+def _best_of(repeat, func):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench_startup(args):
+    with scratch_dir():
+        data_manager = DataManager()
+        generate_catalog(data_manager, args.ingredients, args.products, (args.lines, args.lines))
+        data_manager.save_data()
+        
+        json_time = _best_of(args.repeat, lambda: DataManager(use_snapshot=False))
+        snapshot_time = _best_of(args.repeat, DataManager)
+        
+        print(f'catalog: {args.ingredients} ingredients, {args.products} products, '
+              f'{args.lines} lines each')
+        print(f'json:     {json_time * 1000:8.1f} ms '
+              f'({os.path.getsize(data_manager.products_file) / 1e6:.1f} MB products.json)')
+        print(f'snapshot: {snapshot_time * 1000:8.1f} ms '
+              f'({os.path.getsize(data_manager.snapshot_file) / 1e6:.1f} MB)')
+        print(f'speedup:  {json_time / snapshot_time:8.1f}x')
+
+
+def bench_catalog(args):
+    with scratch_dir():
+        data_manager = DataManager(use_snapshot=False)
+        generate_catalog(data_manager, args.ingredients, args.products, (args.lines, args.lines))
+        data_manager.save_data()
+        write_catalog('catalog.bin', data_manager)
+        
+        rng = random.Random(1)
+        names = [f'product_{rng.randrange(args.products)}' for _ in range(10000)]
+        
+        load_time = _best_of(args.repeat, lambda: DataManager(use_snapshot=False))
+        open_time = _best_of(args.repeat, lambda: MappedCatalog('catalog.bin').close())
+        
+        with MappedCatalog('catalog.bin') as catalog:
+            lookup_time = _best_of(args.repeat, lambda: [catalog.get_product(n) for n in names])
+        
+        json_size = (os.path.getsize(data_manager.ingredients_file)
+                     + os.path.getsize(data_manager.products_file))
+        print(f'catalog: {args.ingredients} ingredients, {args.products} products, '
+              f'{args.lines} lines each')
+        print(f'json load:     {load_time * 1000:8.1f} ms ({json_size / 1e6:.1f} MB)')
+        print(f'mapped open:   {open_time * 1000:8.3f} ms '
+              f'({os.path.getsize("catalog.bin") / 1e6:.1f} MB)')
+        print(f'mapped lookup: {lookup_time / len(names) * 1e6:8.1f} us per product')
+
+
+def bench_service(args):
+    with scratch_dir():
+        data_manager = DataManager(use_snapshot=False)
+        generate_catalog(data_manager, args.ingredients, args.products, (args.lines, args.lines))
+    
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(start_server(PricingService(data_manager), port=0))
+    port = server.sockets[0].getsockname()[1]
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    
+    async def shutdown():
+        server.close()
+        pending = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        await asyncio.wait(pending, timeout=1) if pending else None
+    
+    try:
+        client = PricingClient(port=port)
+        rng = random.Random(2)
+        factors = {'wastage': 5, 'taxes': 18, 'labour': 20, 'profit': 30}
+        names = [f'product_{rng.randrange(args.products)}' for _ in range(args.requests)]
+        
+        start = time.perf_counter()
+        for name in names:
+            client.price([name], factors)
+        single = time.perf_counter() - start
+        
+        batch = 100
+        start = time.perf_counter()
+        for i in range(0, len(names), batch):
+            client.price(names[i:i + batch], factors)
+        batched = time.perf_counter() - start
+        client.close()
+        
+        print(f'{args.requests} prices over one keep-alive connection')
+        print(f'single:  {args.requests / single:8.0f} requests/s')
+        print(f'batched: {args.requests / batched:8.0f} prices/s ({batch} per request)')
+    finally:
+        asyncio.run_coroutine_threadsafe(shutdown(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+
+def bench_storage(args):
+    with scratch_dir():
+        data_manager = DataManager(use_snapshot=False)
+        generate_catalog(data_manager, args.ingredients, args.products, (args.lines, args.lines))
+        products = data_manager.products
+        
+        def write_json():
+            with open('products.json', 'w') as f:
+                f.write(json.dumps({k: v.to_dict() for k, v in products.items()}))
+        
+        def read_json():
+            with open('products.json', 'r') as f:
+                return {k: Product.from_dict(v) for k, v in json.load(f).items()}
+        
+        results = [('json', _best_of(args.repeat, write_json), _best_of(args.repeat, read_json),
+                    os.path.getsize('products.json'))]
+        
+        for codec in sorted(CODECS):
+            def write_packed():
+                with open('products.pack', 'wb') as f:
+                    f.write(pack_products(products, codec))
+            
+            def read_packed():
+                with open('products.pack', 'rb') as f:
+                    return unpack_products(f.read(), Product)
+            
+            results.append((codec, _best_of(args.repeat, write_packed),
+                            _best_of(args.repeat, read_packed), os.path.getsize('products.pack')))
+        
+        print(f'{args.products} products, {args.lines} lines each')
+        for label, write_time, read_time, size in results:
+            print(f'{label:5} write {write_time * 1000:8.1f} ms  read {read_time * 1000:8.1f} ms  '
+                  f'{size / 1e6:6.2f} MB')
+
+
+def bench_report(args):
+    with scratch_dir():
+        data_manager = DataManager(use_snapshot=False)
+        generate_catalog(data_manager, args.ingredients, args.products, (args.lines, args.lines))
+        factors = {'wastage': 5, 'taxes': 18, 'labour': 20, 'profit': 30}
+        
+        print(f'{args.products} products, {args.lines} lines each')
+        for fmt in sorted(WRITERS):
+            for workers in sorted({1, args.workers}):
+                path = f'cost_sheet.{fmt}'
+                elapsed = _best_of(args.repeat, lambda: write_report(
+                    data_manager, path, factors=factors, workers=workers))
+                print(f'{fmt:4} workers={workers:<2} {elapsed * 1000:8.1f} ms  '
+                      f'{os.path.getsize(path) / 1e6:6.2f} MB')
+
+
+def bench_plan(args):
+    with scratch_dir():
+        data_manager = DataManager(use_snapshot=False)
+        generate_catalog(data_manager, args.ingredients, args.products, (args.lines, args.lines))
+    
+    rng = random.Random(3)
+    names = rng.sample(list(data_manager.products), min(args.orders, args.products))
+    orders = {name: rng.uniform(100, 200000) for name in names}
+    capacities = {'grams': [20000, 60000], 'milliliters': [50000], 'pieces': [500, 2000]}
+    packages = {'grams': [250, 500, 1000], 'milliliters': [330, 500, 1000], 'pieces': [6, 12, 24]}
+    
+    elapsed = _best_of(args.repeat, lambda: plan(data_manager, orders, capacities, packages))
+    print(f'{len(orders)} orders: {elapsed * 1000:8.1f} ms '
+          f'({elapsed / len(orders) * 1e6:.1f} us per order, package tables included)')
+
+
+def bench_money(args):
+    with scratch_dir():
+        data_manager = DataManager(use_snapshot=False)
+        generate_catalog(data_manager, args.ingredients, args.products, (args.lines, args.lines))
+    
+    cache = money.BaseCostCache(data_manager)
+    cache.base_costs()
+    names = list(data_manager.ingredients)
+    
+    def cost_edit():
+        # A price change: new unit costs, recipes untouched
+        data_manager.ingredients[names[0]].cost += 1
+        data_manager.generation += 1
+        cache.base_costs()
+    
+    float_time = _best_of(args.repeat, lambda: pricing.base_costs(data_manager))
+    cold_time = _best_of(args.repeat, lambda: money.base_costs(data_manager))
+    edit_time = _best_of(args.repeat, cost_edit)
+    print(f'{args.products} products, {args.lines} lines each')
+    print(f'float:               {float_time * 1000:8.1f} ms')
+    print(f'paise, cold:         {cold_time * 1000:8.1f} ms')
+    print(f'paise, after edit:   {edit_time * 1000:8.1f} ms (BaseCostCache)')
+
+
+BENCHMARKS = {
+    'startup': bench_startup,
+    'catalog': bench_catalog,
+    'service': bench_service,
+    'storage': bench_storage,
+    'report': bench_report,
+    'plan': bench_plan,
+    'money': bench_money,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m recipecalculator.bench')
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS))
+    parser.add_argument('--ingredients', type=int, default=2000)
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--lines', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--orders', type=int, default=500)
+    args = parser.parse_args(argv)
+    BENCHMARKS[args.benchmark](args)
+
+
+if __name__ == '__main__':
+    main()
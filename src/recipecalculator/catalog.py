@@ -0,0 +1,281 @@
+import json
+import mmap
+import os
+import struct
+from collections.abc import Mapping
+
+from .models import Ingredient, Product
+
+
+# Read-only memory-mapped catalog.
+#
+# Layout (little endian):
+#
+#   header        magic, record counts, unit list and section offsets
+#   ingredients   fixed-width records sorted by name
+#   products      fixed-width records sorted by name
+#   lines         fixed-width recipe lines, contiguous per product
+#   alternatives  u32 ingredient indexes, contiguous per ingredient
+#   strings       UTF-8 string table referenced by (offset, length)
+#
+# Records are sorted by name, so a lookup is a binary search over the
+# record array comparing names straight from the mapped pages; only the
+# record that is found gets decoded into an object. Every process that
+# opens the same file shares one page-cached copy.
+#
+# Products are written as DataManager.get_product returns them, so scaled
+# variants carry their materialized lines. Ingredient and line ids are
+# string columns; anything else beyond the fixed columns (nutrients,
+# allergens, category, base and scale, line yield/fixed/step) is a small
+# JSON string per record, empty for plain records.
+
+MAGIC = b'RCCATLG2'
+HEADER = struct.Struct('<8sIIIIIIQQQQQ')
+INGREDIENT = struct.Struct('<IIddIIIIIII')
+PRODUCT = struct.Struct('<IIdIIIII')
+LINE = struct.Struct('<IIIdIIIII')
+INDEX = struct.Struct('<I')
+
+NO_INGREDIENT = 0xFFFFFFFF
+# String offset of a missing (None) string
+NO_STRING = 0xFFFFFFFF
+
+INGREDIENT_KEYS = ('name', 'quantity', 'unit', 'cost', 'alternatives', 'id')
+PRODUCT_KEYS = ('name', 'quantity', 'unit', 'ingredients')
+LINE_KEYS = ('name', 'quantity', 'unit', 'id')
+INGREDIENT_DEFAULTS = {'nutrients': {}, 'allergens': 0}
+
+
+class _StringTable:
+    def __init__(self):
+        self.data = bytearray()
+        self.refs = {}
+    
+    def add(self, text):
+        ref = self.refs.get(text)
+        if ref is None:
+            encoded = text.encode('utf-8')
+            ref = self.refs[text] = (len(self.data), len(encoded))
+            self.data += encoded
+        return ref
+    
+    def add_optional(self, text):
+        return (NO_STRING, 0) if text is None else self.add(text)
+    
+    def add_extra(self, data, keys, defaults=None):
+        # JSON of the keys beyond the fixed columns that aren't at their
+        # defaults, empty when there are none
+        defaults = defaults or {}
+        extra = {k: v for k, v in data.items() if k not in keys and v != defaults.get(k)}
+        return self.add(json.dumps(extra, sort_keys=True) if extra else '')
+
+
+def write_catalog(path, data_manager):
+    strings = _StringTable()
+    ingredients = data_manager.ingredients
+    products = {name: data_manager.get_product(name) for name in data_manager.products}
+    
+    units = sorted({i.unit for i in ingredients.values()}
+                   | {p.unit for p in products.values()}
+                   | {line['unit'] for p in products.values() for line in p.ingredients})
+    unit_ids = {unit: i for i, unit in enumerate(units)}
+    units_ref = strings.add('\n'.join(units))
+    
+    # Python orders str by code point, which matches UTF-8 byte order
+    ingredient_names = sorted(ingredients)
+    ingredient_index = {name: i for i, name in enumerate(ingredient_names)}
+    product_names = sorted(products)
+    
+    ingredient_blob = bytearray()
+    alternative_blob = bytearray()
+    n_alternatives = 0
+    for name in ingredient_names:
+        ingredient = ingredients[name]
+        alt_start = n_alternatives
+        for alt_name in ingredient.alternatives:
+            if alt_name in ingredient_index:
+                alternative_blob += INDEX.pack(ingredient_index[alt_name])
+                n_alternatives += 1
+        name_off, name_len = strings.add(name)
+        ingredient_blob += INGREDIENT.pack(name_off, name_len, ingredient.quantity, ingredient.cost,
+                                           unit_ids[ingredient.unit], alt_start,
+                                           n_alternatives - alt_start,
+                                           *strings.add_optional(ingredient.id),
+                                           *strings.add_extra(ingredient.to_dict(), INGREDIENT_KEYS,
+                                                              INGREDIENT_DEFAULTS))
+    
+    product_blob = bytearray()
+    line_blob = bytearray()
+    n_lines = 0
+    for name in product_names:
+        product = products[name]
+        for line in product.ingredients:
+            # Dangling lines keep their name so they survive a round trip
+            line_off, line_len = strings.add(line['name'])
+            line_blob += LINE.pack(ingredient_index.get(line['name'], NO_INGREDIENT),
+                                   line_off, line_len, line['quantity'], unit_ids[line['unit']],
+                                   *strings.add_optional(line.get('id')),
+                                   *strings.add_extra(line, LINE_KEYS))
+        name_off, name_len = strings.add(name)
+        product_blob += PRODUCT.pack(name_off, name_len, product.quantity, unit_ids[product.unit],
+                                     n_lines, len(product.ingredients),
+                                     *strings.add_extra(product.to_dict(), PRODUCT_KEYS))
+        n_lines += len(product.ingredients)
+    
+    ingredients_at = HEADER.size
+    products_at = ingredients_at + len(ingredient_blob)
+    lines_at = products_at + len(product_blob)
+    alternatives_at = lines_at + len(line_blob)
+    strings_at = alternatives_at + len(alternative_blob)
+    
+    header = HEADER.pack(MAGIC, len(ingredient_names), len(product_names), n_lines,
+                         n_alternatives, units_ref[0], units_ref[1], ingredients_at,
+                         products_at, lines_at, alternatives_at, strings_at)
+    
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        f.write(ingredient_blob)
+        f.write(product_blob)
+        f.write(line_blob)
+        f.write(alternative_blob)
+        f.write(strings.data)
+    os.replace(tmp_path, path)
+
+
+class _RecordMapping(Mapping):
+    # Read-only dict view so code written against DataManager.ingredients
+    # and DataManager.products works on a mapped catalog
+    def __init__(self, getter, names, count):
+        self._getter = getter
+        self._names = names
+        self._count = count
+    
+    def __getitem__(self, name):
+        record = self._getter(name)
+        if record is None:
+            raise KeyError(name)
+        return record
+    
+    def __iter__(self):
+        return self._names()
+    
+    def __len__(self):
+        return self._count
+    
+    def __contains__(self, name):
+        return self._getter(name) is not None
+
+
+class MappedCatalog:
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        
+        (magic, self.n_ingredients, self.n_products, self.n_lines, self.n_alternatives,
+         units_off, units_len, self._ingredients_at, self._products_at, self._lines_at,
+         self._alternatives_at, self._strings_at) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self._mm.close()
+            raise ValueError(f'{path} is not a recipe catalog file')
+        
+        units = self._string(units_off, units_len)
+        self._units = units.split('\n') if units else []
+        
+        self.ingredients = _RecordMapping(self.get_ingredient, self.ingredient_names,
+                                          self.n_ingredients)
+        self.products = _RecordMapping(self.get_product, self.product_names, self.n_products)
+    
+    def close(self):
+        self._mm.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    def _string(self, offset, length):
+        start = self._strings_at + offset
+        return self._mm[start:start + length].decode('utf-8')
+    
+    def _optional_string(self, offset, length):
+        return None if offset == NO_STRING else self._string(offset, length)
+    
+    def _extra(self, offset, length):
+        return json.loads(self._string(offset, length)) if length else {}
+    
+    def _name_bytes(self, offset, length):
+        start = self._strings_at + offset
+        return self._mm[start:start + length]
+    
+    def _find(self, name, base, record, count):
+        key = name.encode('utf-8')
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            name_off, name_len = struct.unpack_from('<II', self._mm, base + mid * record.size)
+            found = self._name_bytes(name_off, name_len)
+            if found < key:
+                lo = mid + 1
+            elif found > key:
+                hi = mid
+            else:
+                return mid
+        return None
+    
+    def _ingredient_at(self, index):
+        (name_off, name_len, quantity, cost, unit, alt_start, alt_count, id_off, id_len,
+         extra_off, extra_len) = INGREDIENT.unpack_from(self._mm, self._ingredients_at + index * INGREDIENT.size)
+        alternatives = []
+        for i in range(alt_start, alt_start + alt_count):
+            alt_index, = INDEX.unpack_from(self._mm, self._alternatives_at + i * INDEX.size)
+            alternatives.append(self.ingredient_name(alt_index))
+        extra = self._extra(extra_off, extra_len)
+        return Ingredient(self._string(name_off, name_len), quantity, self._units[unit], cost,
+                          alternatives, extra.get('nutrients'), extra.get('allergens', 0),
+                          self._optional_string(id_off, id_len))
+    
+    def _product_at(self, index):
+        (name_off, name_len, quantity, unit, line_start, line_count,
+         extra_off, extra_len) = PRODUCT.unpack_from(self._mm, self._products_at + index * PRODUCT.size)
+        lines = []
+        for i in range(line_start, line_start + line_count):
+            (_, line_off, line_len, line_qty, line_unit, id_off, id_len,
+             line_extra_off, line_extra_len) = LINE.unpack_from(self._mm, self._lines_at + i * LINE.size)
+            line = {
+                'name': self._string(line_off, line_len),
+                'quantity': line_qty,
+                'unit': self._units[line_unit]
+            }
+            if id_off != NO_STRING:
+                line['id'] = self._string(id_off, id_len)
+            if line_extra_len:
+                line.update(self._extra(line_extra_off, line_extra_len))
+            lines.append(line)
+        data = dict(self._extra(extra_off, extra_len), name=self._string(name_off, name_len),
+                    quantity=quantity, unit=self._units[unit], ingredients=lines)
+        return Product.from_dict(data)
+    
+    def ingredient_name(self, index):
+        name_off, name_len = struct.unpack_from('<II', self._mm, self._ingredients_at + index * INGREDIENT.size)
+        return self._string(name_off, name_len)
+    
+    def product_name(self, index):
+        name_off, name_len = struct.unpack_from('<II', self._mm, self._products_at + index * PRODUCT.size)
+        return self._string(name_off, name_len)
+    
+    def ingredient_names(self):
+        return (self.ingredient_name(i) for i in range(self.n_ingredients))
+    
+    def product_names(self):
+        return (self.product_name(i) for i in range(self.n_products))
+    
+    def get_ingredient(self, name):
+        index = self._find(name, self._ingredients_at, INGREDIENT, self.n_ingredients)
+        return None if index is None else self._ingredient_at(index)
+    
+    def get_product(self, name):
+        index = self._find(name, self._products_at, PRODUCT, self.n_products)
+        return None if index is None else self._product_at(index)
@@ -0,0 +1,130 @@
+from collections import deque
+
+from .pricing import unit_cost_table
+
+
+# Lot costing.
+#
+# Purchases are recorded as lots (quantity, unit cost). Two views are kept
+# up to date as lots arrive and stock is consumed, so costing never rescans
+# purchase history:
+#
+#   fifo     open lots per ingredient, oldest first; consumption eats the
+#            head lot, so each lot is touched once when it is used up
+#   average  running (quantity, value) per ingredient; consumption removes
+#            quantity at the current average
+#
+# Ingredients with no open lots fall back to their list price
+# (Ingredient.cost / Ingredient.quantity).
+
+COST_METHODS = ('list', 'fifo', 'average')
+
+
+class LotBook:
+    def __init__(self, state=None):
+        state = state or {}
+        # name -> deque of [quantity, unit cost], oldest first
+        self.lots = {name: deque(lots) for name, lots in state.get('lots', {}).items()}
+        # name -> [quantity, value] for the weighted average
+        self.averages = state.get('averages', {})
+    
+    def to_dict(self):
+        return {
+            'lots': {name: list(lots) for name, lots in self.lots.items() if lots},
+            'averages': self.averages,
+        }
+    
+    def receive(self, name, quantity, unit_cost=None):
+        if quantity <= 0:
+            return
+        if unit_cost is None:
+            # Stock found in a count has no purchase price; carry it at the
+            # current average so it doesn't skew either view
+            unit_cost = self.average_cost(name)
+            if unit_cost is None:
+                return
+        self.lots.setdefault(name, deque()).append([quantity, unit_cost])
+        average = self.averages.setdefault(name, [0.0, 0.0])
+        average[0] += quantity
+        average[1] += quantity * unit_cost
+    
+    def consume(self, name, quantity):
+        lots = self.lots.get(name)
+        remaining = quantity
+        while lots and remaining > 0:
+            head = lots[0]
+            if head[0] > remaining:
+                head[0] -= remaining
+                break
+            remaining -= head[0]
+            lots.popleft()
+        
+        average = self.averages.get(name)
+        if average is not None:
+            if quantity >= average[0]:
+                average[0] = average[1] = 0.0
+            else:
+                average[1] -= quantity * average[1] / average[0]
+                average[0] -= quantity
+    
+    def rename(self, old_name, new_name):
+        # Also merges: old's lots queue behind new's, averages add up
+        lots = self.lots.pop(old_name, None)
+        if lots:
+            self.lots.setdefault(new_name, deque()).extend(lots)
+        average = self.averages.pop(old_name, None)
+        if average is not None:
+            merged = self.averages.setdefault(new_name, [0.0, 0.0])
+            merged[0] += average[0]
+            merged[1] += average[1]
+    
+    def average_cost(self, name):
+        average = self.averages.get(name)
+        if not average or average[0] <= 0:
+            return None
+        return average[1] / average[0]
+    
+    def fifo_cost(self, name, quantity):
+        # Cost of the next `quantity` units out of stock; only the lots
+        # that would be consumed are visited. Demand beyond stock is
+        # priced at the newest lot.
+        lots = self.lots.get(name)
+        if not lots:
+            return None
+        total = 0.0
+        remaining = quantity
+        for lot_quantity, unit_cost in lots:
+            used = min(lot_quantity, remaining)
+            total += used * unit_cost
+            remaining -= used
+            if remaining <= 0:
+                return total
+        return total + remaining * lots[-1][1]
+    
+    def unit_cost(self, name, method, quantity=None):
+        if method == 'average':
+            return self.average_cost(name)
+        if method == 'fifo':
+            lots = self.lots.get(name)
+            if not lots:
+                return None
+            if not quantity:
+                return lots[0][1]
+            return self.fifo_cost(name, quantity) / quantity
+        return None
+    
+    def unit_cost_table(self, data_manager, method='fifo', requirements=None):
+        # Same shape as pricing.unit_cost_table, so the result can be passed
+        # as unit_costs to pricing and substitution. requirements maps
+        # ingredient -> quantity about to be used, for FIFO layers.
+        if method not in COST_METHODS:
+            raise ValueError(f'Unknown cost method {method!r}')
+        table = unit_cost_table(data_manager)
+        if method == 'list':
+            return table
+        requirements = requirements or {}
+        for name in table:
+            cost = self.unit_cost(name, method, requirements.get(name))
+            if cost is not None:
+                table[name] = cost
+        return table
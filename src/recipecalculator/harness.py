@@ -0,0 +1,403 @@
+import argparse
+import contextlib
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from . import money, pricing
+from .integrity import validate
+from .models import Ingredient, Product, DataManager
+from .packed import CODECS, pack_products, unpack_products
+from .planner import PackingTable
+from .scaling import scale_ingredients
+
+
+# Headless property and load checks, run with:
+#
+#   python -m recipecalculator.harness properties --cases 200 --seed 0
+#   python -m recipecalculator.harness load --mutations 2000 --workers 4
+#
+# Every case draws its own synthetic catalog from generate_catalog with a
+# seed derived from --seed, so a failure report names the seed that
+# reproduces it (--seed N --cases 1). Exits non-zero if anything fails.
+#
+# generate_catalog also builds the catalogs for bench.
+
+UNIT_MIX = {'grams': 0.6, 'milliliters': 0.25, 'pieces': 0.15}
+
+# Relative tolerance for float comparisons
+TOLERANCE = 1e-9
+
+
+def _close(a, b, tolerance=TOLERANCE):
+    return abs(a - b) <= tolerance * max(1.0, abs(a), abs(b))
+
+
+@contextlib.contextmanager
+def scratch_dir():
+    # Runs the block in a fresh temporary directory, removed afterwards
+    workdir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    try:
+        os.chdir(workdir)
+        yield workdir
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir)
+
+
+def generate_catalog(data_manager, n_ingredients=200, n_products=500, fanout=(3, 12),
+                     unit_mix=None, options=0.0, seed=0):
+    # Seeded catalog: fanout is the (min, max) lines per recipe, unit_mix
+    # the weight of each unit, options the chance a line gets a yield,
+    # fixed or step option (see scaling)
+    rng = random.Random(seed)
+    units, weights = zip(*(unit_mix or UNIT_MIX).items())
+    for i in range(n_ingredients):
+        unit = rng.choices(units, weights)[0]
+        name = f'ingredient_{i}'
+        data_manager.ingredients[name] = Ingredient(
+            name, rng.choice([1, 12, 100, 250, 500, 1000]), unit, round(rng.uniform(1, 900), 2),
+            id=f'{i:x}')
+    
+    names = list(data_manager.ingredients.keys())
+    for i in range(n_products):
+        product = Product(f'product_{i}', rng.choice([1, 6, 12, 500, 1000]),
+                          rng.choices(units, weights)[0])
+        for ing_name in rng.sample(names, min(rng.randint(*fanout), len(names))):
+            ingredient = data_manager.ingredients[ing_name]
+            product.add_ingredient(ing_name, round(rng.uniform(0.5, 500), 1), ingredient.unit,
+                                   ingredient.id)
+            if rng.random() < options:
+                option = rng.choice(['yield', 'fixed', 'step'])
+                line = product.ingredients[-1]
+                line[option] = {'yield': round(rng.uniform(0.5, 1.5), 2), 'fixed': True,
+                                'step': rng.choice([1, 6, 50])}[option]
+        data_manager.products[product.name] = product
+    return data_manager
+
+
+def _random_factors(rng):
+    return {key: round(rng.uniform(0, 60), 2) for key in pricing.COST_FACTORS}
+
+
+# Properties: each takes a seeded Random, runs in an empty scratch
+# directory and raises AssertionError on failure
+PROPERTIES = {}
+
+
+def prop(func):
+    PROPERTIES[func.__name__] = func
+    return func
+
+
+def _catalog(rng, use_snapshot=False, **kwargs):
+    data_manager = DataManager(use_snapshot=use_snapshot)
+    kwargs.setdefault('n_ingredients', rng.randint(5, 60))
+    kwargs.setdefault('n_products', rng.randint(1, 40))
+    kwargs.setdefault('fanout', (1, 8))
+    return generate_catalog(data_manager, seed=rng.random(), **kwargs)
+
+
+@prop
+def scale_round_trip(rng):
+    # Scaling up then back down restores every linear and fixed line; step
+    # lines round up to the next whole step instead
+    data_manager = _catalog(rng, options=0.3)
+    for product in data_manager.products.values():
+        factor = rng.uniform(0.05, 20)
+        up = data_manager.scaler(product)(factor)
+        for line, scaled in zip(product.ingredients, up):
+            expected = line['quantity'] if line.get('fixed') else line['quantity'] * factor
+            step = line.get('step')
+            if step:
+                assert expected - TOLERANCE <= scaled['quantity'] < expected + step, (line, scaled)
+                assert _close(scaled['quantity'] / step, round(scaled['quantity'] / step)), scaled
+        
+        bigger = Product(product.name, product.quantity * factor, product.unit, up)
+        down = scale_ingredients(bigger, 1 / factor)
+        for line, restored in zip(product.ingredients, down):
+            if not line.get('step'):
+                assert _close(restored['quantity'], line['quantity']), (line, restored)
+
+
+@prop
+def price_monotonic(rng):
+    # Raising any cost factor, the base cost or an ingredient's cost never
+    # lowers the price, in floats or in paise
+    data_manager = _catalog(rng, options=0.2)
+    factors = _random_factors(rng)
+    for product in data_manager.products.values():
+        base = pricing.base_cost(product, data_manager)
+        paise = money.base_cost(product, data_manager)
+        price = pricing.final_price(base, factors)
+        exact = money.price_breakdown(paise, factors)['final_price']
+        for key in pricing.COST_FACTORS:
+            bumped = dict(factors, **{key: factors[key] + round(rng.uniform(0.01, 50), 2)})
+            assert pricing.final_price(base, bumped) >= price - TOLERANCE * price, key
+            assert money.price_breakdown(paise, bumped)['final_price'] >= exact, key
+        assert pricing.final_price(base + rng.uniform(0.01, 100), factors) >= price
+        assert money.price_breakdown(paise + rng.randint(1, 10000), factors)['final_price'] >= exact
+    
+    for product in data_manager.products.values():
+        if not product.ingredients:
+            continue
+        before = pricing.base_cost(product, data_manager)
+        ingredient = data_manager.ingredients[rng.choice(product.ingredients)['name']]
+        ingredient.cost += round(rng.uniform(0.01, 100), 2)
+        assert pricing.base_cost(product, data_manager) >= before - TOLERANCE * before, product.name
+
+
+@prop
+def batch_prices_agree(rng):
+    # final_prices folds the factors once; it must match the breakdown
+    data_manager = _catalog(rng)
+    factors = _random_factors(rng)
+    bases = pricing.base_costs(data_manager)
+    for name, price in pricing.final_prices(bases, factors).items():
+        assert _close(price, pricing.final_price(bases[name], factors)), name
+
+
+@prop
+def solve_round_trip(rng):
+    # Plugging a solved value back in gives the target price
+    data_manager = _catalog(rng)
+    factors = _random_factors(rng)
+    unknown = rng.choice(pricing.SOLVABLE)
+    target = round(rng.uniform(1, 5000), 2)
+    bases = pricing.base_costs(data_manager)
+    for name, value in pricing.solve_for(unknown, target, factors, data_manager).items():
+        if value is None:
+            continue
+        if unknown == 'base_cost':
+            price = pricing.final_price(value, factors)
+        else:
+            price = pricing.final_price(bases[name], dict(factors, **{unknown: value}))
+        assert _close(price, target, 1e-6), (name, unknown, value, price)
+
+
+@prop
+def records_round_trip(rng):
+    # Records survive to_dict/from_dict, the packed format and a save and
+    # reload (JSON and snapshot)
+    data_manager = _catalog(rng, use_snapshot=True, options=0.3)
+    ingredients = {name: i.to_dict() for name, i in data_manager.ingredients.items()}
+    products = {name: p.to_dict() for name, p in data_manager.products.items()}
+    for name, data in ingredients.items():
+        assert Ingredient.from_dict(data).to_dict() == data, name
+    for name, data in products.items():
+        assert Product.from_dict(data).to_dict() == data, name
+    for codec in CODECS:
+        unpacked = unpack_products(pack_products(data_manager.products, codec), Product)
+        assert {name: p.to_dict() for name, p in unpacked.items()} == products, codec
+    
+    data_manager.save_data()
+    for reloaded in (DataManager(use_snapshot=False), DataManager()):
+        assert {n: i.to_dict() for n, i in reloaded.ingredients.items()} == ingredients
+        assert {n: p.to_dict() for n, p in reloaded.products.items()} == products
+
+
+@prop
+def integrity_incremental(rng):
+    # The index kept current through random edits matches a full validate()
+    data_manager = _catalog(rng, options=0.1)
+    data_manager.integrity
+    for _ in range(rng.randint(1, 30)):
+        ingredient_names = list(data_manager.ingredients)
+        product_names = list(data_manager.products)
+        op = rng.randrange(6)
+        if op == 0 and ingredient_names:
+            name = rng.choice(ingredient_names)
+            del data_manager.ingredients[name]
+            data_manager.mark_changed('ingredients', name)
+        elif op == 1 and ingredient_names:
+            name = rng.choice(ingredient_names)
+            ingredient = data_manager.ingredients[name]
+            ingredient.unit = rng.choice(list(UNIT_MIX))
+            ingredient.quantity = rng.choice([0, ingredient.quantity])
+            data_manager.mark_changed('ingredients', name)
+        elif op == 2:
+            name = f'ingredient_new_{rng.randrange(1000)}'
+            data_manager.ingredients[name] = Ingredient(name, 100, rng.choice(list(UNIT_MIX)), 10.0)
+            data_manager.mark_changed('ingredients', name)
+        elif op == 3 and product_names:
+            name = rng.choice(product_names)
+            product = data_manager.products[name]
+            if product.ingredients:
+                line = rng.choice(product.ingredients)
+                line['yield'] = rng.choice([0, -0.5, 0.8])
+                line['unit'] = rng.choice(list(UNIT_MIX))
+            product.add_ingredient(rng.choice(ingredient_names + ['no_such_ingredient']), 5,
+                                   'grams')
+            data_manager.mark_changed('products', name)
+        elif op == 4 and product_names:
+            name = rng.choice(product_names)
+            del data_manager.products[name]
+            data_manager.mark_changed('products', name)
+        elif op == 5 and product_names:
+            base = rng.choice(product_names + ['no_such_product'])
+            name = f'variant_{rng.randrange(1000)}'
+            data_manager.products[name] = Product(name, 1, 'pieces', base=base,
+                                                  scale=rng.uniform(0.5, 3))
+            data_manager.mark_changed('products', name)
+        assert data_manager.integrity.all_issues() == validate(data_manager)
+
+
+@prop
+def packing_optimal(rng):
+    # PackingTable packs as much as an exhaustive search, in as few packages.
+    # With the table capped it still packs as much, in any number.
+    sizes = rng.sample(range(1, 60), rng.randint(1, 4))
+    capped = PackingTable(sizes, limit=rng.randint(0, 50))
+    table = PackingTable(sizes)
+    quantity = rng.randint(0, 1000)
+    fewest = [0] + [None] * quantity
+    for t in range(1, quantity + 1):
+        counts = [fewest[t - s] for s in sizes if s <= t and fewest[t - s] is not None]
+        fewest[t] = min(counts) + 1 if counts else None
+    best = max(t for t in range(quantity + 1) if fewest[t] is not None)
+    
+    for packing in (table, capped):
+        counts, leftover = packing.pack(quantity)
+        packed = sum(size * n for size, n in counts.items())
+        assert packed == best and _close(leftover, quantity - best), (sizes, quantity, counts)
+    counts, _ = table.pack(quantity)
+    assert sum(counts.values()) == fewest[best], (sizes, quantity, counts)
+
+
+def run_properties(args):
+    names = args.only or sorted(PROPERTIES)
+    failures = 0
+    for name in names:
+        check = PROPERTIES[name]
+        start = time.perf_counter()
+        failed = None
+        for case in range(args.cases):
+            seed = args.seed + case
+            with scratch_dir():
+                try:
+                    check(random.Random(seed))
+                except AssertionError as e:
+                    failed = (seed, e)
+                    break
+        elapsed = time.perf_counter() - start
+        if failed is None:
+            print(f'{name:24} ok    {args.cases} cases in {elapsed * 1000:.0f} ms')
+        else:
+            failures += 1
+            print(f'{name:24} FAIL  seed {failed[0]}: {failed[1]!r}')
+    return failures
+
+
+# Load test: workers mutate one shared catalog through their own
+# DataManagers, each in its own name space, saving after every change (the
+# way the app does), while also racing each other on cost updates to the
+# shared seed ingredients. Afterwards a fresh DataManager must see every
+# worker's last write.
+
+def _load_worker(workdir, worker, mutations, shared, seed):
+    os.chdir(workdir)
+    rng = random.Random(seed)
+    data_manager = DataManager()
+    expected = {}
+    start = time.perf_counter()
+    for i in range(mutations):
+        if i % 10 == 0:
+            # Pick up the other workers' saves now and then, as a
+            # long-running app would
+            data_manager.refresh()
+        name = f'w{worker}_ingredient_{rng.randrange(50)}'
+        op = rng.random()
+        if op < 0.4:
+            cost = round(rng.uniform(1, 900), 2)
+            data_manager.add_ingredient(Ingredient(name, 100, 'grams', cost))
+            expected[('ingredients', name)] = cost
+        elif op < 0.55:
+            data_manager.remove_ingredient(name, force=True)
+            expected[('ingredients', name)] = None
+        elif op < 0.8:
+            product = Product(f'w{worker}_product_{rng.randrange(20)}', 1, 'pieces')
+            for ing_name in rng.sample(shared, min(3, len(shared))):
+                product.add_ingredient(ing_name, rng.randint(1, 100), 'grams')
+            data_manager.add_product(product)
+            expected[('products', product.name)] = len(product.ingredients)
+        elif op < 0.9:
+            product_name = f'w{worker}_product_{rng.randrange(20)}'
+            data_manager.remove_product(product_name, force=True)
+            expected[('products', product_name)] = None
+        else:
+            data_manager.update_ingredient_cost(rng.choice(shared), round(rng.uniform(1, 900), 2))
+    return expected, time.perf_counter() - start
+
+
+def run_load(args):
+    with scratch_dir() as workdir:
+        data_manager = DataManager()
+        generate_catalog(data_manager, args.ingredients, args.products, (args.fanout, args.fanout),
+                         seed=args.seed)
+        data_manager.save_data()
+        shared = list(data_manager.ingredients)[:20]
+        
+        # The first mutations % workers workers take one extra
+        counts = [args.mutations // args.workers + (w < args.mutations % args.workers)
+                  for w in range(args.workers)]
+        jobs = [(workdir, w, counts[w], shared, args.seed + w) for w in range(args.workers)]
+        start = time.perf_counter()
+        if args.workers == 1:
+            results = [_load_worker(*jobs[0])]
+        else:
+            with ProcessPoolExecutor(args.workers) as pool:
+                results = list(pool.map(_load_worker, *zip(*jobs)))
+        elapsed = time.perf_counter() - start
+        
+        # Every worker's last write must be on disk, in JSON and snapshot alike
+        lost = 0
+        for reloaded in (DataManager(use_snapshot=False), DataManager()):
+            for expected, _ in results:
+                for (kind, name), value in expected.items():
+                    record = getattr(reloaded, kind).get(name)
+                    if kind == 'ingredients':
+                        actual = record.cost if record else None
+                    else:
+                        actual = len(record.ingredients) if record else None
+                    if actual != value:
+                        lost += 1
+                        print(f'lost write: {kind} {name}: expected {value}, found {actual}')
+        
+        total = sum(counts)
+        print(f'catalog: {args.ingredients} ingredients, {args.products} products, '
+              f'{args.fanout} lines each')
+        print(f'{total} mutations over {args.workers} worker(s) in {elapsed:.2f} s: '
+              f'{total / elapsed:8.1f} mutations/s')
+        for worker, (_, worker_time) in enumerate(results):
+            print(f'  worker {worker}: {counts[worker] / worker_time:8.1f} mutations/s')
+        print(f'lost writes: {lost}')
+        return 1 if lost else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m recipecalculator.harness')
+    sub = parser.add_subparsers(dest='command', required=True)
+    properties = sub.add_parser('properties')
+    properties.add_argument('--cases', type=int, default=100)
+    properties.add_argument('--seed', type=int, default=0)
+    properties.add_argument('--only', action='append', choices=sorted(PROPERTIES))
+    load = sub.add_parser('load')
+    load.add_argument('--mutations', type=int, default=2000)
+    load.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    load.add_argument('--ingredients', type=int, default=200)
+    load.add_argument('--products', type=int, default=500)
+    load.add_argument('--fanout', type=int, default=8)
+    load.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    
+    runner = run_properties if args.command == 'properties' else run_load
+    sys.exit(1 if runner(args) else 0)
+
+
+if __name__ == '__main__':
+    main()
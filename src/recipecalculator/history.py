@@ -0,0 +1,196 @@
+import json
+import os
+import time
+from difflib import SequenceMatcher
+
+from .filelock import FileLock
+from .models import Product
+from .pricing import base_cost
+from .scaling import LINE_OPTIONS
+
+
+# Recipe version history.
+#
+# Recipe lines are immutable tuples (name, quantity, unit[, options JSON]),
+# interned once in a line table and referenced by id, so every version that
+# keeps a line shares it. A version is stored as splice ops against its
+# parent's line-id sequence (replace ids[start:end] with new ids), so the
+# log grows with the size of each edit, not the size of the recipe. Every
+# KEYFRAME_EVERY versions the full id sequence is written instead, which
+# bounds how far back materializing a version has to replay.
+#
+#   entry  {"product": name, "version": n, "time": t,
+#           "new_lines": {id: [name, quantity, unit(, options)]},
+#           "lines": [ids]  or  "ops": [[start, end, [ids]], ...],
+#           "quantity": q, "unit": u}
+
+KEYFRAME_EVERY = 32
+
+
+def _line_key(line):
+    # Lines with options get a fourth element, the options as sorted JSON
+    options = {key: line[key] for key in LINE_OPTIONS if key in line}
+    if options:
+        return (line['name'], float(line['quantity']), line['unit'], json.dumps(options, sort_keys=True))
+    return (line['name'], float(line['quantity']), line['unit'])
+
+
+class RecipeHistory:
+    def __init__(self, log_file='recipe_history.log'):
+        self.log_file = log_file
+        self.lock_file = log_file + '.lock'
+        # line id -> (name, quantity, unit) and back
+        self.line_table = []
+        self.line_ids = {}
+        # product -> list of entries, index = version - 1
+        self.entries = {}
+        # (product, version) -> tuple of line ids
+        self._materialized = {}
+        self.offset = 0
+        self.refresh()
+    
+    def _apply(self, entry):
+        for line_id, line in sorted(entry['new_lines'].items(), key=lambda item: int(item[0])):
+            line = tuple(line)
+            self.line_ids[line] = int(line_id)
+            self.line_table.append(line)
+        self.entries.setdefault(entry['product'], []).append(entry)
+    
+    def _catch_up(self):
+        # Replay entries appended since we last read, by us or another process
+        if not os.path.exists(self.log_file):
+            return
+        with open(self.log_file, 'rb') as f:
+            f.seek(self.offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                self._apply(json.loads(line))
+                self.offset += len(line)
+    
+    def refresh(self):
+        with FileLock(self.lock_file, shared=True):
+            self._catch_up()
+    
+    # Reading versions
+    def versions(self, name):
+        return [(entry['version'], entry['time']) for entry in self.entries.get(name, [])]
+    
+    def latest(self, name):
+        return len(self.entries.get(name, []))
+    
+    def line_ids_at(self, name, version):
+        key = (name, version)
+        ids = self._materialized.get(key)
+        if ids is not None:
+            return ids
+        
+        entries = self.entries.get(name, [])
+        if not 1 <= version <= len(entries):
+            raise KeyError(f'{name!r} has no version {version}')
+        
+        # Walk back to the nearest keyframe or cached version, then replay
+        start = version
+        while 'lines' not in entries[start - 1] and (name, start - 1) not in self._materialized:
+            start -= 1
+        if 'lines' in entries[start - 1]:
+            ids = list(entries[start - 1]['lines'])
+        else:
+            ids = list(self._materialized[(name, start - 1)])
+            start -= 1
+        for entry in entries[start:version]:
+            for op_start, op_end, new_ids in reversed(entry['ops']):
+                ids[op_start:op_end] = new_ids
+        
+        ids = tuple(ids)
+        self._materialized[key] = ids
+        return ids
+    
+    def lines_at(self, name, version):
+        lines = []
+        for line in map(self.line_table.__getitem__, self.line_ids_at(name, version)):
+            lines.append({'name': line[0], 'quantity': line[1], 'unit': line[2]})
+            if len(line) > 3:
+                lines[-1].update(json.loads(line[3]))
+        return lines
+    
+    def product_at(self, name, version):
+        entry = self.entries[name][version - 1]
+        return Product(name, entry['quantity'], entry['unit'], self.lines_at(name, version))
+    
+    def cost_at(self, name, version, data_manager, unit_costs=None):
+        # Historical recipe, current ingredient prices
+        return base_cost(self.product_at(name, version), data_manager, unit_costs)
+    
+    def diff(self, name, old, new):
+        # Line ids are shared, so unchanged lines compare by id alone
+        old_ids = self.line_ids_at(name, old)
+        new_ids = self.line_ids_at(name, new)
+        old_set, new_set = set(old_ids), set(new_ids)
+        removed = [self.line_table[i] for i in old_ids if i not in new_set]
+        added = [self.line_table[i] for i in new_ids if i not in old_set]
+        
+        old_qty = {line[0]: line for line in removed}
+        changed = [(line[0], old_qty[line[0]][1], line[1]) for line in added if line[0] in old_qty]
+        changed_names = {c[0] for c in changed}
+        return {
+            'added': [line for line in added if line[0] not in changed_names],
+            'removed': [line for line in removed if line[0] not in changed_names],
+            'changed': changed,
+        }
+    
+    # Recording versions
+    def record(self, product):
+        # Appends a version if the recipe differs from the latest one;
+        # returns the product's latest version number
+        with FileLock(self.lock_file):
+            self._catch_up()
+            
+            entries = self.entries.get(product.name, [])
+            version = len(entries) + 1
+            
+            new_lines = {}
+            ids = []
+            for line in product.ingredients:
+                key = _line_key(line)
+                line_id = self.line_ids.get(key)
+                if line_id is None:
+                    line_id = len(self.line_table) + len(new_lines)
+                    new_lines[key] = line_id
+                ids.append(line_id)
+            ids = tuple(ids)
+            
+            entry = {
+                'product': product.name,
+                'version': version,
+                'time': time.time(),
+                'new_lines': {line_id: list(key) for key, line_id in new_lines.items()},
+                'quantity': product.quantity,
+                'unit': product.unit,
+            }
+            if entries:
+                head = entries[-1]
+                old_ids = self.line_ids_at(product.name, version - 1)
+                if (old_ids == ids and head['quantity'] == product.quantity
+                        and head['unit'] == product.unit):
+                    return version - 1
+            
+            if version % KEYFRAME_EVERY == 1 or not entries:
+                entry['lines'] = list(ids)
+            else:
+                matcher = SequenceMatcher(None, old_ids, ids, autojunk=False)
+                entry['ops'] = [
+                    [i1, i2, list(ids[j1:j2])]
+                    for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != 'equal'
+                ]
+            
+            line = (json.dumps(entry) + '\n').encode('utf-8')
+            if os.path.exists(self.log_file) and os.path.getsize(self.log_file) > self.offset:
+                # Drop a torn tail so the new entry starts on its own line
+                os.truncate(self.log_file, self.offset)
+            with open(self.log_file, 'ab') as f:
+                f.write(line)
+            self.offset += len(line)
+            self._apply(json.loads(line))
+            self._materialized[(product.name, version)] = ids
+            return version
@@ -0,0 +1,206 @@
+# Referential integrity of recipes.
+#
+# IntegrityIndex keeps a reverse index from each ingredient (and each base
+# product of scaled variants) to the products that reference it, from each
+# ingredient to the ingredients listing it as an alternative, from stable
+# ingredient ids to current names, and the current problems per product.
+# rebuild() is one linear pass over the catalog; update() re-checks only
+# what a single change can affect: the changed product's own lines, or the
+# lines of the products referencing a changed ingredient or base product.
+#
+# A scaled variant has its base's lines, so the queries report the base's
+# problems (up the chain of bases) for it too. They are looked up when
+# asked for rather than copied, so a base edit needs no variant updates.
+#
+# Problems are reported per (product, referenced name):
+#
+#   missing_ingredient  recipe line names an ingredient that doesn't exist
+#   unit_mismatch       line unit differs from the ingredient's unit
+#   zero_quantity       ingredient quantity is 0, so it has no unit cost
+#   missing_base        scaled variant's base product doesn't exist
+#   bad_yield           line yield is zero or negative
+
+PROBLEMS = {
+    'missing_ingredient': 'ingredient does not exist',
+    'unit_mismatch': 'unit differs from the ingredient',
+    'zero_quantity': 'ingredient quantity is zero',
+    'missing_base': 'base product does not exist',
+    'bad_yield': 'yield must be above zero',
+}
+
+
+class IntegrityIndex:
+    def __init__(self):
+        # ingredient -> product names with a line using it
+        self.references = {}
+        # base product -> scaled variants of it
+        self.variants = {}
+        # product -> names it references, for unindexing
+        self._referenced = {}
+        # product -> {referenced name: [problem, ...]}
+        self.issues = {}
+        # ingredient -> ingredients listing it as an alternative
+        self.alternative_of = {}
+        # ingredient id -> name, and ingredient -> (id, alternatives) as indexed
+        self.ids = {}
+        self._ingredients = {}
+    
+    def rebuild(self, data_manager):
+        self.references = {}
+        self.variants = {}
+        self._referenced = {}
+        self.issues = {}
+        self.alternative_of = {}
+        self.ids = {}
+        self._ingredients = {}
+        for name in data_manager.ingredients:
+            self._index_ingredient(data_manager, name)
+        for name in data_manager.products:
+            self._index_product(data_manager, name)
+    
+    def _index_ingredient(self, data_manager, name):
+        old = self._ingredients.pop(name, None)
+        if old is not None:
+            if self.ids.get(old[0]) == name:
+                del self.ids[old[0]]
+            for alt_name in old[1]:
+                listers = self.alternative_of.get(alt_name)
+                if listers is not None:
+                    listers.discard(name)
+                    if not listers:
+                        del self.alternative_of[alt_name]
+        
+        ingredient = data_manager.ingredients.get(name)
+        if ingredient is None:
+            return
+        if ingredient.id is not None:
+            self.ids[ingredient.id] = name
+        for alt_name in ingredient.alternatives:
+            self.alternative_of.setdefault(alt_name, set()).add(name)
+        self._ingredients[name] = (ingredient.id, list(ingredient.alternatives))
+    
+    def _unindex_product(self, name):
+        for ref in self._referenced.pop(name, ()):
+            index = self.variants if ref[0] == 'base' else self.references
+            names = index.get(ref[1])
+            if names is not None:
+                names.discard(name)
+                if not names:
+                    del index[ref[1]]
+        self.issues.pop(name, None)
+    
+    def _index_product(self, data_manager, name):
+        product = data_manager.products.get(name)
+        if product is None:
+            return
+        if product.base is not None:
+            refs = [('base', product.base)]
+            self.variants.setdefault(product.base, set()).add(name)
+            if product.base not in data_manager.products:
+                self.issues[name] = {product.base: ['missing_base']}
+        else:
+            refs = []
+            issues = {}
+            for line in product.ingredients:
+                ing_name = line['name']
+                refs.append(('ingredient', ing_name))
+                self.references.setdefault(ing_name, set()).add(name)
+                problems = self._check_line(data_manager, line)
+                if problems:
+                    issues.setdefault(ing_name, []).extend(problems)
+            if issues:
+                self.issues[name] = issues
+        self._referenced[name] = refs
+    
+    def _check_line(self, data_manager, line):
+        ingredient = data_manager.ingredients.get(line['name'])
+        if ingredient is None:
+            return ['missing_ingredient']
+        problems = []
+        if 'yield' in line and not line['yield'] > 0:
+            problems.append('bad_yield')
+        if line['unit'] != ingredient.unit:
+            problems.append('unit_mismatch')
+        if not ingredient.quantity:
+            problems.append('zero_quantity')
+        return problems
+    
+    def update(self, data_manager, kind, name):
+        if kind == 'products':
+            self._unindex_product(name)
+            self._index_product(data_manager, name)
+            # Variants of this product gain or lose their base
+            for variant in list(self.variants.get(name, ())):
+                self._unindex_product(variant)
+                self._index_product(data_manager, variant)
+            return
+        
+        # An ingredient changed: re-check its lines in the products using it
+        self._index_ingredient(data_manager, name)
+        for product_name in self.references.get(name, ()):
+            product = data_manager.products.get(product_name)
+            if product is None:
+                # Removed too; its own update unindexes it
+                continue
+            problems = []
+            for line in product.ingredients:
+                if line['name'] == name:
+                    problems.extend(self._check_line(data_manager, line))
+            issues = self.issues.get(product_name, {})
+            if problems:
+                issues[name] = problems
+                self.issues[product_name] = issues
+            elif name in issues:
+                del issues[name]
+                if not issues:
+                    del self.issues[product_name]
+    
+    def _problems(self, name):
+        # The product's own problems and those of its bases; a cycle of
+        # variants stops at the first repeat
+        issues = {}
+        seen = set()
+        while name is not None and name not in seen:
+            seen.add(name)
+            for ref, problems in self.issues.get(name, {}).items():
+                issues.setdefault(ref, []).extend(problems)
+            refs = self._referenced.get(name)
+            name = refs[0][1] if refs and refs[0][0] == 'base' else None
+        return issues
+    
+    # Queries
+    def referenced_by(self, ingredient_name):
+        return sorted(self.references.get(ingredient_name, ()))
+    
+    def product_issues(self, name):
+        return [
+            (ref, problem)
+            for ref, problems in sorted(self._problems(name).items())
+            for problem in problems
+        ]
+    
+    def all_issues(self):
+        # Products with problems of their own, and their variants
+        affected = set(self.issues)
+        pending = list(affected)
+        while pending:
+            for variant in self.variants.get(pending.pop(), ()):
+                if variant not in affected:
+                    affected.add(variant)
+                    pending.append(variant)
+        return [
+            (product, ref, problem)
+            for product in sorted(affected)
+            for ref, problem in self.product_issues(product)
+        ]
+
+
+def describe(ref, problem):
+    return f'{ref}: {PROBLEMS[problem]}'
+
+
+def validate(data_manager):
+    # Whole-catalog check in one pass, independent of any maintained index
+    index = IntegrityIndex()
+    index.rebuild(data_manager)
+    return index.all_issues()
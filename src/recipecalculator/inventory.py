@@ -0,0 +1,272 @@
+import json
+import os
+import time
+
+from .costing import LotBook
+from .filelock import FileLock, atomic_write
+from .profiling import profiled
+from .scaling import gross_quantity, scale_ingredients
+
+
+# Stock ledger.
+#
+# Every stock movement is appended to a JSON-lines log and never rewritten.
+# One entry can move many ingredients at once, so a production run is a
+# single append however many lines the recipe has. Balances are kept in
+# memory and updated as entries are applied, so a balance lookup is a dict
+# get. Every SNAPSHOT_EVERY entries the balances are written out together
+# with the log offset they cover; loading reads the snapshot and replays
+# only the tail of the log after it.
+#
+#   entry  {"seq": n, "time": t, "kind": "receive"|"produce"|"adjust"|"reorder"|"rename",
+#           "ref": ..., "moves": {ingredient: signed quantity}}
+#
+# "reorder" entries set low-stock levels rather than moving stock; "rename"
+# entries map old ingredient names to new ones ({old: new}) and carry the
+# balance, level and lots over, adding to any stock already under the new
+# name when ingredients were merged. Receipts
+# may carry "costs" ({ingredient: unit cost}); every entry is also applied
+# to a costing.LotBook, so lot costs stay current with the balances.
+# "produce" entries carry their runs as ref ([{"product": name, "quantity":
+# units}, ...]), and units produced per product are totalled per calendar
+# month as they are applied, so overhead allocation never rescans the log.
+
+SNAPSHOT_EVERY = 1000
+
+
+def month_key(when):
+    return time.strftime('%Y-%m', time.localtime(when))
+
+
+class InsufficientStock(Exception):
+    def __init__(self, shortfalls):
+        super().__init__('Not enough stock: ' + ', '.join(
+            f'{name} (short {short:g})' for name, short in shortfalls.items()))
+        self.shortfalls = shortfalls
+
+
+class Inventory:
+    def __init__(self, log_file='inventory.log', snapshot_file='inventory.snapshot',
+                 snapshot_every=SNAPSHOT_EVERY):
+        self.log_file = log_file
+        self.snapshot_file = snapshot_file
+        self.lock_file = log_file + '.lock'
+        self.snapshot_every = snapshot_every
+        self.balances = {}
+        self.reorder_levels = {}
+        self.lots = LotBook()
+        # 'YYYY-MM' -> {product: units produced that month}
+        self.produced = {}
+        self.seq = 0
+        # Log offset covered by self.balances, and by the last snapshot
+        self.offset = 0
+        self.snapshot_seq = 0
+        # Ingredients whose balance or level moved since the last
+        # pop_changed(), whoever applied the entry
+        self.changed = set()
+        self.load()
+    
+    @profiled('Inventory.load')
+    def load(self):
+        self.balances = {}
+        self.reorder_levels = {}
+        self.lots = LotBook()
+        self.produced = {}
+        self.seq = 0
+        self.offset = 0
+        try:
+            with open(self.snapshot_file, 'r') as f:
+                snapshot = json.load(f)
+            # Read first: a snapshot from before production totals raises
+            # here, before anything is taken from it, and the log is replayed
+            self.produced = snapshot['produced']
+            self.balances = snapshot['balances']
+            self.reorder_levels = snapshot['reorder_levels']
+            self.lots = LotBook(snapshot['lots'])
+            self.seq = snapshot['seq']
+            self.offset = snapshot['offset']
+        except (OSError, ValueError, KeyError):
+            pass
+        if self.offset and self.offset > self._log_size():
+            # Snapshot doesn't belong to this log; replay from the start
+            self.balances, self.reorder_levels, self.seq, self.offset = {}, {}, 0, 0
+            self.lots = LotBook()
+            self.produced = {}
+        self.snapshot_seq = self.seq
+        
+        with FileLock(self.lock_file, shared=True):
+            self._catch_up()
+    
+    def _apply(self, entry):
+        self.changed.update(entry['moves'])
+        if entry['kind'] == 'reorder':
+            self.reorder_levels.update(entry['moves'])
+        elif entry['kind'] == 'rename':
+            for old_name, new_name in entry['moves'].items():
+                if old_name in self.balances:
+                    quantity = self.balances.pop(old_name)
+                    self.balances[new_name] = self.balances.get(new_name, 0.0) + quantity
+                if old_name in self.reorder_levels:
+                    level = self.reorder_levels.pop(old_name)
+                    self.reorder_levels.setdefault(new_name, level)
+                self.lots.rename(old_name, new_name)
+            self.changed.update(entry['moves'].values())
+        else:
+            balances = self.balances
+            costs = entry.get('costs') or {}
+            for name, quantity in entry['moves'].items():
+                balances[name] = balances.get(name, 0.0) + quantity
+                if quantity < 0:
+                    self.lots.consume(name, -quantity)
+                else:
+                    self.lots.receive(name, quantity, costs.get(name))
+            if entry['kind'] == 'produce' and entry['ref']:
+                totals = self.produced.setdefault(month_key(entry['time']), {})
+                for run in entry['ref']:
+                    totals[run['product']] = totals.get(run['product'], 0.0) + run['quantity']
+        self.seq = entry['seq']
+    
+    def _log_size(self):
+        try:
+            return os.path.getsize(self.log_file)
+        except OSError:
+            return 0
+    
+    def _catch_up(self):
+        # Replay entries appended (by us or another process) past our offset
+        if not os.path.exists(self.log_file):
+            return
+        with open(self.log_file, 'rb') as f:
+            f.seek(self.offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # Torn write from a crashed process; ignore it
+                    break
+                entry = json.loads(line)
+                self._apply(entry)
+                self.offset += len(line)
+    
+    def _append(self, kind, moves, ref=None, check_stock=False, costs=None):
+        with FileLock(self.lock_file):
+            self._catch_up()
+            if check_stock:
+                # Checked under the lock so two terminals can't both take
+                # the last of something
+                short = self.shortfalls({name: -q for name, q in moves.items() if q < 0})
+                if short:
+                    raise InsufficientStock(short)
+            
+            entry = {
+                'seq': self.seq + 1,
+                'time': time.time(),
+                'kind': kind,
+                'ref': ref,
+                'moves': moves,
+            }
+            if costs:
+                entry['costs'] = costs
+            line = (json.dumps(entry) + '\n').encode('utf-8')
+            if self._log_size() > self.offset:
+                # Drop a torn tail so the new entry starts on its own line
+                os.truncate(self.log_file, self.offset)
+            with open(self.log_file, 'ab') as f:
+                f.write(line)
+            self._apply(entry)
+            self.offset += len(line)
+            
+            if self.seq - self.snapshot_seq >= self.snapshot_every:
+                self.save_snapshot()
+        return entry
+    
+    def save_snapshot(self):
+        atomic_write(self.snapshot_file, json.dumps({
+            'seq': self.seq,
+            'offset': self.offset,
+            'balances': self.balances,
+            'reorder_levels': self.reorder_levels,
+            'lots': self.lots.to_dict(),
+            'produced': self.produced,
+        }))
+        self.snapshot_seq = self.seq
+    
+    def refresh(self):
+        with FileLock(self.lock_file, shared=True):
+            self._catch_up()
+    
+    def pop_changed(self):
+        # Names changed since the last call, by our own appends or by
+        # entries caught up from other processes
+        names, self.changed = self.changed, set()
+        return names
+    
+    # Queries
+    def balance(self, name):
+        return self.balances.get(name, 0.0)
+    
+    def low_stock(self):
+        # Ingredients at or below their reorder level
+        return {
+            name: self.balances.get(name, 0.0)
+            for name, level in self.reorder_levels.items()
+            if self.balances.get(name, 0.0) <= level
+        }
+    
+    def is_low(self, name):
+        level = self.reorder_levels.get(name)
+        return level is not None and self.balances.get(name, 0.0) <= level
+    
+    def shortfalls(self, requirements):
+        return {
+            name: quantity - self.balances.get(name, 0.0)
+            for name, quantity in requirements.items()
+            if quantity > self.balances.get(name, 0.0)
+        }
+    
+    def entries(self):
+        # Streams the whole log; only for reports, balances never need it
+        if not os.path.exists(self.log_file):
+            return
+        with open(self.log_file, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                yield json.loads(line)
+    
+    def history(self, name=None):
+        return [entry for entry in self.entries() if name is None or name in entry['moves']]
+    
+    # Movements
+    def receive(self, name, quantity, ref=None, unit_cost=None):
+        # A purchase; with unit_cost it opens a costed lot
+        costs = {name: float(unit_cost)} if unit_cost is not None else None
+        return self._append('receive', {name: float(quantity)}, ref, costs=costs)
+    
+    def adjust(self, name, quantity, ref=None):
+        # Stock count corrections, wastage; quantity is signed
+        return self._append('adjust', {name: float(quantity)}, ref)
+    
+    def set_reorder_level(self, name, level):
+        return self._append('reorder', {name: float(level)})
+    
+    def rename(self, old_name, new_name):
+        # Follows DataManager.rename_ingredient / merge_ingredients
+        return self._append('rename', {old_name: new_name})
+    
+    @profiled('Inventory.produce')
+    def produce(self, runs, allow_negative=False, data_manager=None):
+        # runs: [(product, scale factor), ...], deducted as one entry. With a
+        # data_manager its cached scalers are used instead of compiling one
+        requirements = {}
+        refs = []
+        for product, factor in runs:
+            if data_manager is not None:
+                lines = data_manager.scaler(product)(factor)
+            else:
+                lines = scale_ingredients(product, factor)
+            for line in lines:
+                name = line['name']
+                requirements[name] = requirements.get(name, 0.0) + gross_quantity(line)
+            refs.append({'product': product.name, 'quantity': product.quantity * factor})
+        
+        moves = {name: -quantity for name, quantity in requirements.items()}
+        return self._append('produce', moves, refs, check_stock=not allow_negative)
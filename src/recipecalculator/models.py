@@ -0,0 +1,527 @@
+import json
+import os
+import uuid
+
+from .profiling import profiler, profiled
+from .filelock import FileLock, atomic_write
+from .integrity import IntegrityIndex
+from .packed import pack_products, unpack_products
+from .scaling import LINE_OPTIONS, compile_scaler
+from .snapshot import load_snapshot, write_snapshot
+
+
+# Data Models
+class Ingredient:
+    def __init__(self, name, quantity, unit, cost, alternatives=None, nutrients=None, allergens=0,
+                 id=None):
+        # Stable across renames; recipe lines keep it next to the name.
+        # DataManager assigns one when the ingredient is first saved.
+        self.id = id
+        self.name = name
+        self.quantity = float(quantity)
+        self.unit = unit
+        self.cost = float(cost)
+        # Names of ingredients that can replace this one in a recipe
+        self.alternatives = alternatives if alternatives else []
+        # Nutrient values for `quantity` (like cost), keyed by nutrition.NUTRIENTS
+        self.nutrients = nutrients if nutrients else {}
+        # Bitset over nutrition.ALLERGENS
+        self.allergens = int(allergens)
+    
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'quantity': self.quantity,
+            'unit': self.unit,
+            'cost': self.cost,
+            'alternatives': self.alternatives,
+            'nutrients': self.nutrients,
+            'allergens': self.allergens,
+            'id': self.id
+        }
+    
+    @staticmethod
+    def from_dict(data):
+        return Ingredient(
+            data['name'],
+            data['quantity'],
+            data['unit'],
+            data['cost'],
+            data.get('alternatives', []),
+            data.get('nutrients', {}),
+            data.get('allergens', 0),
+            data.get('id')
+        )
+
+
+class Product:
+    def __init__(self, name, quantity, unit, ingredients=None, base=None, scale=1.0, category=None):
+        self.name = name
+        self.quantity = float(quantity)
+        self.unit = unit
+        self.ingredients = ingredients if ingredients else []
+        # A scaled variant stores only the base product's name and the scale
+        # factor; DataManager.get_product fills in the lines on access
+        self.base = base
+        self.scale = float(scale)
+        # Priced with the pricing profile assigned to the category
+        self.category = category
+    
+    def add_ingredient(self, ingredient_name, quantity, unit, ingredient_id=None):
+        line = {
+            'name': ingredient_name,
+            'quantity': float(quantity),
+            'unit': unit
+        }
+        if ingredient_id is not None:
+            line['id'] = ingredient_id
+        self.ingredients.append(line)
+    
+    def to_dict(self):
+        data = {
+            'name': self.name,
+            'quantity': self.quantity,
+            'unit': self.unit,
+            'ingredients': self.ingredients
+        }
+        if self.base is not None:
+            data['base'] = self.base
+            data['scale'] = self.scale
+        if self.category is not None:
+            data['category'] = self.category
+        return data
+    
+    @staticmethod
+    def from_dict(data):
+        return Product(
+            data['name'],
+            data['quantity'],
+            data['unit'],
+            data.get('ingredients', []),
+            data.get('base'),
+            data.get('scale', 1.0),
+            data.get('category')
+        )
+
+
+# Data Manager
+class DataManager:
+    def __init__(self, use_snapshot=True, packed_products=False):
+        self.ingredients_file = 'ingredients.json'
+        self.products_file = 'products.pack' if packed_products else 'products.json'
+        self.packed_products = packed_products
+        self.snapshot_file = 'catalog.snapshot' if use_snapshot else None
+        # Shared with other processes using the same files
+        self.version_file = 'catalog.version'
+        self.lock_file = 'catalog.lock'
+        self.ingredients = {}
+        self.products = {}
+        # Bumped whenever the catalog changes, so caches know to invalidate
+        self.generation = 0
+        # On-disk catalog generation and the generation each record was last
+        # written at, as of our last load/save/refresh
+        self.catalog_version = 0
+        self.versions = {'ingredients': {}, 'products': {}}
+        self._changed = {'ingredients': set(), 'products': set()}
+        self._version_stamp = None
+        # Materialized scaled variants: name -> (generation, stored record, product)
+        self._scaled = {}
+        # Compiled scaling functions: name -> (generation, product, scaler)
+        self._scalers = {}
+        # Built on first use, then kept current on every change
+        self._integrity = None
+        # Change listeners, called as callback(event, kind, name) with event
+        # 'added', 'updated' or 'removed', for local edits and for records
+        # reloaded by refresh()
+        self._listeners = []
+        self.load_data()
+    
+    def _read_versions(self):
+        try:
+            with open(self.version_file, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'generation': 0, 'ingredients': {}, 'products': {}}
+    
+    def _stat_versions(self):
+        try:
+            st = os.stat(self.version_file)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+    
+    @profiled('DataManager.load_data')
+    def load_data(self):
+        self.generation += 1
+        with FileLock(self.lock_file, shared=True):
+            self._version_stamp = self._stat_versions()
+            versions = self._read_versions()
+            self.catalog_version = versions['generation']
+            self.versions = {'ingredients': versions['ingredients'], 'products': versions['products']}
+            self._changed = {'ingredients': set(), 'products': set()}
+            
+            migrated = self._load_records()
+        self._integrity = None
+        if migrated:
+            # Catalog saved before ingredients had ids; persist the migration
+            self.save_data()
+    
+    def _load_records(self):
+        if self.snapshot_file:
+            cached = load_snapshot(self, Ingredient, Product)
+            if cached is not None:
+                self.ingredients, self.products = cached
+                return False
+        
+        self.ingredients = self._read_records('ingredients')
+        self.products = self._read_records('products')
+        
+        if self._assign_ids():
+            return True
+        if os.path.exists(self.ingredients_file) or os.path.exists(self.products_file):
+            self.save_snapshot()
+        return False
+    
+    def _assign_ids(self):
+        changed = False
+        ids = {}
+        for name, ingredient in self.ingredients.items():
+            if ingredient.id is None:
+                ingredient.id = uuid.uuid4().hex
+                self._changed['ingredients'].add(name)
+                changed = True
+            ids[ingredient.id] = ingredient
+        for name, product in self.products.items():
+            if self._link_lines(product, ids.get):
+                self._changed['products'].add(name)
+                changed = True
+        return changed
+    
+    def _link_lines(self, product, by_id):
+        # Lines get their ingredient's id; a line whose id belongs to an
+        # ingredient since renamed follows the new name
+        changed = False
+        for line in product.ingredients:
+            line_id = line.get('id')
+            ingredient = by_id(line_id) if line_id is not None else None
+            if ingredient is None:
+                ingredient = self.ingredients.get(line['name'])
+                if ingredient is None or ingredient.id is None or ingredient.id == line_id:
+                    continue
+                line['id'] = ingredient.id
+                changed = True
+            elif ingredient.name != line['name']:
+                line['name'] = ingredient.name
+                changed = True
+        return changed
+    
+    def _read_records(self, kind, names=None):
+        if kind == 'products' and self.packed_products:
+            if os.path.exists(self.products_file):
+                with open(self.products_file, 'rb') as f:
+                    data = f.read()
+                if profiler.enabled:
+                    profiler.add_bytes(read=len(data))
+                return unpack_products(data, Product)
+            # Not packed yet: read the JSON file, the next save packs it
+            path = 'products.json'
+        else:
+            path = self.ingredients_file if kind == 'ingredients' else self.products_file
+        
+        if not os.path.exists(path):
+            return {}
+        cls = Ingredient if kind == 'ingredients' else Product
+        with open(path, 'r') as f:
+            data = json.load(f)
+            if profiler.enabled:
+                profiler.add_bytes(read=f.tell())
+        if names is not None:
+            return {k: cls.from_dict(data[k]) for k in names if k in data}
+        return {k: cls.from_dict(v) for k, v in data.items()}
+    
+    def _write_records(self, kind):
+        records = getattr(self, kind)
+        if kind == 'products' and self.packed_products:
+            return atomic_write(self.products_file, pack_products(records), 'wb')
+        path = self.ingredients_file if kind == 'ingredients' else self.products_file
+        return atomic_write(path, json.dumps({k: v.to_dict() for k, v in records.items()}))
+    
+    def _apply_disk_changes(self, disk_versions):
+        # Reload only the records another process wrote since we last
+        # looked. Records changed locally and not yet saved are kept.
+        changes = []
+        events = []
+        for kind in ('ingredients', 'products'):
+            records = getattr(self, kind)
+            ours = self.versions[kind]
+            theirs = disk_versions[kind]
+            pending = self._changed[kind]
+            
+            updated = [name for name, version in theirs.items()
+                       if ours.get(name) != version and name not in pending]
+            removed = [name for name in ours if name not in theirs and name not in pending]
+            
+            added = {name for name in updated if name not in ours}
+            if updated:
+                data = self._read_records(kind, updated)
+                for name in updated:
+                    if name in data:
+                        records[name] = data[name]
+                        ours[name] = theirs[name]
+            for name in removed:
+                records.pop(name, None)
+                del ours[name]
+            
+            changes.extend((kind, name) for name in updated + removed)
+            events.extend(('added' if name in added else 'updated', kind, name)
+                          for name in updated if name in records)
+            events.extend(('removed', kind, name) for name in removed)
+        
+        # Published once both kinds are loaded, so listeners see a whole catalog
+        for event in events:
+            self._publish(*event)
+        
+        self.catalog_version = disk_versions['generation']
+        return changes
+    
+    @profiled('DataManager.refresh')
+    def refresh(self):
+        # Cheap enough to poll: a stat() when nothing changed
+        if self._stat_versions() == self._version_stamp:
+            return []
+        
+        with FileLock(self.lock_file, shared=True):
+            self._version_stamp = self._stat_versions()
+            versions = self._read_versions()
+            if versions['generation'] == self.catalog_version:
+                return []
+            changes = self._apply_disk_changes(versions)
+        
+        if changes:
+            self.generation += 1
+        return changes
+    
+    def mark_changed(self, kind, name):
+        # Records edited in place must be marked so save_data versions them
+        if name not in getattr(self, kind):
+            event = 'removed'
+        elif name in self.versions[kind] or name in self._changed[kind]:
+            event = 'updated'
+        else:
+            event = 'added'
+        self._changed[kind].add(name)
+        self._publish(event, kind, name)
+    
+    # Change events
+    def subscribe(self, callback):
+        self._listeners.append(callback)
+    
+    def unsubscribe(self, callback):
+        self._listeners.remove(callback)
+    
+    def _publish(self, event, kind, name):
+        # The integrity index is kept current before anyone else hears of it
+        if self._integrity is not None:
+            self._integrity.update(self, kind, name)
+        for callback in list(self._listeners):
+            callback(event, kind, name)
+    
+    @property
+    def integrity(self):
+        if self._integrity is None:
+            self._integrity = IntegrityIndex()
+            self._integrity.rebuild(self)
+        return self._integrity
+    
+    @profiled('DataManager.save_data')
+    def save_data(self):
+        with FileLock(self.lock_file):
+            versions = self._read_versions()
+            if versions['generation'] != self.catalog_version:
+                # Another process saved since we last read; merge its records
+                # so this write doesn't drop them
+                self._apply_disk_changes(versions)
+            
+            self.catalog_version = max(versions['generation'], self.catalog_version) + 1
+            for kind in ('ingredients', 'products'):
+                records = getattr(self, kind)
+                kind_versions = self.versions[kind]
+                for name in records:
+                    if name in self._changed[kind] or name not in kind_versions:
+                        kind_versions[name] = self.catalog_version
+                for name in [n for n in kind_versions if n not in records]:
+                    del kind_versions[name]
+            
+            written = self._write_records('ingredients') + self._write_records('products')
+            atomic_write(self.version_file, json.dumps({
+                'generation': self.catalog_version,
+                'ingredients': self.versions['ingredients'],
+                'products': self.versions['products'],
+            }))
+            if profiler.enabled:
+                profiler.add_bytes(written=written)
+            
+            self._version_stamp = self._stat_versions()
+            self._changed = {'ingredients': set(), 'products': set()}
+            self.generation += 1
+            self.save_snapshot()
+    
+    def save_snapshot(self):
+        # The snapshot is only a cache, JSON stays the source of truth
+        if not self.snapshot_file:
+            return
+        try:
+            write_snapshot(self)
+        except OSError:
+            pass
+    
+    @profiled('DataManager.add_ingredient')
+    def add_ingredient(self, ingredient):
+        if ingredient.id is None:
+            # Saving over an ingredient keeps its identity
+            existing = self.ingredients.get(ingredient.name)
+            ingredient.id = existing.id if existing and existing.id else uuid.uuid4().hex
+        self.ingredients[ingredient.name] = ingredient
+        self.mark_changed('ingredients', ingredient.name)
+        self.save_data()
+    
+    @profiled('DataManager.add_product')
+    def add_product(self, product):
+        ids = self.integrity.ids
+        self._link_lines(product, lambda ingredient_id: self.ingredients.get(ids.get(ingredient_id)))
+        self.products[product.name] = product
+        self.mark_changed('products', product.name)
+        self.save_data()
+    
+    def get_ingredient(self, name):
+        return self.ingredients.get(name)
+    
+    def get_product(self, name):
+        product = self.products.get(name)
+        if product is None or product.base is None:
+            return product
+        return self._materialize(product, set())
+    
+    def _materialize(self, product, seen):
+        # Scaled variants are rebuilt from their base once per generation,
+        # so they follow edits to the base recipe
+        cached = self._scaled.get(product.name)
+        if cached is not None and cached[0] == self.generation and cached[1] is product:
+            return cached[2]
+        
+        seen.add(product.name)
+        base = self.products.get(product.base)
+        if base is not None and base.base is not None:
+            base = self._materialize(base, seen) if base.name not in seen else None
+        
+        if base is None:
+            # Dangling or circular reference: no lines
+            resolved = Product(product.name, product.quantity, product.unit, [], product.base,
+                               product.scale, product.category)
+        else:
+            resolved = Product(product.name, base.quantity * product.scale, product.unit,
+                               self.scaler(base)(product.scale), product.base, product.scale,
+                               product.category)
+        self._scaled[product.name] = (self.generation, product, resolved)
+        return resolved
+    
+    def scaler(self, product):
+        # Compiled once per product and catalog generation; every variant of
+        # a base and every scaling request for it reuse the same function
+        cached = self._scalers.get(product.name)
+        if cached is not None and cached[0] == self.generation and cached[1] is product:
+            return cached[2]
+        scaler = compile_scaler(product)
+        self._scalers[product.name] = (self.generation, product, scaler)
+        return scaler
+    
+    @profiled('DataManager.remove_ingredient')
+    def remove_ingredient(self, name, force=False):
+        # Refuses to leave recipe lines dangling unless forced
+        used_by = self.integrity.referenced_by(name)
+        if used_by and not force:
+            raise ValueError(f'Ingredient {name!r} is used by {", ".join(used_by)}')
+        if self.ingredients.pop(name, None) is not None:
+            self.mark_changed('ingredients', name)
+            self.save_data()
+    
+    @profiled('DataManager.remove_product')
+    def remove_product(self, name, force=False):
+        variants = sorted(self.integrity.variants.get(name, ()))
+        if variants and not force:
+            raise ValueError(f'Product {name!r} is the base of {", ".join(variants)}')
+        if self.products.pop(name, None) is not None:
+            self.mark_changed('products', name)
+            self.save_data()
+    
+    @profiled('DataManager.rename_ingredient')
+    def rename_ingredient(self, old_name, new_name):
+        ingredient = self.ingredients.get(old_name)
+        if ingredient is None:
+            raise ValueError(f'No ingredient {old_name!r}')
+        if new_name in self.ingredients:
+            raise ValueError(f'Ingredient {new_name!r} already exists')
+        self._repoint(old_name, new_name, ingredient.id, merge=False)
+        
+        del self.ingredients[old_name]
+        ingredient.name = new_name
+        self.ingredients[new_name] = ingredient
+        self.mark_changed('ingredients', old_name)
+        self.mark_changed('ingredients', new_name)
+        self.save_data()
+    
+    @profiled('DataManager.merge_ingredients')
+    def merge_ingredients(self, source_name, target_name):
+        # Folds a duplicate into target: recipe lines and alternatives move
+        # over, and lines in one recipe with the same unit and options are
+        # combined
+        target = self.ingredients.get(target_name)
+        if source_name not in self.ingredients or target is None or source_name == target_name:
+            raise ValueError(f'Cannot merge {source_name!r} into {target_name!r}')
+        self._repoint(source_name, target_name, target.id, merge=True)
+        
+        del self.ingredients[source_name]
+        if source_name in target.alternatives or target_name in target.alternatives:
+            target.alternatives = [a for a in target.alternatives if a not in (source_name, target_name)]
+            self.mark_changed('ingredients', target_name)
+        self.mark_changed('ingredients', source_name)
+        self.save_data()
+    
+    def _repoint(self, old_name, new_name, new_id, merge):
+        # Only the products and ingredients the reverse indexes list are touched.
+        # A rename only relabels lines; a merge also combines lines that
+        # differ in nothing but quantity.
+        index = self.integrity
+        for product_name in list(index.references.get(old_name, ())):
+            lines = []
+            merged = {}
+            for line in self.products[product_name].ingredients:
+                if line['name'] == old_name or merge and line['name'] == new_name:
+                    line = dict(line, name=new_name, id=new_id)
+                    if merge:
+                        key = (line['unit'],) + tuple(line.get(k) for k in LINE_OPTIONS)
+                        same = merged.get(key)
+                        if same is not None:
+                            same['quantity'] += line['quantity']
+                            continue
+                        merged[key] = line
+                lines.append(line)
+            self.products[product_name].ingredients = lines
+            self.mark_changed('products', product_name)
+        
+        for name in list(index.alternative_of.get(old_name, ())):
+            ingredient = self.ingredients[name]
+            alternatives = []
+            for alt_name in ingredient.alternatives:
+                alt_name = new_name if alt_name == old_name else alt_name
+                if alt_name not in alternatives:
+                    alternatives.append(alt_name)
+            ingredient.alternatives = alternatives
+            self.mark_changed('ingredients', name)
+    
+    @profiled('DataManager.update_ingredient_cost')
+    def update_ingredient_cost(self, name, new_cost):
+        if name in self.ingredients:
+            self.ingredients[name].cost = float(new_cost)
+            self.mark_changed('ingredients', name)
+            self.save_data()
@@ -0,0 +1,313 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+from .pricing import FIXED_FACTORS
+from .profiling import profiled
+from .scaling import gross_quantity
+
+
+# Exact money mode: the pricing formula in integer paise.
+#
+# Ingredient costs are converted to paise as decimals (the shortest repr of
+# the stored float, so 12.34 becomes exactly 1234; Decimal is only needed
+# near a half-paisa tie) and quantities to thousandths of a unit (line
+# quantities are not money, so they go through round() on the hot path).
+# FIFO and average lot costs, which are rupees per unit, become paise per
+# LOT_UNITS units. Every amount after that is an int, and each rounding
+# step has its own policy:
+#
+#   lines    line cost = line qty * cost / ingredient qty, per recipe line
+#   wastage  base * wastage%
+#   taxes    base * taxes%
+#   profit   subtotal * profit%
+#
+# Percentages are taken to two decimals (basis points of a percent), fixed
+# costs to the paisa. Sums of paise are exact, so totals don't drift no
+# matter how many lines are added up.
+
+QUANTITY_SCALE = 1000
+# Lot costs per unit are taken to the paisa per this many units
+LOT_UNITS = 1000
+PERCENT_SCALE = 100 * 100
+
+ROUNDING_MODES = ('half_up', 'half_even', 'down', 'up')
+ROUNDING = {
+    'lines': 'half_up',
+    'wastage': 'half_up',
+    'taxes': 'half_up',
+    'profit': 'half_up',
+}
+
+
+def divide(numerator, denominator, mode='half_up'):
+    # numerator / denominator rounded to an int; denominator > 0
+    quotient, remainder = divmod(numerator, denominator)
+    if not remainder or mode == 'down' and numerator >= 0:
+        return quotient
+    if mode == 'down':
+        return quotient + 1
+    if mode == 'up':
+        return quotient + 1 if numerator >= 0 else quotient
+    twice = 2 * remainder
+    if twice > denominator or twice == denominator and (mode == 'half_up' or quotient % 2):
+        return quotient + 1
+    return quotient
+
+
+def _to_int(value, scale):
+    # value * scale rounded half up as a decimal. Away from a .5 tie the
+    # float product rounds the same way, so only near-ties pay for Decimal.
+    value = float(value)
+    scaled = value * scale
+    rounded = round(scaled)
+    if abs(scaled - rounded) < 0.49:
+        return rounded
+    return int((Decimal(str(value)) * scale).quantize(Decimal(1), ROUND_HALF_UP))
+
+
+def to_paise(amount):
+    return _to_int(amount, 100)
+
+
+def to_rate(percent):
+    # 12.5 (%) -> 1250 hundredths of a percent
+    return _to_int(percent or 0, 100)
+
+
+def to_quantity(quantity):
+    return _to_int(quantity, QUANTITY_SCALE)
+
+
+def format_paise(paise):
+    sign = '-' if paise < 0 else ''
+    rupees, paise = divmod(abs(paise), 100)
+    return f'{sign}₹{rupees}.{paise:02d}'
+
+
+def unit_cost_table(data_manager):
+    # name -> (cost in paise, ingredient quantity in thousandths)
+    return {
+        name: (to_paise(ingredient.cost), to_quantity(ingredient.quantity))
+        for name, ingredient in data_manager.ingredients.items()
+        if ingredient.quantity
+    }
+
+
+def unit_rows(unit_costs):
+    # Rupees-per-unit costs (FIFO or average lots, see costing) as rows of
+    # paise per LOT_UNITS units, which keeps sub-paisa precision per unit
+    return {
+        name: (to_paise(cost * LOT_UNITS), LOT_UNITS * QUANTITY_SCALE)
+        for name, cost in unit_costs.items()
+    }
+
+
+def line_quantities(product):
+    # (ingredient name, gross quantity in thousandths) per recipe line. This
+    # conversion is the slow part of integer costing, which is why
+    # BaseCostCache keeps it per product.
+    return tuple((line['name'], round(gross_quantity(line) * QUANTITY_SCALE))
+                 for line in product.ingredients)
+
+
+def _line_total(quantities, unit_costs, mode):
+    total = 0
+    if mode == 'half_up':
+        # The common case inlined: floor((2n + d) / 2d), all terms positive
+        for name, quantity in quantities:
+            row = unit_costs.get(name)
+            if row is not None:
+                total += (2 * quantity * row[0] + row[1]) // (2 * row[1])
+    else:
+        for name, quantity in quantities:
+            row = unit_costs.get(name)
+            if row is not None:
+                total += divide(quantity * row[0], row[1], mode)
+    return total
+
+
+def _doubled(unit_costs):
+    # (2 * cost, per, 2 * per) rows for the inlined half_up sum
+    return {name: (2 * cost, per, 2 * per) for name, (cost, per) in unit_costs.items()}
+
+
+def _half_up_total(lines, doubled):
+    # floor((2n + d) / 2d) per line, with gross_quantity inlined; the hot
+    # loop of a cold batch
+    total = 0
+    get = doubled.get
+    for line in lines:
+        row = get(line['name'])
+        if row is not None:
+            quantity = line['quantity'] / line['yield'] if line.get('yield') else line['quantity']
+            total += (round(quantity * QUANTITY_SCALE) * row[0] + row[1]) // row[2]
+    return total
+
+
+def base_cost(product, data_manager, unit_costs=None, rounding=None):
+    if unit_costs is None:
+        unit_costs = {}
+        for ing_data in product.ingredients:
+            ingredient = data_manager.get_ingredient(ing_data['name'])
+            if ingredient and ingredient.quantity:
+                unit_costs[ing_data['name']] = (to_paise(ingredient.cost),
+                                                to_quantity(ingredient.quantity))
+    return _line_total(line_quantities(product), unit_costs, (rounding or ROUNDING)['lines'])
+
+
+@profiled('money.base_costs')
+def base_costs(data_manager, product_names=None, unit_costs=None, rounding=None):
+    # Uncached batch. Each line still needs its quantity rounded to an int
+    # and an integer multiply-divide, so this runs at about 2x the float
+    # path (pricing.base_costs); BaseCostCache is what makes repeated
+    # batches faster than floats.
+    if unit_costs is None:
+        unit_costs = unit_cost_table(data_manager)
+    if product_names is None:
+        product_names = list(data_manager.products.keys())
+    if (rounding or ROUNDING)['lines'] == 'half_up':
+        doubled = _doubled(unit_costs)
+        get_product = data_manager.get_product
+        return {name: _half_up_total(get_product(name).ingredients, doubled) for name in product_names}
+    return {
+        name: base_cost(data_manager.get_product(name), data_manager, unit_costs, rounding)
+        for name in product_names
+    }
+
+
+class BaseCostCache:
+    # Paise base costs for the pricing screen and batches, kept up to date
+    # incrementally. A product's cost is dropped when the product changes
+    # (change events) or when an ingredient it uses changes cost or quantity
+    # (found through the integrity index), along with the costs of its
+    # scaled variants. So after a price edit only the affected products are
+    # summed again, and a batch is mostly dict lookups: well under the float
+    # path, which recosts everything. Converted line quantities are kept per
+    # product object, and ingredient costs only go through Decimal again
+    # when they change.
+    def __init__(self, data_manager, rounding=None):
+        self.data_manager = data_manager
+        self.mode = (rounding or ROUNDING)['lines']
+        self._costs = {}
+        self._quantities = {}
+        # name -> ((cost, quantity), unit cost row, doubled row)
+        self._converted = {}
+        self._unit_costs = None
+        self._doubled = None
+        self._generation = None
+        data_manager.subscribe(self.on_change)
+    
+    def on_change(self, event, kind, name):
+        if kind == 'products':
+            self._quantities.pop(name, None)
+            self._forget(name, set())
+    
+    def _forget(self, product_name, seen):
+        # Drop a product's cost and those of the variants scaled from it
+        seen.add(product_name)
+        self._costs.pop(product_name, None)
+        for variant in self.data_manager.integrity.variants.get(product_name, ()):
+            if variant not in seen:
+                self._forget(variant, seen)
+    
+    def _check_generation(self):
+        generation = self.data_manager.generation
+        if generation != self._generation:
+            converted = {}
+            for name, ingredient in self.data_manager.ingredients.items():
+                if not ingredient.quantity:
+                    continue
+                key = (ingredient.cost, ingredient.quantity)
+                previous = self._converted.get(name)
+                if previous is None or previous[0] != key:
+                    cost, per = to_paise(ingredient.cost), to_quantity(ingredient.quantity)
+                    # (2 * cost, per, 2 * per) for the inlined half_up sum
+                    previous = (key, (cost, per), (2 * cost, per, 2 * per))
+                converted[name] = previous
+            
+            if self._generation is not None:
+                # Ingredients added, removed or reconverted
+                changed = self._converted.keys() ^ converted.keys()
+                changed.update(name for name, entry in converted.items()
+                               if self._converted.get(name) is not entry)
+                references = self.data_manager.integrity.references
+                seen = set()
+                for name in changed:
+                    for product_name in references.get(name, ()):
+                        if product_name not in seen:
+                            self._forget(product_name, seen)
+            self._converted = converted
+            self._unit_costs = {name: entry[1] for name, entry in converted.items()}
+            self._doubled = {name: entry[2] for name, entry in converted.items()}
+            self._generation = generation
+    
+    def _lines(self, name):
+        product = self.data_manager.get_product(name)
+        if product is None:
+            raise KeyError(name)
+        cached = self._quantities.get(name)
+        if cached is None or cached[0] is not product:
+            cached = self._quantities[name] = (product, line_quantities(product))
+        return cached[1]
+    
+    def base_cost(self, name):
+        self._check_generation()
+        cost = self._costs.get(name)
+        if cost is None:
+            cost = self._costs[name] = _line_total(self._lines(name), self._unit_costs, self.mode)
+        return cost
+    
+    @profiled('money.BaseCostCache.base_costs')
+    def base_costs(self, product_names=None):
+        self._check_generation()
+        if product_names is None:
+            product_names = list(self.data_manager.products.keys())
+        costs = self._costs
+        quantities = self._quantities
+        get_product = self.data_manager.get_product
+        half_up = self.mode == 'half_up'
+        doubled = self._doubled.get
+        result = {}
+        for name in product_names:
+            cost = costs.get(name)
+            if cost is None:
+                # _lines and _line_total inlined; this loop is the hot path
+                product = get_product(name)
+                cached = quantities.get(name)
+                if cached is None or cached[0] is not product:
+                    cached = (product, self._lines(name))
+                if half_up:
+                    cost = 0
+                    for ing_name, quantity in cached[1]:
+                        row = doubled(ing_name)
+                        if row is not None:
+                            cost += (quantity * row[0] + row[1]) // row[2]
+                else:
+                    cost = _line_total(cached[1], self._unit_costs, self.mode)
+                costs[name] = cost
+            result[name] = cost
+        return result
+
+
+def price_breakdown(base, factors, rounding=None):
+    # Same keys as pricing.price_breakdown, every value in paise
+    rounding = rounding or ROUNDING
+    wastage_cost = divide(base * to_rate(factors.get('wastage')), PERCENT_SCALE, rounding['wastage'])
+    taxes_cost = divide(base * to_rate(factors.get('taxes')), PERCENT_SCALE, rounding['taxes'])
+    fixed = {key: to_paise(factors.get(key) or 0) for key in FIXED_FACTORS}
+    
+    subtotal = base + wastage_cost + taxes_cost + sum(fixed.values())
+    profit_amount = divide(subtotal * to_rate(factors.get('profit')), PERCENT_SCALE,
+                           rounding['profit'])
+    
+    return {
+        'base_cost': base,
+        'wastage_cost': wastage_cost,
+        'taxes_cost': taxes_cost,
+        'utilities_cost': fixed['utilities'],
+        'packaging_cost': fixed['packaging'],
+        'shipping_cost': fixed['shipping'],
+        'labour_cost': fixed['labour'],
+        'subtotal': subtotal,
+        'profit_amount': profit_amount,
+        'final_price': subtotal + profit_amount,
+    }
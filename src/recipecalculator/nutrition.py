@@ -0,0 +1,126 @@
+from itertools import repeat
+from operator import add, mul
+
+from .pricing import recipe_rows
+
+
+# Nutrition and allergen rollup.
+#
+# Ingredient.nutrients holds values for the ingredient's own quantity, the
+# same way Ingredient.cost does, so per-unit rows are built exactly like the
+# unit-cost table. A product's totals are the sum of line quantity x row
+# (a sparse vector-matrix product over the recipe lines), and its allergens
+# are the bitwise OR of the ingredients' allergen bitsets. Totals use net
+# line quantities (after yield). The scale argument multiplies every line
+# alike, which is only right for recipes without fixed or step lines (see
+# scaling); a scaled batch is rolled up from its scaled lines instead, as
+# the scale screen does.
+
+NUTRIENTS = (
+    'energy_kcal',
+    'protein_g',
+    'fat_g',
+    'saturated_fat_g',
+    'carbohydrate_g',
+    'sugars_g',
+    'fibre_g',
+    'sodium_mg',
+)
+
+ALLERGENS = (
+    'gluten',
+    'crustaceans',
+    'eggs',
+    'fish',
+    'peanuts',
+    'soybeans',
+    'milk',
+    'tree_nuts',
+    'celery',
+    'mustard',
+    'sesame',
+    'sulphites',
+    'lupin',
+    'molluscs',
+)
+
+ALLERGEN_BITS = {name: 1 << i for i, name in enumerate(ALLERGENS)}
+
+
+def allergen_mask(names):
+    mask = 0
+    for name in names:
+        key = name.strip().lower().replace(' ', '_')
+        if key not in ALLERGEN_BITS:
+            raise ValueError(f'Unknown allergen {name!r}')
+        mask |= ALLERGEN_BITS[key]
+    return mask
+
+
+def allergen_names(mask):
+    return [name for name in ALLERGENS if mask & ALLERGEN_BITS[name]]
+
+
+def parse_nutrients(text):
+    # "energy_kcal=364, protein_g=10" -> {'energy_kcal': 364.0, 'protein_g': 10.0}
+    nutrients = {}
+    for item in text.split(','):
+        if not item.strip():
+            continue
+        key, _, value = item.partition('=')
+        key = key.strip()
+        if key not in NUTRIENTS:
+            raise ValueError(f'Unknown nutrient {key!r}')
+        nutrients[key] = float(value)
+    return nutrients
+
+
+def nutrient_table(data_manager, names=None):
+    # name -> (per-unit nutrient vector in NUTRIENTS order, allergen bitset)
+    if names is None:
+        names = data_manager.ingredients.keys()
+    table = {}
+    for name in names:
+        ingredient = data_manager.get_ingredient(name)
+        if ingredient is None or not ingredient.quantity:
+            continue
+        nutrients = ingredient.nutrients
+        table[name] = (
+            [nutrients.get(key, 0.0) / ingredient.quantity for key in NUTRIENTS],
+            ingredient.allergens,
+        )
+    return table
+
+
+def rollup(product, data_manager, table=None, scale=1.0):
+    if table is None:
+        table = nutrient_table(data_manager, [ing['name'] for ing in product.ingredients])
+    
+    totals = [0.0] * len(NUTRIENTS)
+    allergens = 0
+    # Trimmed and cooked-off parts aren't eaten: net quantities
+    for quantity, (row, mask) in recipe_rows(product, table.get, gross=False):
+        totals = list(map(add, totals, map(mul, row, repeat(quantity * scale))))
+        allergens |= mask
+    
+    return {
+        'nutrients': dict(zip(NUTRIENTS, totals)),
+        'allergens': allergens,
+        'allergen_names': allergen_names(allergens),
+    }
+
+
+def rollups(data_manager, product_names=None, scale=1.0):
+    table = nutrient_table(data_manager)
+    if product_names is None:
+        product_names = list(data_manager.products.keys())
+    return {
+        name: rollup(data_manager.get_product(name), data_manager, table, scale)
+        for name in product_names
+    }
+
+
+def per_quantity(result, product_quantity, per=100):
+    # Label values, e.g. per 100 g of the finished product
+    factor = per / product_quantity
+    return {key: value * factor for key, value in result['nutrients'].items()}
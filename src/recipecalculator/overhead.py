@@ -0,0 +1,158 @@
+import json
+import time
+
+from . import pricing
+from .inventory import month_key
+from .filelock import FileLock, atomic_write
+from .profiling import profiled
+
+
+# Overhead allocation.
+#
+# Monthly fixed costs (rent, power, wages) are pools kept in overheads.json.
+# Each pool is spread over the products made in the period by a driver:
+#
+#   volume  units produced
+#   time    batch minutes (set per product) / units per batch
+#   weight  grams and milliliters of ingredients per unit
+#
+# and lands on one of the fixed cost factors (utilities, labour, ...) in
+# place of the flat amount typed on the pricing screen. Production volumes
+# come from the stock ledger's "produce" entries for the period, which
+# Inventory totals per month as they are applied.
+#
+# Rates (rupees per driver unit) are worked out once per period and folded
+# per (factor, driver), so allocating to a product is a few multiply-adds
+# on its per-unit drivers, however many pools there are.
+#
+#   overheads.json  {"pools": {name: {"amount": a, "driver": d, "factor": f}},
+#                    "batch_minutes": {product: minutes}}
+
+DRIVERS = ('volume', 'time', 'weight')
+WEIGHT_UNITS = ('grams', 'milliliters')
+
+
+class Overheads:
+    def __init__(self, path='overheads.json'):
+        self.path = path
+        self.lock_file = path + '.lock'
+        self.pools = {}
+        self.batch_minutes = {}
+        self.load()
+    
+    def load(self):
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        self.pools = data.get('pools', {})
+        self.batch_minutes = data.get('batch_minutes', {})
+    
+    def _update(self, change):
+        # Same read-modify-write under the lock as PricingProfiles
+        with FileLock(self.lock_file):
+            self.load()
+            change()
+            atomic_write(self.path, json.dumps({
+                'pools': self.pools,
+                'batch_minutes': self.batch_minutes,
+            }))
+    
+    def set_pool(self, name, amount, driver, factor='utilities'):
+        if driver not in DRIVERS:
+            raise ValueError(f'Unknown overhead driver {driver!r}')
+        if factor not in pricing.FIXED_FACTORS:
+            raise ValueError(f'Overheads can only replace fixed costs, not {factor!r}')
+        pool = {'amount': float(amount), 'driver': driver, 'factor': factor}
+        self._update(lambda: self.pools.__setitem__(name, pool))
+    
+    def remove_pool(self, name):
+        self._update(lambda: self.pools.pop(name, None))
+    
+    def set_batch_minutes(self, product_name, minutes):
+        self._update(lambda: self.batch_minutes.__setitem__(product_name, float(minutes)))
+
+
+def month_start(when=None):
+    t = time.localtime(when)
+    return time.mktime((t.tm_year, t.tm_mon, 1, 0, 0, 0, 0, 0, -1))
+
+
+def period_volumes(inventory, start, end=None):
+    # Units of each product produced in [start, end), from the stock ledger.
+    # Whole months come from the ledger's running monthly totals; any other
+    # period streams the log.
+    volumes = {}
+    if start == month_start(start) and (end is None or end == month_start(end)):
+        first, last = month_key(start), end is not None and month_key(end)
+        for month, produced in inventory.produced.items():
+            if month >= first and (not last or month < last):
+                for product, units in produced.items():
+                    volumes[product] = volumes.get(product, 0.0) + units
+        return volumes
+    
+    for entry in inventory.entries():
+        if end is not None and entry['time'] >= end:
+            # Entries are appended in time order
+            break
+        if entry['kind'] != 'produce' or entry['time'] < start:
+            continue
+        for run in entry['ref'] or ():
+            volumes[run['product']] = volumes.get(run['product'], 0.0) + run['quantity']
+    return volumes
+
+
+def unit_drivers(product, batch_minutes):
+    # (volume, time, weight) for one unit of product
+    if not product.quantity:
+        return 1.0, 0.0, 0.0
+    minutes = batch_minutes.get(product.name, 0.0)
+    weight = sum(line['quantity'] for line in product.ingredients if line['unit'] in WEIGHT_UNITS)
+    return 1.0, minutes / product.quantity, weight / product.quantity
+
+
+class Allocation:
+    # Overhead rates for one period. rates[factor] is (per unit, per
+    # minute, per gram) summed over the pools landing on that factor.
+    @profiled('Allocation.__init__')
+    def __init__(self, data_manager, overheads, volumes, period=None):
+        self.data_manager = data_manager
+        self.batch_minutes = dict(overheads.batch_minutes)
+        self.period = period
+        
+        # Driver totals over everything produced in the period
+        totals = [0.0, 0.0, 0.0]
+        for name, units in volumes.items():
+            product = data_manager.get_product(name)
+            if product is None:
+                continue
+            for i, driver in enumerate(unit_drivers(product, self.batch_minutes)):
+                totals[i] += driver * units
+        
+        self.rates = {}
+        # Pools with nothing to spread over (no production, or no batch
+        # times for a time-driven pool) stay unallocated
+        self.unallocated = {}
+        for name, pool in overheads.pools.items():
+            i = DRIVERS.index(pool['driver'])
+            if not totals[i]:
+                self.unallocated[name] = pool['amount']
+                continue
+            rate = self.rates.setdefault(pool['factor'], [0.0, 0.0, 0.0])
+            rate[i] += pool['amount'] / totals[i]
+    
+    def per_batch(self, product):
+        # {factor: overhead for one batch (product.quantity units)}
+        volume, minutes, weight = unit_drivers(product, self.batch_minutes)
+        return {
+            factor: (rate[0] * volume + rate[1] * minutes + rate[2] * weight) * product.quantity
+            for factor, rate in self.rates.items()
+        }
+    
+    @profiled('Allocation.allocate')
+    def allocate(self, product_names=None):
+        if product_names is None:
+            product_names = list(self.data_manager.products.keys())
+        get_product = self.data_manager.get_product
+        return {name: self.per_batch(get_product(name)) for name in product_names}
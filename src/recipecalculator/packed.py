@@ -0,0 +1,191 @@
+import json
+import lzma
+import struct
+import zlib
+from array import array
+
+
+# Compact on-disk format for products.
+#
+# Ingredient/product names (and ingredient ids) and units are interned into
+# one table and referenced by index. Products are written in blocks; each
+# block stores its records column by column (names, quantities, units, line
+# counts, then the same for recipe lines plus their ingredient ids), so
+# reading a block is a few array.frombytes calls. Blocks are compressed with
+# zlib or lzma. Keys beyond the standard ones are kept per record in a small
+# JSON side table.
+#
+#   file   magic, codec, block count, table length, table, blocks
+#   table  compressed(u32 length, names joined by NUL, units joined by NUL)
+#   block  u32 length + compressed(header, columns, extras JSON)
+
+MAGIC = b'RCPROD2\x00'
+# Version 1 blocks have no line id column
+MAGIC_V1 = b'RCPROD1\x00'
+NO_ID = 0xFFFFFFFF
+HEADER = struct.Struct('<8sBxxxII')
+BLOCK_HEADER = struct.Struct('<III')
+LENGTH = struct.Struct('<I')
+
+CODECS = {
+    'zlib': (1, lambda data: zlib.compress(data, 1), zlib.decompress),
+    'lzma': (2, lzma.compress, lzma.decompress),
+}
+CODEC_IDS = {codec_id: (compress, decompress) for codec_id, compress, decompress in CODECS.values()}
+
+PRODUCT_KEYS = ('name', 'quantity', 'unit', 'ingredients')
+LINE_KEYS = ('name', 'quantity', 'unit', 'id')
+
+BLOCK_SIZE = 4096
+
+
+class _Interner:
+    def __init__(self):
+        self.ids = {}
+    
+    def table(self):
+        return '\0'.join(self.ids).encode('utf-8')
+
+
+def _encode_block(products, names, units):
+    product_names = array('I')
+    product_qty = array('d')
+    product_units = bytearray()
+    line_counts = array('I')
+    line_names = array('I')
+    line_qty = array('d')
+    line_units = bytearray()
+    line_ids = array('I')
+    extras = {}
+    
+    name_ids = names.ids
+    unit_ids = units.ids
+    line_keys = set(LINE_KEYS)
+    
+    for i, product in enumerate(products):
+        data = product.to_dict()
+        lines = data['ingredients']
+        product_names.append(name_ids.setdefault(data['name'], len(name_ids)))
+        product_qty.append(data['quantity'])
+        product_units.append(unit_ids.setdefault(data['unit'], len(unit_ids)))
+        line_counts.append(len(lines))
+        
+        line_names.extend([name_ids.setdefault(line['name'], len(name_ids)) for line in lines])
+        line_qty.extend([line['quantity'] for line in lines])
+        line_units.extend([unit_ids.setdefault(line['unit'], len(unit_ids)) for line in lines])
+        line_ids.extend([
+            name_ids.setdefault(line['id'], len(name_ids)) if 'id' in line else NO_ID
+            for line in lines
+        ])
+        
+        extra = {k: v for k, v in data.items() if k not in PRODUCT_KEYS} if len(data) > len(PRODUCT_KEYS) else {}
+        line_extras = {
+            j: {k: v for k, v in line.items() if k not in LINE_KEYS}
+            for j, line in enumerate(lines) if len(line) > 3 and not line.keys() <= line_keys
+        }
+        if line_extras:
+            extra['_lines'] = line_extras
+        if extra:
+            extras[i] = extra
+    
+    extras_json = json.dumps(extras).encode('utf-8') if extras else b''
+    return b''.join([
+        BLOCK_HEADER.pack(len(product_names), len(line_names), len(extras_json)),
+        product_names.tobytes(),
+        product_qty.tobytes(),
+        bytes(product_units),
+        line_counts.tobytes(),
+        line_names.tobytes(),
+        line_qty.tobytes(),
+        bytes(line_units),
+        line_ids.tobytes(),
+        extras_json,
+    ])
+
+
+def _column(typecode, raw, offset, count):
+    column = array(typecode)
+    end = offset + column.itemsize * count
+    column.frombytes(raw[offset:end])
+    return column, end
+
+
+def _decode_block(raw, names, units, product_cls, out, has_ids=True):
+    n_products, n_lines, extras_len = BLOCK_HEADER.unpack_from(raw, 0)
+    offset = BLOCK_HEADER.size
+    product_names, offset = _column('I', raw, offset, n_products)
+    product_qty, offset = _column('d', raw, offset, n_products)
+    product_units = raw[offset:offset + n_products]
+    offset += n_products
+    line_counts, offset = _column('I', raw, offset, n_products)
+    line_names, offset = _column('I', raw, offset, n_lines)
+    line_qty, offset = _column('d', raw, offset, n_lines)
+    line_units = raw[offset:offset + n_lines]
+    offset += n_lines
+    if has_ids:
+        line_ids, offset = _column('I', raw, offset, n_lines)
+    else:
+        line_ids = [NO_ID] * n_lines
+    extras = json.loads(raw[offset:offset + extras_len]) if extras_len else {}
+    
+    lines = [
+        {'name': names[n], 'quantity': q, 'unit': units[u], 'id': names[i]} if i != NO_ID
+        else {'name': names[n], 'quantity': q, 'unit': units[u]}
+        for n, q, u, i in zip(line_names, line_qty, line_units, line_ids)
+    ]
+    
+    start = 0
+    for i, (n, q, u, count) in enumerate(zip(product_names, product_qty, product_units, line_counts)):
+        name = names[n]
+        ingredients = lines[start:start + count]
+        start += count
+        
+        extra = extras.get(str(i))
+        if extra is None:
+            out[name] = product_cls(name, q, units[u], ingredients)
+            continue
+        
+        for j, line_extra in extra.pop('_lines', {}).items():
+            ingredients[int(j)].update(line_extra)
+        data = dict(extra, name=name, quantity=q, unit=units[u], ingredients=ingredients)
+        out[name] = product_cls.from_dict(data)
+
+
+def pack_products(products, codec='zlib', block_size=BLOCK_SIZE):
+    codec_id, compress, _ = CODECS[codec]
+    names = _Interner()
+    units = _Interner()
+    
+    records = list(products.values())
+    blocks = []
+    for start in range(0, len(records), block_size):
+        block = compress(_encode_block(records[start:start + block_size], names, units))
+        blocks.append(LENGTH.pack(len(block)))
+        blocks.append(block)
+    
+    names_table = names.table()
+    table = compress(LENGTH.pack(len(names_table)) + names_table + units.table())
+    return b''.join([HEADER.pack(MAGIC, codec_id, len(blocks) // 2, len(table)), table] + blocks)
+
+
+def unpack_products(data, product_cls):
+    magic, codec_id, n_blocks, table_len = HEADER.unpack_from(data, 0)
+    if magic not in (MAGIC, MAGIC_V1) or codec_id not in CODEC_IDS:
+        raise ValueError('Not a packed products file')
+    _, decompress = CODEC_IDS[codec_id]
+    
+    offset = HEADER.size
+    table = decompress(data[offset:offset + table_len])
+    names_len, = LENGTH.unpack_from(table, 0)
+    names = table[LENGTH.size:LENGTH.size + names_len].decode('utf-8').split('\0')
+    units = table[LENGTH.size + names_len:].decode('utf-8').split('\0')
+    offset += table_len
+    
+    products = {}
+    for _ in range(n_blocks):
+        length, = LENGTH.unpack_from(data, offset)
+        offset += LENGTH.size
+        _decode_block(decompress(data[offset:offset + length]), names, units, product_cls,
+                      products, magic == MAGIC)
+        offset += length
+    return products
@@ -0,0 +1,241 @@
+import argparse
+import csv
+import heapq
+import math
+from functools import reduce
+
+from .models import DataManager
+from .profiling import profiled
+
+
+# Production planner: mixer runs and package counts for a day's orders.
+#
+# Runs: an order needs ceil(quantity / largest capacity) runs, the fewest
+# possible. The quantity is split evenly over them, and each run goes on the
+# smallest equipment that holds it.
+#
+# Packages: pack as much of the quantity as possible in the fewest
+# packages. This is change-making, solved by DP, but only over a bounded
+# range. Sizes are divided by their gcd first. Two amounts that differ by a
+# largest package are packed the same way apart from it, so past the DP
+# table only the residue mod the largest size matters: a shortest-path pass
+# over the residues finds, for each one, the smaller packages that need the
+# fewest packages in total once the rest is filled with largest ones, and
+# the least amount of smaller packages that reaches it at all. The DP table
+# runs up to the largest of the former (capped at TABLE_LIMIT), so every
+# amount past it is packed optimally by the residue pass. If the cap cuts
+# in, amounts between it and that point still pack as much as possible,
+# with the least smaller-package amount topped up with largest packages,
+# but not always in the fewest packages. Tables are built once per set of
+# package sizes and shared by every product packed in them.
+#
+# Capacities and package sizes are given per product name or per unit
+# (product name wins), in the product's unit:
+#
+#   python -m recipecalculator.planner orders.csv --capacity grams=20000 \
+#       --packages grams=250,500,1000 --packages pieces=6,12
+#
+# where orders.csv has product,quantity rows.
+
+# Quantities this close to a run or package boundary count as on it
+TOLERANCE = 1e-9
+# Most DP entries per PackingTable, in gcd steps
+TABLE_LIMIT = 1 << 20
+
+
+def split_runs(quantity, capacities):
+    # (runs, quantity per run, equipment capacity used); equipment is None
+    # with no capacities, in one run
+    capacities = sorted(c for c in capacities if c > 0)
+    if not capacities or quantity <= 0:
+        return (1 if quantity > 0 else 0), quantity, None
+    runs = max(1, math.ceil(quantity / capacities[-1] - TOLERANCE))
+    size = quantity / runs
+    equipment = next(c for c in capacities if c >= size - TOLERANCE)
+    return runs, size, equipment
+
+
+def _residue_tree(reduced, edge):
+    # Shortest paths over residues mod the largest size, one smaller package
+    # per edge; edge(size) is the (key, tiebreak) cost of adding it. Returns
+    # residue -> (cost, amount of smaller packages, last package added).
+    largest = reduced[0]
+    tree = {0: ((0, 0), 0, 0)}
+    heap = [((0, 0), 0)]
+    while heap:
+        cost, residue = heapq.heappop(heap)
+        if tree[residue][0] != cost:
+            continue
+        amount = tree[residue][1]
+        for c in reduced[1:]:
+            key, tiebreak = edge(c)
+            step = (cost[0] + key, cost[1] + tiebreak)
+            target = (residue + c) % largest
+            if target not in tree or step < tree[target][0]:
+                tree[target] = (step, amount + c, c)
+                heapq.heappush(heap, (step, target))
+    return tree
+
+
+class PackingTable:
+    def __init__(self, sizes, limit=TABLE_LIMIT):
+        try:
+            sizes = sorted({float(s) for s in sizes}, reverse=True)
+        except (TypeError, ValueError):
+            sizes = None
+        if not sizes or not all(math.isfinite(s) and s > 0 and s == int(s) for s in sizes):
+            raise ValueError('Package sizes must be whole positive numbers')
+        self.sizes = [int(s) for s in sizes]
+        # Work in multiples of the sizes' gcd
+        self.step = reduce(math.gcd, self.sizes)
+        reduced = [s // self.step for s in self.sizes]
+        largest = self.largest = reduced[0]
+        
+        # fewest: least (packages * largest - amount), which is the fewest
+        # packages once largest ones fill the rest; lowest: least amount
+        self.fewest = _residue_tree(reduced, lambda c: (largest - c, c))
+        self.lowest = _residue_tree(reduced, lambda c: (c, 1))
+        self.bound = min(max(entry[1] for entry in self.fewest.values()), limit)
+        
+        # count[t]: fewest packages holding exactly t; choice[t]: one of them
+        unreachable = self.bound + 1
+        count = [0] + [unreachable] * self.bound
+        choice = [0] * (self.bound + 1)
+        for t in range(1, self.bound + 1):
+            best = unreachable
+            for c in reduced:
+                if c <= t and count[t - c] + 1 < best:
+                    best = count[t - c] + 1
+                    choice[t] = c
+            count[t] = best
+        self.choice = choice
+        
+        # fill[t]: most that can be packed exactly out of t
+        fill = []
+        last = 0
+        for t in range(self.bound + 1):
+            if count[t] < unreachable:
+                last = t
+            fill.append(last)
+        self.fill = fill
+    
+    def pack(self, quantity):
+        # ({package size: count}, quantity left unpacked)
+        total = max(0, int(quantity / self.step + TOLERANCE))
+        counts = dict.fromkeys(self.sizes, 0)
+        # Past the table, step down to the most that packs exactly: the
+        # residue has to be reachable with at most that much
+        packed = total
+        while packed > self.bound:
+            entry = self.lowest.get(packed % self.largest)
+            if entry is not None and entry[1] <= packed:
+                break
+            packed -= 1
+        
+        if packed <= self.bound:
+            packed = t = self.fill[packed]
+            while t:
+                c = self.choice[t]
+                counts[c * self.step] += 1
+                t -= c
+        else:
+            residue = packed % self.largest
+            tree = self.fewest
+            if tree[residue][1] > packed:
+                tree = self.lowest
+            counts[self.sizes[0]] += (packed - tree[residue][1]) // self.largest
+            while residue:
+                c = tree[residue][2]
+                counts[c * self.step] += 1
+                residue = (residue - c) % self.largest
+        return counts, max(0.0, quantity - packed * self.step)
+
+
+def _lookup(settings, product):
+    # Per-product settings win over per-unit ones
+    if product.name in settings:
+        return settings[product.name]
+    return settings.get(product.unit, ())
+
+
+@profiled('planner.plan')
+def plan(data_manager, orders, capacities=None, packages=None):
+    # orders: {product: quantity in its unit}; returns one dict per order
+    capacities = capacities or {}
+    packages = packages or {}
+    tables = {}
+    result = []
+    for name, quantity in orders.items():
+        product = data_manager.get_product(name)
+        if product is None:
+            raise KeyError(name)
+        quantity = float(quantity)
+        runs, run_quantity, equipment = split_runs(quantity, _lookup(capacities, product))
+        
+        sizes = tuple(sorted(_lookup(packages, product)))
+        if sizes:
+            table = tables.get(sizes)
+            if table is None:
+                table = tables[sizes] = PackingTable(sizes)
+            package_counts, leftover = table.pack(quantity)
+        else:
+            package_counts, leftover = {}, quantity
+        
+        result.append({
+            'product': name,
+            'quantity': quantity,
+            'unit': product.unit,
+            'runs': runs,
+            'run_quantity': run_quantity,
+            # Scale factor for each run's recipe
+            'run_factor': run_quantity / product.quantity if product.quantity else 0.0,
+            'equipment': equipment,
+            'packages': {size: n for size, n in package_counts.items() if n},
+            'leftover': leftover,
+        })
+    return result
+
+
+def format_plan(entry):
+    text = (f"{entry['product']}: {entry['runs']} run(s) of {entry['run_quantity']:g} "
+            f"{entry['unit']}")
+    if entry['equipment'] is not None:
+        text += f" (capacity {entry['equipment']:g})"
+    if entry['packages']:
+        text += '; ' + ', '.join(f'{n} x {size}' for size, n in sorted(entry['packages'].items(),
+                                                                         reverse=True))
+    if entry['leftover'] > TOLERANCE:
+        text += f"; {entry['leftover']:g} {entry['unit']} unpacked"
+    return text
+
+
+def _settings(values):
+    # ['grams=250,500', ...] -> {'grams': [250.0, 500.0]}
+    settings = {}
+    for value in values or ():
+        key, _, numbers = value.partition('=')
+        settings[key] = [float(n) for n in numbers.split(',') if n]
+    return settings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m recipecalculator.planner')
+    parser.add_argument('orders', help='CSV of product,quantity rows')
+    parser.add_argument('--capacity', action='append', metavar='NAME=C[,C...]',
+                        help='equipment capacities for a product or unit')
+    parser.add_argument('--packages', action='append', metavar='NAME=S[,S...]',
+                        help='package sizes for a product or unit')
+    args = parser.parse_args(argv)
+    
+    orders = {}
+    with open(args.orders, newline='') as f:
+        for row in csv.reader(f):
+            if len(row) >= 2 and row[0] != 'product':
+                orders[row[0]] = orders.get(row[0], 0.0) + float(row[1])
+    
+    for entry in plan(DataManager(), orders, _settings(args.capacity), _settings(args.packages)):
+        print(format_plan(entry))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+# Pricing formula used by PricingScreen and the batch tools:
+#
+#   subtotal = base + base * wastage + base * taxes + fixed
+#   final    = subtotal * (1 + profit)
+#
+# where fixed = utilities + packaging + shipping + labour. Percent factors
+# are given as entered on the pricing screen (10 means 10%).
+
+from .profiling import profiled
+
+
+PERCENT_FACTORS = ('wastage', 'taxes', 'profit')
+FIXED_FACTORS = ('utilities', 'packaging', 'shipping', 'labour')
+COST_FACTORS = PERCENT_FACTORS + FIXED_FACTORS
+
+# Variables solve_for() can isolate from a target final price
+SOLVABLE = ('base_cost',) + COST_FACTORS
+
+
+def unit_cost_table(data_manager):
+    # Zero-quantity ingredients have no unit cost; integrity reports them
+    return {
+        name: ingredient.cost / ingredient.quantity
+        for name, ingredient in data_manager.ingredients.items()
+        if ingredient.quantity
+    }
+
+
+def recipe_rows(product, lookup, gross=True):
+    # The recipe-line traversal shared by costing and the nutrition rollup:
+    # yields (line quantity, per-unit row) for every line whose ingredient
+    # resolves; lookup(name) returns the row or None. With gross the
+    # quantity is what the line uses up after its yield (see scaling).
+    for ing_data in product.ingredients:
+        row = lookup(ing_data['name'])
+        if row is not None:
+            if gross and ing_data.get('yield'):
+                yield ing_data['quantity'] / ing_data['yield'], row
+            else:
+                yield ing_data['quantity'], row
+
+
+def base_cost(product, data_manager, unit_costs=None):
+    if unit_costs is None:
+        unit_costs = {}
+        for ing_data in product.ingredients:
+            ingredient = data_manager.get_ingredient(ing_data['name'])
+            if ingredient and ingredient.quantity:
+                unit_costs[ing_data['name']] = ingredient.cost / ingredient.quantity
+    
+    total = 0
+    for quantity, cost_per_unit in recipe_rows(product, unit_costs.get):
+        total += cost_per_unit * quantity
+    return total
+
+
+@profiled('pricing.base_costs')
+def base_costs(data_manager, product_names=None, unit_costs=None):
+    if unit_costs is None:
+        unit_costs = unit_cost_table(data_manager)
+    if product_names is None:
+        product_names = list(data_manager.products.keys())
+    return {
+        name: base_cost(data_manager.get_product(name), data_manager, unit_costs)
+        for name in product_names
+    }
+
+
+def _factor(factors, key):
+    return float(factors.get(key) or 0)
+
+
+def price_breakdown(base, factors):
+    wastage_cost = base * _factor(factors, 'wastage') / 100
+    taxes_cost = base * _factor(factors, 'taxes') / 100
+    fixed = {key: _factor(factors, key) for key in FIXED_FACTORS}
+    
+    subtotal = base + wastage_cost + taxes_cost
+    for key in FIXED_FACTORS:
+        subtotal += fixed[key]
+    profit_amount = subtotal * _factor(factors, 'profit') / 100
+    
+    return {
+        'base_cost': base,
+        'wastage_cost': wastage_cost,
+        'taxes_cost': taxes_cost,
+        'utilities_cost': fixed['utilities'],
+        'packaging_cost': fixed['packaging'],
+        'shipping_cost': fixed['shipping'],
+        'labour_cost': fixed['labour'],
+        'subtotal': subtotal,
+        'profit_amount': profit_amount,
+        'final_price': subtotal + profit_amount,
+    }
+
+
+def final_price(base, factors):
+    return price_breakdown(base, factors)['final_price']
+
+
+def final_prices(bases, factors):
+    # Many products, one set of factors: the formula is affine in base
+    # (final = scale * base + offset), so the factors are folded once and
+    # each product is a multiply-add
+    w = _factor(factors, 'wastage') / 100
+    t = _factor(factors, 'taxes') / 100
+    p = _factor(factors, 'profit') / 100
+    fixed = sum(_factor(factors, key) for key in FIXED_FACTORS)
+    scale = (1 + w + t) * (1 + p)
+    offset = fixed * (1 + p)
+    return {name: scale * base + offset for name, base in bases.items()}
+
+
+def _solve(unknown, target, base, factors):
+    # The formula is linear in every variable once the others are fixed,
+    # so each unknown has a closed form. Returns None when the other
+    # values make the target unreachable (division by zero).
+    w = _factor(factors, 'wastage') / 100
+    t = _factor(factors, 'taxes') / 100
+    p = _factor(factors, 'profit') / 100
+    fixed = sum(_factor(factors, key) for key in FIXED_FACTORS)
+    
+    if unknown == 'profit':
+        subtotal = base * (1 + w + t) + fixed
+        return (target / subtotal - 1) * 100 if subtotal else None
+    
+    if 1 + p == 0:
+        return None
+    subtotal = target / (1 + p)
+    
+    if unknown == 'base_cost':
+        return (subtotal - fixed) / (1 + w + t) if 1 + w + t else None
+    if unknown in FIXED_FACTORS:
+        return subtotal - base * (1 + w + t) - (fixed - _factor(factors, unknown))
+    
+    # wastage or taxes
+    if not base:
+        return None
+    other = t if unknown == 'wastage' else w
+    return ((subtotal - fixed) / base - 1 - other) * 100
+
+
+@profiled('pricing.solve_for')
+def solve_for(unknown, target_price, factors, data_manager, product_names=None, unit_costs=None):
+    if unknown not in SOLVABLE:
+        raise ValueError(f'Cannot solve for {unknown!r}')
+    
+    if product_names is None:
+        product_names = (list(target_price.keys()) if isinstance(target_price, dict)
+                         else list(data_manager.products.keys()))
+    
+    # base_cost is the unknown itself, no need to walk the recipes
+    if unknown == 'base_cost':
+        bases = dict.fromkeys(product_names, 0)
+    else:
+        bases = base_costs(data_manager, product_names, unit_costs)
+    
+    results = {}
+    for name in product_names:
+        target = target_price[name] if isinstance(target_price, dict) else target_price
+        results[name] = _solve(unknown, float(target), bases[name], factors)
+    return results
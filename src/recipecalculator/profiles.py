@@ -0,0 +1,90 @@
+import json
+
+from . import pricing
+from .filelock import FileLock, atomic_write
+from .profiling import profiled
+
+
+# Pricing profiles.
+#
+# A profile is a named set of cost factors (pricing.COST_FACTORS, as typed
+# on the pricing screen) kept in pricing_profiles.json next to the catalog,
+# together with the profile each product category is priced with:
+#
+#   {"profiles": {name: {factor: value}}, "categories": {category: profile}}
+#
+# Every change re-reads the file under the lock before writing it back, so
+# two terminals editing different profiles don't lose each other's edits.
+# Bulk repricing groups the products by profile and prices each group with
+# pricing.final_prices, i.e. the factors are folded once per group.
+
+
+class PricingProfiles:
+    def __init__(self, path='pricing_profiles.json'):
+        self.path = path
+        self.lock_file = path + '.lock'
+        self.profiles = {}
+        self.categories = {}
+        self.load()
+    
+    def load(self):
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        self.profiles = data.get('profiles', {})
+        self.categories = data.get('categories', {})
+    
+    def _update(self, change):
+        with FileLock(self.lock_file):
+            self.load()
+            change()
+            atomic_write(self.path, json.dumps({
+                'profiles': self.profiles,
+                'categories': self.categories,
+            }))
+    
+    def set_profile(self, name, factors):
+        factors = {key: float(factors.get(key) or 0) for key in pricing.COST_FACTORS}
+        self._update(lambda: self.profiles.__setitem__(name, factors))
+    
+    def remove_profile(self, name):
+        def change():
+            used_by = sorted(c for c, profile in self.categories.items() if profile == name)
+            if used_by:
+                raise ValueError(f'Profile {name!r} is assigned to {", ".join(used_by)}')
+            self.profiles.pop(name, None)
+        self._update(change)
+    
+    def assign(self, category, profile_name):
+        # profile_name None leaves the category without a profile
+        def change():
+            if profile_name is None:
+                self.categories.pop(category, None)
+            elif profile_name not in self.profiles:
+                raise ValueError(f'No pricing profile {profile_name!r}')
+            else:
+                self.categories[category] = profile_name
+        self._update(change)
+
+
+@profiled('profiles.reprice')
+def reprice(data_manager, profiles, category=None, unit_costs=None):
+    # {product: final price} for the products in category (all categories
+    # if None) whose category has a profile
+    groups = {}
+    for name, product in data_manager.products.items():
+        if product.category is None or category is not None and product.category != category:
+            continue
+        profile_name = profiles.categories.get(product.category)
+        if profile_name in profiles.profiles:
+            groups.setdefault(profile_name, []).append(name)
+    
+    if unit_costs is None:
+        unit_costs = pricing.unit_cost_table(data_manager)
+    prices = {}
+    for profile_name, names in groups.items():
+        bases = pricing.base_costs(data_manager, names, unit_costs)
+        prices.update(pricing.final_prices(bases, profiles.profiles[profile_name]))
+    return prices
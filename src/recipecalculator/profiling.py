@@ -0,0 +1,116 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+
+# Opt-in timing instrumentation. Functions wrapped with @profiled() only
+# pay for an attribute check while the profiler is disabled. Enable it from
+# the stats screen or by setting RECIPECALC_PROFILE=1 before starting.
+
+class Profiler:
+    def __init__(self, enabled=False, max_events=100000):
+        self.enabled = enabled
+        self.stats = {}
+        self.events = deque(maxlen=max_events)
+        self._local = threading.local()
+        self._origin = time.perf_counter()
+    
+    def enable(self):
+        self.enabled = True
+    
+    def disable(self):
+        self.enabled = False
+    
+    def reset(self):
+        self.stats = {}
+        self.events.clear()
+        self._origin = time.perf_counter()
+    
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+    
+    def _entry(self, name):
+        entry = self.stats.get(name)
+        if entry is None:
+            entry = self.stats[name] = {
+                'calls': 0,
+                'total_time': 0.0,
+                'max_time': 0.0,
+                'bytes_read': 0,
+                'bytes_written': 0,
+            }
+        return entry
+    
+    def call(self, name, func, *args, **kwargs):
+        stack = self._stack()
+        frame = {'bytes_read': 0, 'bytes_written': 0}
+        stack.append(frame)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            stack.pop()
+            
+            entry = self._entry(name)
+            entry['calls'] += 1
+            entry['total_time'] += elapsed
+            entry['max_time'] = max(entry['max_time'], elapsed)
+            entry['bytes_read'] += frame['bytes_read']
+            entry['bytes_written'] += frame['bytes_written']
+            
+            self.events.append({
+                'name': name,
+                'ph': 'X',
+                'ts': (start - self._origin) * 1e6,
+                'dur': elapsed * 1e6,
+                'pid': os.getpid(),
+                'tid': threading.get_ident(),
+                'args': dict(frame),
+            })
+    
+    def add_bytes(self, read=0, written=0):
+        # Charged to the innermost profiled call on this thread
+        stack = self._stack()
+        if stack:
+            stack[-1]['bytes_read'] += read
+            stack[-1]['bytes_written'] += written
+    
+    def summary(self):
+        rows = []
+        for name, entry in self.stats.items():
+            row = dict(entry, name=name)
+            row['avg_time'] = entry['total_time'] / entry['calls'] if entry['calls'] else 0.0
+            rows.append(row)
+        rows.sort(key=lambda row: row['total_time'], reverse=True)
+        return rows
+    
+    def export_trace(self, path):
+        # Chrome trace event format (chrome://tracing, Perfetto)
+        with open(path, 'w') as f:
+            json.dump({
+                'traceEvents': list(self.events),
+                'stats': self.summary(),
+            }, f)
+
+
+profiler = Profiler(enabled=os.environ.get('RECIPECALC_PROFILE', '') not in ('', '0'))
+
+
+def profiled(name=None):
+    def decorator(func):
+        label = name or func.__qualname__
+        
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return func(*args, **kwargs)
+            return profiler.call(label, func, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,253 @@
+import argparse
+import csv
+import html
+import io
+import os
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from . import pricing
+from .models import DataManager
+from .profiling import profiled
+
+
+# Cost sheet reports for the whole catalog.
+#
+# Products are pulled from DataManager one chunk at a time, priced with one
+# shared unit-cost table, rendered by the chosen writer and written out
+# before the next chunk is read, so memory use doesn't grow with the
+# catalog. Rendering is the expensive part, and a chunk renders on its own,
+# so with workers > 1 chunks are rendered in worker processes; at most a
+# few chunks are in flight and they are written back in catalog order.
+#
+#   python -m recipecalculator.reports cost_sheet.pdf --workers 4 --profit 30
+
+COLUMNS = ('product', 'quantity', 'unit', 'base_cost', 'wastage_cost', 'taxes_cost',
+           'fixed_cost', 'subtotal', 'profit_amount', 'final_price')
+CHUNK_SIZE = 2000
+
+
+def cost_rows(products, factors, unit_costs):
+    for product in products:
+        breakdown = pricing.price_breakdown(pricing.base_cost(product, None, unit_costs), factors)
+        fixed = sum(breakdown[f'{key}_cost'] for key in pricing.FIXED_FACTORS)
+        yield (product.name, product.quantity, product.unit, breakdown['base_cost'],
+               breakdown['wastage_cost'], breakdown['taxes_cost'], fixed,
+               breakdown['subtotal'], breakdown['profit_amount'], breakdown['final_price'])
+
+
+# Writers: header() and footer() once, render(rows) per chunk. render must
+# not depend on earlier chunks so chunks can be rendered in any process.
+class CsvWriter:
+    binary = False
+    
+    def header(self):
+        return ','.join(COLUMNS) + '\r\n'
+    
+    def render(self, rows):
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerows(row[:3] + tuple(f'{value:.2f}' for value in row[3:]) for row in rows)
+        return buf.getvalue()
+    
+    def footer(self):
+        return ''
+
+
+class HtmlWriter:
+    binary = False
+    
+    def header(self):
+        cells = ''.join(f'<th>{name.replace("_", " ").title()}</th>' for name in COLUMNS)
+        return ('<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>Cost Sheet</title>\n'
+                '<style>table{border-collapse:collapse;font:12px sans-serif}'
+                'td,th{border:1px solid #999;padding:2px 6px}td.n{text-align:right}</style>\n'
+                f'</head><body>\n<table>\n<tr>{cells}</tr>\n')
+    
+    def render(self, rows):
+        escape = html.escape
+        return ''.join(
+            f'<tr><td>{escape(row[0])}</td><td class="n">{row[1]:g}</td><td>{escape(row[2])}</td>'
+            + ''.join(f'<td class="n">{value:.2f}</td>' for value in row[3:])
+            + '</tr>\n'
+            for row in rows
+        )
+    
+    def footer(self):
+        return '</table>\n</body></html>\n'
+
+
+class PdfWriter:
+    # Plain PDF 1.4 written by hand: Courier text, one compressed content
+    # stream per page. Objects 1-3 are the catalog, page tree and font; the
+    # page tree is written last, once the page count is known.
+    binary = True
+    ROWS_PER_PAGE = 50
+    PAGE_SIZE = (842, 595)  # A4 landscape
+    
+    def __init__(self):
+        self.offsets = {}
+        self.pages = []
+        self.position = 0
+        self.next_id = 4
+    
+    def _line(self, cells):
+        return (f'{cells[0][:28]:<28}{cells[1]:>10} {cells[2][:11]:<11}'
+                + ''.join(f'{cell:>12}' for cell in cells[3:]))
+    
+    def _object(self, obj_id, body):
+        data = f'{obj_id} 0 obj\n'.encode('latin-1') + body + b'\nendobj\n'
+        self.offsets[obj_id] = self.position
+        self.position += len(data)
+        return data
+    
+    def header(self):
+        data = b'%PDF-1.4\n'
+        self.position = len(data)
+        data += self._object(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+        data += self._object(3, b'<< /Type /Font /Subtype /Type1 /BaseFont /Courier >>')
+        return data
+    
+    def render(self, rows):
+        # Compressed page content streams; numbered in add_pages
+        title = self._line([name.replace('_', ' ') for name in COLUMNS])
+        streams = []
+        rows = list(rows)
+        for start in range(0, len(rows), self.ROWS_PER_PAGE):
+            lines = [title, ''] + [
+                self._line((row[0], f'{row[1]:g}', row[2]) + tuple(f'{v:.2f}' for v in row[3:]))
+                for row in rows[start:start + self.ROWS_PER_PAGE]
+            ]
+            text = '\n'.join(
+                '(' + line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)') + ") '"
+                for line in lines)
+            content = f'BT /F1 8 Tf 10 TL 24 {self.PAGE_SIZE[1] - 30} Td\n{text}\nET'
+            streams.append(zlib.compress(content.encode('latin-1', 'replace'), 6))
+        return streams
+    
+    def add_pages(self, streams):
+        data = []
+        width, height = self.PAGE_SIZE
+        for stream in streams:
+            content_id, page_id = self.next_id, self.next_id + 1
+            self.next_id += 2
+            data.append(self._object(content_id, (
+                f'<< /Length {len(stream)} /Filter /FlateDecode >>\nstream\n'.encode('latin-1')
+                + stream + b'\nendstream')))
+            data.append(self._object(page_id, (
+                f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width} {height}] '
+                f'/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>'
+            ).encode('latin-1')))
+            self.pages.append(page_id)
+        return b''.join(data)
+    
+    def footer(self):
+        kids = ' '.join(f'{page_id} 0 R' for page_id in self.pages)
+        data = self._object(2, f'<< /Type /Pages /Kids [{kids}] /Count {len(self.pages)} >>'
+                            .encode('latin-1'))
+        xref_at = self.position
+        size = self.next_id
+        xref = [f'xref\n0 {size}\n0000000000 65535 f \n']
+        xref.extend(f'{self.offsets[i]:010d} 00000 n \n' for i in range(1, size))
+        xref.append(f'trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{xref_at}\n%%EOF\n')
+        return data + ''.join(xref).encode('latin-1')
+
+
+WRITERS = {
+    'csv': CsvWriter,
+    'html': HtmlWriter,
+    'pdf': PdfWriter,
+}
+
+
+def _chunks(data_manager, product_names, chunk_size):
+    names = iter(product_names)
+    while True:
+        chunk = [data_manager.get_product(name) for name in islice(names, chunk_size)]
+        if not chunk:
+            return
+        yield [product for product in chunk if product is not None]
+
+
+# Worker process state, set once per worker by _init_worker
+_worker = {}
+
+
+def _init_worker(fmt, factors, unit_costs):
+    _worker.update(writer=WRITERS[fmt](), factors=factors, unit_costs=unit_costs)
+
+
+def _render_chunk(products):
+    return _worker['writer'].render(cost_rows(products, _worker['factors'], _worker['unit_costs']))
+
+
+def _rendered(chunks, fmt, factors, unit_costs, workers):
+    if workers <= 1:
+        writer = WRITERS[fmt]()
+        for chunk in chunks:
+            yield writer.render(cost_rows(chunk, factors, unit_costs))
+        return
+    
+    # Bounded window instead of executor.map, which would submit (and so
+    # hold in memory) every chunk up front
+    with ProcessPoolExecutor(workers, initializer=_init_worker,
+                             initargs=(fmt, factors, unit_costs)) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(_render_chunk, chunk))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+@profiled('reports.write_report')
+def write_report(data_manager, path, fmt=None, factors=None, product_names=None,
+                 unit_costs=None, workers=1, chunk_size=CHUNK_SIZE):
+    fmt = fmt or os.path.splitext(path)[1].lstrip('.').lower()
+    if fmt not in WRITERS:
+        raise ValueError(f'Unknown report format {fmt!r}')
+    factors = factors or {}
+    if unit_costs is None:
+        unit_costs = pricing.unit_cost_table(data_manager)
+    if product_names is None:
+        product_names = list(data_manager.products.keys())
+    
+    writer = WRITERS[fmt]()
+    chunks = _chunks(data_manager, product_names, chunk_size)
+    # Same temp-then-rename as atomic_write, but streamed
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    if writer.binary:
+        with open(tmp_path, 'wb') as f:
+            f.write(writer.header())
+            for streams in _rendered(chunks, fmt, factors, unit_costs, workers):
+                f.write(writer.add_pages(streams))
+            f.write(writer.footer())
+    else:
+        with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+            f.write(writer.header())
+            for text in _rendered(chunks, fmt, factors, unit_costs, workers):
+                f.write(text)
+            f.write(writer.footer())
+    os.replace(tmp_path, path)
+    return len(product_names)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m recipecalculator.reports')
+    parser.add_argument('path', help='output file; format taken from the extension')
+    parser.add_argument('--format', choices=sorted(WRITERS))
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    for key in pricing.COST_FACTORS:
+        parser.add_argument(f'--{key}', type=float, default=0)
+    args = parser.parse_args(argv)
+    
+    factors = {key: getattr(args, key) for key in pricing.COST_FACTORS}
+    count = write_report(DataManager(), args.path, args.format, factors, workers=args.workers)
+    print(f'{count} products written to {args.path}')
+
+
+if __name__ == '__main__':
+    main()
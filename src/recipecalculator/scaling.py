@@ -0,0 +1,66 @@
+import math
+
+
+# Recipe scaling shared by ScaleRecipeScreen, the pricing service and
+# scaled variants.
+#
+# Besides name, quantity and unit a recipe line may carry:
+#
+#   yield  usable fraction of what is bought (trim, cooking loss; above 1
+#          for things that gain weight, like rice). The line quantity is
+#          what goes into the recipe; quantity / yield is what is used up,
+#          so that is what gets costed and taken out of stock.
+#   fixed  true for the same quantity whatever the batch (a pan of grease)
+#   step   scaled quantities round up to a multiple of step (whole eggs,
+#          sealed packets)
+#
+# compile_scaler turns a recipe into a function of the scale factor. Each
+# line's coefficients are worked out once (quantity = rate * factor +
+# fixed part), so scaling is a multiply-add per line plus the rounding for
+# step lines. DataManager.scaler caches the compiled functions per product.
+
+# Line keys beyond name, quantity, unit and id
+LINE_OPTIONS = ('yield', 'fixed', 'step')
+
+# Scaled quantities within this much of a step boundary don't round up
+STEP_TOLERANCE = 1e-9
+
+
+def scale_factor(product, new_quantity):
+    return new_quantity / product.quantity
+
+
+def gross_quantity(line):
+    # What a line uses up; a zero or missing yield counts as no loss
+    # (integrity reports yields that aren't positive)
+    return line['quantity'] / line['yield'] if line.get('yield') else line['quantity']
+
+
+def compile_scaler(product):
+    rows = []
+    for line in product.ingredients:
+        if line.get('fixed'):
+            rows.append((line, 0.0, line['quantity'], line.get('step')))
+        else:
+            rows.append((line, line['quantity'], 0.0, line.get('step')))
+    rows = tuple(rows)
+    
+    if not any(row[3] for row in rows):
+        def scale(factor):
+            return [dict(line, quantity=rate * factor + fixed) for line, rate, fixed, step in rows]
+        return scale
+    
+    def scale(factor):
+        lines = []
+        for line, rate, fixed, step in rows:
+            quantity = rate * factor + fixed
+            if step:
+                quantity = math.ceil(quantity / step - STEP_TOLERANCE) * step
+            lines.append(dict(line, quantity=quantity))
+        return lines
+    return scale
+
+
+def scale_ingredients(product, factor):
+    # One-off scaling; repeated callers should keep the compiled scaler
+    return compile_scaler(product)(factor)
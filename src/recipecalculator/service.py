@@ -0,0 +1,276 @@
+import argparse
+import asyncio
+import http.client
+import json
+import time
+from urllib.parse import unquote
+
+from . import pricing, scaling
+from .models import DataManager
+
+
+# Local HTTP/JSON pricing service for POS terminals.
+#
+#   POST /price        {"products": [...], "factors": {...}}
+#   POST /scale        {"items": [{"product": ..., "quantity": ...}, ...]}
+#   POST /ingredients  {"names": [...]}
+#   GET  /ingredients/<name>
+#   GET  /health
+#
+# /price and /scale also accept a single "product" (plus "quantity") in
+# place of the list. Connections are kept alive between requests and
+# results are cached until the catalog generation changes. The catalog is
+# re-read from disk (DataManager.refresh) at most every REFRESH_INTERVAL
+# seconds, so edits saved by the app reach the service within that delay.
+
+MAX_CACHE_ENTRIES = 100000
+REFRESH_INTERVAL = 0.5
+MAX_BODY = 16 * 1024 * 1024
+
+REASONS = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    413: 'Payload Too Large',
+}
+
+
+class ServiceError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class PricingService:
+    def __init__(self, data_manager):
+        self.data_manager = data_manager
+        self._cache = {}
+        self._generation = None
+        self._unit_costs = None
+        self._refreshed = None
+    
+    def _check_generation(self):
+        refresh = getattr(self.data_manager, 'refresh', None)
+        now = time.monotonic()
+        if refresh is not None and (self._refreshed is None or now - self._refreshed >= REFRESH_INTERVAL):
+            refresh()
+            self._refreshed = now
+        generation = getattr(self.data_manager, 'generation', 0)
+        if generation != self._generation:
+            self._cache.clear()
+            self._unit_costs = None
+            self._generation = generation
+        elif len(self._cache) > MAX_CACHE_ENTRIES:
+            self._cache.clear()
+    
+    def _product(self, name):
+        product = self.data_manager.get_product(name)
+        if product is None:
+            raise ServiceError(404, f'Unknown product {name!r}')
+        return product
+    
+    def price(self, body):
+        self._check_generation()
+        names = body['products'] if 'products' in body else [body['product']]
+        factors = body.get('factors') or {}
+        if not isinstance(names, list) or not isinstance(factors, dict):
+            raise ServiceError(400, 'Expected a list of products and an object of factors')
+        factors_key = tuple(float(factors.get(key) or 0) for key in pricing.COST_FACTORS)
+        
+        if self._unit_costs is None:
+            self._unit_costs = pricing.unit_cost_table(self.data_manager)
+        
+        results = {}
+        for name in names:
+            key = ('price', name, factors_key)
+            result = self._cache.get(key)
+            if result is None:
+                base = pricing.base_cost(self._product(name), self.data_manager, self._unit_costs)
+                result = self._cache[key] = pricing.price_breakdown(base, factors)
+            results[name] = result
+        return {'results': results}
+    
+    def scale(self, body):
+        self._check_generation()
+        items = body['items'] if 'items' in body else [body]
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            raise ServiceError(400, 'Expected a list of items')
+        
+        results = []
+        for item in items:
+            name = item['product']
+            quantity = float(item['quantity'])
+            key = ('scale', name, quantity)
+            result = self._cache.get(key)
+            if result is None:
+                product = self._product(name)
+                if not product.quantity:
+                    raise ServiceError(400, f'Product {name!r} has no batch quantity to scale from')
+                factor = scaling.scale_factor(product, quantity)
+                result = self._cache[key] = {
+                    'product': name,
+                    'quantity': quantity,
+                    'unit': product.unit,
+                    'scale_factor': factor,
+                    'ingredients': self.data_manager.scaler(product)(factor),
+                }
+            results.append(result)
+        return {'results': results}
+    
+    def ingredients(self, body):
+        self._check_generation()
+        if not isinstance(body['names'], list):
+            raise ServiceError(400, 'Expected a list of names')
+        results = {}
+        for name in body['names']:
+            ingredient = self.data_manager.get_ingredient(name)
+            results[name] = ingredient.to_dict() if ingredient else None
+        return {'results': results}
+    
+    def handle(self, method, path, body):
+        if path == '/health':
+            self._check_generation()
+            return {'status': 'ok', 'generation': getattr(self.data_manager, 'generation', 0)}
+        
+        if path.startswith('/ingredients/') and method == 'GET':
+            self._check_generation()
+            name = unquote(path[len('/ingredients/'):])
+            ingredient = self.data_manager.get_ingredient(name)
+            if ingredient is None:
+                raise ServiceError(404, f'Unknown ingredient {name!r}')
+            return ingredient.to_dict()
+        
+        routes = {
+            '/price': self.price,
+            '/scale': self.scale,
+            '/ingredients': self.ingredients,
+        }
+        if path not in routes:
+            raise ServiceError(404, f'No route for {path}')
+        if method != 'POST':
+            raise ServiceError(405, f'{path} expects POST')
+        
+        try:
+            payload = json.loads(body) if body else {}
+            if not isinstance(payload, dict):
+                raise ServiceError(400, 'Request body must be a JSON object')
+            return routes[path](payload)
+        except (ValueError, KeyError, TypeError, AttributeError, ArithmeticError) as e:
+            raise ServiceError(400, f'Bad request: {e}')
+
+
+def _response(status, payload, keep_alive):
+    body = json.dumps(payload).encode('utf-8')
+    head = (f'HTTP/1.1 {status} {REASONS.get(status, "Error")}\r\n'
+            f'Content-Type: application/json\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n')
+    return head.encode('latin-1') + body
+
+
+async def _serve_connection(service, reader, writer):
+    try:
+        while True:
+            try:
+                head = await reader.readuntil(b'\r\n\r\n')
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                break
+            
+            lines = head.decode('latin-1').split('\r\n')
+            try:
+                method, target, version = lines[0].split(' ', 2)
+            except ValueError:
+                writer.write(_response(400, {'error': 'Malformed request line'}, False))
+                break
+            
+            headers = {}
+            for line in lines[1:]:
+                if ':' in line:
+                    key, value = line.split(':', 1)
+                    headers[key.strip().lower()] = value.strip()
+            
+            connection = headers.get('connection', '').lower()
+            if version == 'HTTP/1.0':
+                keep_alive = connection == 'keep-alive'
+            else:
+                keep_alive = connection != 'close'
+            
+            try:
+                length = int(headers.get('content-length') or 0)
+            except ValueError:
+                length = -1
+            if length < 0:
+                writer.write(_response(400, {'error': 'Invalid Content-Length'}, False))
+                break
+            if length > MAX_BODY:
+                writer.write(_response(413, {'error': 'Request body too large'}, False))
+                break
+            body = await reader.readexactly(length) if length else b''
+            
+            try:
+                status, payload = 200, service.handle(method, target.split('?', 1)[0], body)
+            except ServiceError as e:
+                status, payload = e.status, {'error': str(e)}
+            
+            writer.write(_response(status, payload, keep_alive))
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_server(service, host='127.0.0.1', port=8765):
+    return await asyncio.start_server(
+        lambda reader, writer: _serve_connection(service, reader, writer), host, port)
+
+
+def serve(data_manager, host='127.0.0.1', port=8765):
+    async def run():
+        server = await start_server(PricingService(data_manager), host, port)
+        async with server:
+            await server.serve_forever()
+    asyncio.run(run())
+
+
+class PricingClient:
+    # Keeps one HTTP/1.1 connection open across calls
+    def __init__(self, host='127.0.0.1', port=8765, timeout=10):
+        self.connection = http.client.HTTPConnection(host, port, timeout=timeout)
+    
+    def request(self, method, path, payload=None):
+        body = json.dumps(payload) if payload is not None else None
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        self.connection.request(method, path, body=body, headers=headers)
+        response = self.connection.getresponse()
+        data = json.loads(response.read())
+        if response.status != 200:
+            raise ServiceError(response.status, data.get('error', ''))
+        return data
+    
+    def price(self, products, factors=None):
+        return self.request('POST', '/price', {'products': products, 'factors': factors or {}})['results']
+    
+    def scale(self, items):
+        return self.request('POST', '/scale', {'items': items})['results']
+    
+    def ingredients(self, names):
+        return self.request('POST', '/ingredients', {'names': names})['results']
+    
+    def close(self):
+        self.connection.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m recipecalculator.service')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args(argv)
+    serve(DataManager(), args.host, args.port)
+
+
+if __name__ == '__main__':
+    main()
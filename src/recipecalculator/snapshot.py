@@ -0,0 +1,80 @@
+import gc
+import marshal
+import os
+
+from .filelock import atomic_write
+from .profiling import profiler
+
+
+# Binary snapshot of the catalog used for fast cold starts.
+#
+# The snapshot holds the attribute dicts of every Ingredient and Product in
+# marshal format, together with the mtime and size of the JSON files it was
+# built from. If either JSON file has changed since, the snapshot is stale
+# and DataManager falls back to parsing the JSON.
+
+SNAPSHOT_VERSION = 4
+
+
+def _source_stamp(paths):
+    stamp = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            stamp.append((path, None, None))
+        else:
+            stamp.append((path, st.st_mtime_ns, st.st_size))
+    return stamp
+
+
+def _restore(cls, state):
+    obj = cls.__new__(cls)
+    obj.__dict__ = state
+    return obj
+
+
+def write_snapshot(data_manager):
+    payload = (
+        SNAPSHOT_VERSION,
+        _source_stamp([data_manager.ingredients_file, data_manager.products_file]),
+        {k: vars(v) for k, v in data_manager.ingredients.items()},
+        {k: vars(v) for k, v in data_manager.products.items()},
+    )
+    data = marshal.dumps(payload)
+    
+    atomic_write(data_manager.snapshot_file, data, 'wb')
+    if profiler.enabled:
+        profiler.add_bytes(written=len(data))
+
+
+def load_snapshot(data_manager, ingredient_cls, product_cls):
+    try:
+        with open(data_manager.snapshot_file, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    if profiler.enabled:
+        profiler.add_bytes(read=len(data))
+    
+    # Nothing allocated here is garbage, so skip the collector passes that
+    # the many small dicts would otherwise trigger
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        version, stamp, ingredients, products = marshal.loads(data)
+        
+        sources = [data_manager.ingredients_file, data_manager.products_file]
+        if version != SNAPSHOT_VERSION or [tuple(s) for s in stamp] != _source_stamp(sources):
+            return None
+        
+        return (
+            {k: _restore(ingredient_cls, v) for k, v in ingredients.items()},
+            {k: _restore(product_cls, v) for k, v in products.items()},
+        )
+    except (EOFError, ValueError, TypeError):
+        return None
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
@@ -0,0 +1,91 @@
+from .pricing import unit_cost_table
+from .scaling import gross_quantity
+
+
+# Ingredient substitution search.
+#
+# A swap replaces every recipe line of one ingredient with one of its
+# declared alternatives (same unit only, so quantities carry over). Swaps
+# of different ingredients are independent, so each ingredient's saving is
+# fixed up front and the best plan under a swap limit or budget is simply
+# the largest savings taken first.
+
+def substitution_options(product, data_manager, unit_costs=None, exclude=()):
+    if unit_costs is None:
+        unit_costs = unit_cost_table(data_manager)
+    
+    # Total quantity used up per ingredient, after line yields
+    totals = {}
+    for ing_data in product.ingredients:
+        totals[ing_data['name']] = totals.get(ing_data['name'], 0) + gross_quantity(ing_data)
+    
+    options = {}
+    for name, quantity in totals.items():
+        ingredient = data_manager.get_ingredient(name)
+        if not ingredient or name in exclude or name not in unit_costs:
+            continue
+        
+        best = None
+        for alt_name in ingredient.alternatives:
+            alternative = data_manager.get_ingredient(alt_name)
+            if (not alternative or alternative.unit != ingredient.unit or alt_name in exclude
+                    or alt_name not in unit_costs):
+                continue
+            saving = (unit_costs[name] - unit_costs[alt_name]) * quantity
+            if saving > 0 and (best is None or saving > best[1]):
+                best = (alt_name, saving)
+        
+        if best:
+            options[name] = best
+    return options
+
+
+def cheapest_recipe(product, data_manager, budget=None, max_substitutions=None,
+                    exclude=(), unit_costs=None):
+    if unit_costs is None:
+        unit_costs = unit_cost_table(data_manager)
+    
+    cost = 0
+    for ing_data in product.ingredients:
+        cost += unit_costs.get(ing_data['name'], 0) * gross_quantity(ing_data)
+    
+    options = substitution_options(product, data_manager, unit_costs, exclude)
+    ranked = sorted(options.items(), key=lambda item: item[1][1], reverse=True)
+    if max_substitutions is not None:
+        ranked = ranked[:max_substitutions]
+    
+    # With a budget, stop at the fewest swaps that reach it
+    substitutions = {}
+    for name, (alt_name, saving) in ranked:
+        if budget is not None and cost <= budget:
+            break
+        substitutions[name] = alt_name
+        cost -= saving
+    
+    ingredients = []
+    for ing_data in product.ingredients:
+        line = dict(ing_data)
+        line['name'] = substitutions.get(ing_data['name'], ing_data['name'])
+        ingredients.append(line)
+    
+    return {
+        'cost': cost,
+        'substitutions': substitutions,
+        'ingredients': ingredients,
+        'within_budget': budget is None or cost <= budget,
+    }
+
+
+def cheapest_recipes(data_manager, budget=None, max_substitutions=None, exclude=(),
+                     product_names=None):
+    unit_costs = unit_cost_table(data_manager)
+    if product_names is None:
+        product_names = list(data_manager.products.keys())
+    
+    results = {}
+    for name in product_names:
+        product_budget = budget.get(name) if isinstance(budget, dict) else budget
+        results[name] = cheapest_recipe(data_manager.get_product(name), data_manager,
+                                        product_budget, max_substitutions, exclude,
+                                        unit_costs)
+    return results
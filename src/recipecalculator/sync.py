@@ -0,0 +1,236 @@
+import argparse
+import json
+import os
+import uuid
+
+from .filelock import atomic_write
+from .history import RecipeHistory
+from .models import Ingredient, Product, DataManager
+
+
+# Offline-first delta sync between devices.
+#
+# Every replica keeps, per record, a version vector ({device: counter}) and
+# the "dot" (device, counter) of the write that produced its current value.
+# A replica's knowledge vector holds the highest counter it has seen from
+# each device, so the delta another replica needs is exactly the records
+# whose dot is past that knowledge; traffic scales with edits, not with the
+# catalog. Concurrent writes are resolved the same way on every replica:
+# the larger vector sum wins, then the higher (device, counter) dot.
+#
+# A device syncs the catalog in its working directory against a server
+# file (on a shared folder or mounted drive) from the app's Sync button or:
+#
+#   python -m recipecalculator.sync /mnt/shared/sync_server.json
+
+KINDS = {
+    'ingredients': Ingredient,
+    'products': Product,
+}
+
+
+def _dominates(a, b):
+    return all(a.get(device, 0) >= counter for device, counter in b.items())
+
+
+def _rank(entry):
+    return (sum(entry['vv'].values()), entry['dot'][0], entry['dot'][1])
+
+
+class Replica:
+    def __init__(self, device_id=None, state=None):
+        state = state or {}
+        self.device_id = state.get('device_id') or device_id or uuid.uuid4().hex
+        self.counter = state.get('counter', 0)
+        self.knowledge = state.get('knowledge', {})
+        # 'kind:name' -> {'data': dict or None (deleted), 'vv': {...}, 'dot': [device, counter]}
+        self.records = state.get('records', {})
+    
+    def to_dict(self):
+        return {
+            'device_id': self.device_id,
+            'counter': self.counter,
+            'knowledge': self.knowledge,
+            'records': self.records,
+        }
+    
+    def local_write(self, kind, name, data):
+        key = f'{kind}:{name}'
+        self.counter += 1
+        entry = self.records.get(key)
+        vv = dict(entry['vv']) if entry else {}
+        vv[self.device_id] = self.counter
+        self.records[key] = {'data': data, 'vv': vv, 'dot': [self.device_id, self.counter]}
+        self.knowledge[self.device_id] = self.counter
+    
+    def delta_for(self, knowledge):
+        return {
+            key: entry for key, entry in self.records.items()
+            if entry['dot'][1] > knowledge.get(entry['dot'][0], 0)
+        }
+    
+    def merge(self, changes, knowledge):
+        updated = []
+        for key, remote in changes.items():
+            local = self.records.get(key)
+            if local is None or _dominates(remote['vv'], local['vv']):
+                winner = remote
+            elif _dominates(local['vv'], remote['vv']):
+                continue
+            else:
+                # Concurrent edits: deterministic pick, vectors merged
+                winner = dict(max(local, remote, key=_rank))
+                winner['vv'] = {
+                    device: max(local['vv'].get(device, 0), remote['vv'].get(device, 0))
+                    for device in set(local['vv']) | set(remote['vv'])
+                }
+            if local is None or winner['data'] != local['data']:
+                updated.append(key)
+            self.records[key] = winner
+        
+        for device, counter in knowledge.items():
+            if counter > self.knowledge.get(device, 0):
+                self.knowledge[device] = counter
+        return updated
+    
+    # Peer protocol; every message is plain JSON
+    def pull(self, knowledge):
+        return {'changes': self.delta_for(knowledge), 'knowledge': dict(self.knowledge)}
+    
+    def push(self, changes, knowledge):
+        return self.merge(changes, knowledge)
+
+
+SERVER_FILE = 'sync_server.json'
+
+
+class SyncServer(Replica):
+    # Stand-in for a sync server: a replica persisted to one JSON file
+    def __init__(self, path=SERVER_FILE):
+        self.path = path
+        state = None
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                state = json.load(f)
+        super().__init__(device_id='server', state=state)
+    
+    def push(self, changes, knowledge):
+        updated = super().push(changes, knowledge)
+        atomic_write(self.path, json.dumps(self.to_dict()))
+        return updated
+
+
+class SyncEngine:
+    def __init__(self, data_manager, state_file='sync_state.json', history=None):
+        self.data_manager = data_manager
+        self.state_file = state_file
+        # Recipes arriving from other devices get versions here too
+        self.history = history
+        
+        state = {}
+        if os.path.exists(state_file):
+            with open(state_file, 'r') as f:
+                state = json.load(f)
+        self.replica = Replica(state=state.get('replica'))
+        # DataManager catalog_version up to which local edits are recorded
+        self.captured = state.get('captured', 0)
+    
+    def save_state(self):
+        atomic_write(self.state_file, json.dumps({
+            'replica': self.replica.to_dict(),
+            'captured': self.captured,
+        }))
+    
+    def capture(self, skip=()):
+        # Record local edits using the per-record versions DataManager
+        # already keeps, so no record contents are compared; skip holds
+        # (kind, name) pairs that were not edited here
+        dm = self.data_manager
+        count = 0
+        for kind in KINDS:
+            records = getattr(dm, kind)
+            for name, version in dm.versions[kind].items():
+                if version > self.captured and name in records and (kind, name) not in skip:
+                    self.replica.local_write(kind, name, records[name].to_dict())
+                    count += 1
+            
+            prefix = kind + ':'
+            for key, entry in list(self.replica.records.items()):
+                if (key.startswith(prefix) and entry['data'] is not None
+                        and key[len(prefix):] not in records):
+                    self.replica.local_write(kind, key[len(prefix):], None)
+                    count += 1
+        
+        self.captured = dm.catalog_version
+        return count
+    
+    def _apply(self, keys):
+        dm = self.data_manager
+        applied = set()
+        for key in keys:
+            kind, name = key.split(':', 1)
+            data = self.replica.records[key]['data']
+            records = getattr(dm, kind)
+            if data is None:
+                records.pop(name, None)
+            else:
+                records[name] = KINDS[kind].from_dict(data)
+                if self.history is not None and kind == 'products' and records[name].base is None:
+                    self.history.record(records[name])
+            dm.mark_changed(kind, name)
+            applied.add((kind, name))
+        if applied:
+            dm.save_data()
+            # Records written by the sync itself are not local edits, but
+            # ones another process saved (merged in by that save) are
+            self.capture(skip=applied)
+    
+    def sync(self, peer):
+        self.capture()
+        
+        # Fetch what we are missing, then send what the peer is missing
+        pulled = peer.pull(dict(self.replica.knowledge))
+        received = self.replica.merge(pulled['changes'], pulled['knowledge'])
+        self._apply(received)
+        
+        outgoing = self.replica.delta_for(pulled['knowledge'])
+        peer.push(outgoing, dict(self.replica.knowledge))
+        self.save_state()
+        
+        return {
+            'received': len(pulled['changes']),
+            'applied': len(received),
+            'sent': len(outgoing),
+            'bytes': len(json.dumps(pulled)) + len(json.dumps(outgoing)),
+        }
+    
+    # An engine can also act as the peer, for direct device-to-device sync
+    def pull(self, knowledge):
+        self.capture()
+        return self.replica.pull(knowledge)
+    
+    def push(self, changes, knowledge):
+        updated = self.replica.push(changes, knowledge)
+        self._apply(updated)
+        self.save_state()
+        return updated
+
+
+def format_result(result):
+    return (f"Received {result['received']} change(s), applied {result['applied']}, "
+            f"sent {result['sent']} ({result['bytes'] / 1024:.1f} KB)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m recipecalculator.sync')
+    parser.add_argument('server', nargs='?', default=SERVER_FILE,
+                        help='sync server file shared between devices')
+    parser.add_argument('--state', default='sync_state.json', help="this device's sync state")
+    args = parser.parse_args(argv)
+    
+    engine = SyncEngine(DataManager(), args.state, RecipeHistory())
+    print(format_result(engine.sync(SyncServer(args.server))))
+
+
+if __name__ == '__main__':
+    main()